@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+import threading
+import subprocess
+import importlib.util
+
+"""
+Benchmark reproducible de las tres variantes del optimizador.
+Genera un corpus sintético sin conexión (imágenes JPEG/PNG de varios tamaños y
+clips cortos de ffmpeg testsrc/sine en varios contenedores), ejecuta cada
+variante sin interfaz gráfica en un proceso aparte y reporta en JSON:
+archivos/s, MB/s de entrada y salida, relación de compresión, pico de RSS y
+uso de CPU. El JSON se puede comparar entre commits.
+Requiere Linux o macOS (tiempo y CPU se toman con os.wait4). El pico de RSS
+del árbol de procesos completo sólo se mide en Linux (/proc).
+
+Uso:
+    python benchmarks/benchmark_optimizadores.py --salida resultados.json
+"""
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARPETA_COMPRESORES = os.path.join(RAIZ, "compresores")
+
+# variante -> (script, función, argumentos extra)
+VARIANTES = {
+    "optimizer": ("optimizer.py", "optimizar_archivos", {}),
+    "optimizer-2-davinci": ("optimizer-2-davinci.py", "optimizar_archivos", {}),
+    "optimizer-3-hilos": ("optimizer-3-hilos.py", "optimizar_archivos_parallel", {}),
+}
+
+TAMANOS_IMG = [(640, 480), (1920, 1080), (4000, 3000)]
+CLIPS_VIDEO = [
+    # (nombre, tamaño, duración en segundos)
+    ("clip_sd.mp4", "640x360", 3),
+    ("clip_hd.mov", "1280x720", 3),
+    ("clip_hd_b.mkv", "1280x720", 3),
+    ("clip_fhd.avi", "1920x1080", 2),
+]
+
+
+def generar_corpus(carpeta, copias_img=3):
+    """
+    Crea (si no existe) el corpus sintético en `carpeta`.
+    Todo es determinista: mismas entradas en cada máquina y en cada commit.
+    """
+    from PIL import Image, ImageDraw
+
+    marca = os.path.join(carpeta, ".corpus.json")
+    if os.path.exists(marca):
+        return
+    os.makedirs(carpeta, exist_ok=True)
+
+    # ---- Imágenes ----
+    carpeta_img = os.path.join(carpeta, "imagenes")
+    os.makedirs(carpeta_img, exist_ok=True)
+    for ancho, alto in TAMANOS_IMG:
+        for i in range(copias_img):
+            # Degradado + figuras: ni ruido puro (incomprimible) ni color plano
+            img = Image.linear_gradient("L").resize((ancho, alto)).convert("RGB")
+            dibujo = ImageDraw.Draw(img)
+            for k in range(20):
+                x = (k * 97 + i * 31) % ancho
+                y = (k * 53 + i * 17) % alto
+                color = ((k * 40) % 256, (i * 70) % 256, (k * 13) % 256)
+                dibujo.ellipse((x, y, x + ancho // 8, y + alto // 8), fill=color)
+            img.save(os.path.join(carpeta_img, f"img_{ancho}x{alto}_{i}.jpg"), "JPEG", quality=95)
+            img.save(os.path.join(carpeta_img, f"png_{ancho}x{alto}_{i}.png"), "PNG")
+
+    # ---- Videos ----
+    if shutil.which("ffmpeg"):
+        carpeta_vid = os.path.join(carpeta, "videos")
+        os.makedirs(carpeta_vid, exist_ok=True)
+        for nombre, tamano, duracion in CLIPS_VIDEO:
+            subprocess.run(
+                ["ffmpeg", "-nostdin", "-loglevel", "error", "-y",
+                 "-f", "lavfi", "-i", f"testsrc=duration={duracion}:size={tamano}:rate=30",
+                 "-f", "lavfi", "-i", f"sine=frequency=440:duration={duracion}",
+                 "-shortest", os.path.join(carpeta_vid, nombre)],
+                check=True
+            )
+    else:
+        print("⚠️ ffmpeg no está en el PATH: el corpus no tendrá videos")
+
+    with open(marca, "w", encoding="utf-8") as f:
+        json.dump({"imagenes": TAMANOS_IMG, "copias_img": copias_img,
+                   "videos": CLIPS_VIDEO}, f)
+
+
+def _tamano_carpeta(carpeta):
+    total, archivos = 0, 0
+    for raiz, _, nombres in os.walk(carpeta):
+        for nombre in nombres:
+            if nombre.startswith("."):
+                continue
+            total += os.path.getsize(os.path.join(raiz, nombre))
+            archivos += 1
+    return total, archivos
+
+
+# Cada cuánto se suma el RSS del árbol de procesos de la variante
+INTERVALO_RSS = 0.1
+
+
+def _rss_arbol(pid_raiz):
+    """
+    Suma de VmRSS (bytes) del proceso `pid_raiz` y todos sus descendientes
+    (procesos de trabajo, ffmpeg...), leyendo /proc. None fuera de Linux.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    hijos = {}
+    for nombre in os.listdir("/proc"):
+        if not nombre.isdigit():
+            continue
+        try:
+            with open(f"/proc/{nombre}/stat", encoding="utf-8") as f:
+                # El nombre del ejecutable va entre paréntesis y puede tener espacios
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        hijos.setdefault(ppid, []).append(int(nombre))
+
+    total = 0
+    pendientes = [pid_raiz]
+    while pendientes:
+        pid = pendientes.pop()
+        pendientes.extend(hijos.get(pid, ()))
+        try:
+            with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+                for linea in f:
+                    if linea.startswith("VmRSS:"):
+                        total += int(linea.split()[1]) * 1024
+                        break
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+def _muestrear_rss(pid, detener, medicion):
+    # Hilo de fondo: deja en medicion["pico"] el mayor RSS del árbol visto
+    while not detener.wait(INTERVALO_RSS):
+        rss = _rss_arbol(pid)
+        if rss is None:
+            return
+        medicion["pico"] = max(medicion.get("pico", 0), rss)
+
+
+def ejecutar_variante(variante, corpus):
+    """
+    Ejecuta una variante dentro de este proceso (lo llama el proceso hijo).
+    """
+    sys.path.insert(0, CARPETA_COMPRESORES)
+    script, funcion, extra = VARIANTES[variante]
+    nombre_modulo = os.path.splitext(script)[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(nombre_modulo, os.path.join(CARPETA_COMPRESORES, script))
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nombre_modulo] = modulo
+    spec.loader.exec_module(modulo)
+    getattr(modulo, funcion)(corpus, **extra)
+
+
+def medir_variante(variante, corpus, mostrar_salida=False):
+    """
+    Lanza la variante en un proceso nuevo y mide tiempo y CPU con os.wait4
+    (incluye a los procesos ffmpeg y de trabajo que lance). La memoria se
+    muestrea durante la ejecución sumando el RSS de todo el árbol de procesos
+    (pico_rss_mb, sólo Linux); pico_rss_max_proceso_mb es el de os.wait4: el
+    mayor de un solo proceso, no la suma.
+    Las cachés de metadatos y de autoajuste apuntan a una carpeta temporal
+    nueva en cada ejecución: siempre se mide en frío, sin depender de lo que
+    haya en ~/.cache/colcis.
+    """
+    carpeta_opt = corpus.rstrip(os.sep) + "-optimizados"
+    shutil.rmtree(carpeta_opt, ignore_errors=True)
+    bytes_entrada, archivos_entrada = _tamano_carpeta(corpus)
+
+    comando = [sys.executable, os.path.abspath(__file__), "--ejecutar", variante, corpus]
+    salida = None if mostrar_salida else subprocess.DEVNULL
+    with tempfile.TemporaryDirectory(prefix="colcis-cache-") as dir_cache:
+        entorno = dict(os.environ,
+                       COLCIS_CACHE_METADATOS=os.path.join(dir_cache, "metadatos.sqlite"),
+                       COLCIS_CACHE_AUTOAJUSTE=os.path.join(dir_cache, "autoajuste.json"))
+        inicio = time.perf_counter()
+        proceso = subprocess.Popen(comando, stdout=salida, stderr=salida, env=entorno)
+        detener, medicion = threading.Event(), {}
+        muestreo = threading.Thread(target=_muestrear_rss, args=(proceso.pid, detener, medicion),
+                                    daemon=True)
+        muestreo.start()
+        _, estado, uso = os.wait4(proceso.pid, 0)
+        transcurrido = time.perf_counter() - inicio
+        detener.set()
+        muestreo.join()
+    proceso.returncode = os.waitstatus_to_exitcode(estado)
+
+    bytes_salida, archivos_salida = _tamano_carpeta(carpeta_opt)
+    cpu = uso.ru_utime + uso.ru_stime
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    pico_rss_proceso = uso.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    pico_rss = medicion.get("pico")
+
+    return {
+        "variante": variante,
+        "codigo_salida": proceso.returncode,
+        "segundos": round(transcurrido, 3),
+        "archivos_entrada": archivos_entrada,
+        "archivos_salida": archivos_salida,
+        "archivos_por_s": round(archivos_entrada / transcurrido, 3),
+        "mb_entrada": round(bytes_entrada / 1e6, 3),
+        "mb_salida": round(bytes_salida / 1e6, 3),
+        "mb_s_entrada": round(bytes_entrada / 1e6 / transcurrido, 3),
+        "mb_s_salida": round(bytes_salida / 1e6 / transcurrido, 3),
+        "relacion_compresion": round(bytes_entrada / bytes_salida, 3) if bytes_salida else None,
+        "pico_rss_mb": round(pico_rss / 1e6, 1) if pico_rss is not None else None,
+        "pico_rss_max_proceso_mb": round(pico_rss_proceso / 1e6, 1),
+        "cpu_segundos": round(cpu, 3),
+        "uso_cpu": round(cpu / (transcurrido * (os.cpu_count() or 1)), 3),
+    }
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las variantes del optimizador")
+    parser.add_argument("--corpus", default=os.path.join(RAIZ, ".benchmark", "corpus"),
+                        help="Carpeta del corpus sintético (se genera si no existe)")
+    parser.add_argument("--variantes", nargs="+", choices=list(VARIANTES), default=list(VARIANTES))
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto stdout)")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida de cada variante")
+    parser.add_argument("--ejecutar", nargs=2, metavar=("VARIANTE", "CORPUS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.ejecutar:
+        ejecutar_variante(*args.ejecutar)
+        return
+
+    corpus = os.path.abspath(args.corpus)
+    generar_corpus(corpus)
+
+    resultados = []
+    for variante in args.variantes:
+        print(f"⏱️ {variante}...", file=sys.stderr)
+        resultados.append(medir_variante(variante, corpus, args.verbose))
+    shutil.rmtree(corpus.rstrip(os.sep) + "-optimizados", ignore_errors=True)
+
+    informe = {
+        "commit": _commit_actual(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "corpus": corpus,
+        "resultados": resultados,
+    }
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
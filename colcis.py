@@ -0,0 +1,216 @@
+import os
+import sys
+import time
+import argparse
+import importlib.util
+
+"""
+Punto de entrada por línea de comandos, sin interfaz gráfica (servidores, cron).
+Cada subcomando importa sus módulos al ejecutarse, así `--help` y las rutas
+que sólo tocan imágenes no cargan ffmpeg-python, Torch ni Whisper.
+
+Uso:
+    python colcis.py renombrar CARPETA
+    python colcis.py optimizar CARPETA [--calidad-img 80] [--crf 28] [--preset medium] ...
+    python colcis.py vigilar CARPETA [--espera 3] [--sondeo] ...
+    python colcis.py resolve CARPETA
+    python colcis.py transcribir ARCHIVOS_O_CARPETAS... [--modelo small]
+"""
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+CARPETA_COMPRESORES = os.path.join(RAIZ, "compresores")
+
+
+def _cargar(ruta, nombre):
+    """
+    Carga un script por ruta (algunos tienen guiones y no se pueden importar).
+    """
+    if nombre not in sys.modules:
+        spec = importlib.util.spec_from_file_location(nombre, ruta)
+        modulo = importlib.util.module_from_spec(spec)
+        sys.modules[nombre] = modulo
+        spec.loader.exec_module(modulo)
+    return sys.modules[nombre]
+
+
+def _configurar_metricas(carpeta):
+    import metricas
+    metricas.configurar(carpeta.rstrip(os.sep) + "-metricas.jsonl")
+    return metricas
+
+
+def _tiempo(inicio):
+    horas, resto = divmod(time.time() - inicio, 3600)
+    minutos, segundos = divmod(resto, 60)
+    return f"{int(horas)}h {int(minutos)}m {segundos:.2f}s"
+
+
+def cmd_renombrar(args):
+    from renombrarRegex import renombrarArchivos
+    metricas = _configurar_metricas(args.carpeta)
+    renombrarArchivos(args.carpeta)
+    metricas.imprimir_resumen()
+
+
+def cmd_optimizar(args):
+    optimizador = _cargar(os.path.join(CARPETA_COMPRESORES, "optimizer-3-hilos.py"),
+                          "optimizer_3_hilos")
+    metricas = _configurar_metricas(args.carpeta)
+    inicio = time.time()
+    opciones = {}
+    if args.versiones:
+        opciones.update(versiones_img=optimizador.VERSIONES_IMG,
+                        versiones_video=optimizador.VERSIONES_VIDEO)
+    if args.presupuesto_cpu:
+        opciones["presupuesto_cpu"] = args.presupuesto_cpu
+    optimizador.optimizar_archivos_parallel(
+        args.carpeta,
+        calidad_img=args.calidad_img,
+        codec_video=args.codec_video,
+        crf=args.crf,
+        preset=args.preset,
+        usar_manifiesto=not args.sin_manifiesto,
+        usar_hash=args.hash,
+        salidas_video=tuple(args.salidas_video),
+        hilos_por_video=args.hilos_por_video,
+        renombrar=not args.sin_renombrar,
+        memoria_img_mb=args.memoria_img_mb,
+        autoajuste=_objetivo_autoajuste(args),
+        formatos_img=tuple(args.formatos) if args.formatos else None,
+        **opciones
+    )
+    print("\n✅ Optimización de archivos completada")
+    print(f"Tiempo transcurrido: {_tiempo(inicio)}")
+    metricas.imprimir_resumen()
+
+
+def _presupuesto_cpu(valor):
+    # Los carriles de imágenes y videos necesitan al menos un núcleo cada uno
+    nucleos = int(valor)
+    if nucleos < 2:
+        raise argparse.ArgumentTypeError("se necesitan al menos 2 núcleos")
+    return nucleos
+
+
+def _argumentos_optimizar(p):
+    p.add_argument("carpeta")
+    p.add_argument("--calidad-img", type=int, default=80, help="Calidad JPEG (1-95)")
+    p.add_argument("--codec-video", default="libx265")
+    p.add_argument("--crf", type=int, default=28)
+    p.add_argument("--preset", default="medium")
+    p.add_argument("--salidas-video", nargs="+", default=["resolve"], choices=["opt", "resolve"])
+    p.add_argument("--versiones", action="store_true", help="Generar miniaturas, vistas previas y proxies")
+    p.add_argument("--sin-renombrar", action="store_true", help="No renombrar IMG_/MVI_ antes de optimizar")
+    p.add_argument("--hash", action="store_true", help="Comparar también por contenido")
+    p.add_argument("--presupuesto-cpu", type=_presupuesto_cpu,
+                   help="Núcleos a usar, mínimo 2 (por defecto todos)")
+    p.add_argument("--hilos-por-video", type=int, default=4)
+    p.add_argument("--memoria-img-mb", type=int, default=2048)
+    p.add_argument("--autoajustar", action="store_true",
+                   help="Elegir preset y crf por muestreo, por perfil de video (sólo salida opt)")
+    p.add_argument("--ssim-minimo", type=float, default=0.97, help="Objetivo del autoajuste")
+    p.add_argument("--kbps-maximo", type=float, help="Bitrate máximo del autoajuste (opcional)")
+    p.add_argument("--formatos", nargs="+", choices=["jpeg", "webp", "avif"],
+                   help="Guardar cada imagen en el más pequeño de estos formatos que pase el umbral de calidad")
+
+
+def _objetivo_autoajuste(args):
+    if not args.autoajustar:
+        return None
+    return {"ssim_minimo": args.ssim_minimo, "kbps_maximo": args.kbps_maximo}
+
+
+def cmd_vigilar(args):
+    optimizador = _cargar(os.path.join(CARPETA_COMPRESORES, "optimizer-3-hilos.py"),
+                          "optimizer_3_hilos")
+    _configurar_metricas(args.carpeta)
+    opciones = {}
+    if args.versiones:
+        opciones.update(versiones_img=optimizador.VERSIONES_IMG,
+                        versiones_video=optimizador.VERSIONES_VIDEO)
+    if args.presupuesto_cpu:
+        opciones["presupuesto_cpu"] = args.presupuesto_cpu
+    optimizador.vigilar_carpeta(
+        args.carpeta,
+        calidad_img=args.calidad_img,
+        codec_video=args.codec_video,
+        crf=args.crf,
+        preset=args.preset,
+        usar_hash=args.hash,
+        salidas_video=tuple(args.salidas_video),
+        hilos_por_video=args.hilos_por_video,
+        renombrar=not args.sin_renombrar,
+        memoria_img_mb=args.memoria_img_mb,
+        autoajuste=_objetivo_autoajuste(args),
+        formatos_img=tuple(args.formatos) if args.formatos else None,
+        espera=args.espera,
+        forzar_sondeo=args.sondeo,
+        **opciones
+    )
+
+
+def cmd_resolve(args):
+    resolve = _cargar(os.path.join(RAIZ, "to-resolve.py"), "to_resolve")
+    metricas = _configurar_metricas(args.carpeta)
+    resolve.convertir_videos_en_carpeta(args.carpeta)
+    metricas.imprimir_resumen()
+
+
+def cmd_transcribir(args):
+    transcribir = _cargar(os.path.join(RAIZ, "transcribir.py"), "transcribir")
+    import metricas
+    metricas.configurar(os.path.join(os.path.dirname(transcribir.DIR_CACHE_AUDIO), "metricas.jsonl"))
+    opciones = transcribir.opciones_decodificacion(args.beam_size, args.best_of, args.temperaturas)
+    transcribir.transcribir_lote(args.entradas, args.modelo, args.procesos, args.sobrescribir,
+                                 args.cuantizar, args.hilos_interop, opciones, args.dispositivo,
+                                 args.limite_memoria_mb)
+    metricas.imprimir_resumen()
+
+
+def main(argv=None):
+    sys.path.insert(0, CARPETA_COMPRESORES)
+    # Sólo argparse: las opciones de Whisper no cargan Torch ni numpy
+    from opciones_whisper import agregar_argumentos_cpu
+
+    parser = argparse.ArgumentParser(
+        prog="colcis", description="Renombrado, optimización, conversión a Resolve y subtítulos sin interfaz gráfica"
+    )
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("renombrar", aliases=["rename"], help="Renombra IMG_/MVI_ por fecha de captura")
+    p.add_argument("carpeta")
+    p.set_defaults(funcion=cmd_renombrar)
+
+    p = sub.add_parser("optimizar", aliases=["optimize"],
+                       help="Comprime imágenes y videos a CARPETA-optimizados")
+    _argumentos_optimizar(p)
+    p.add_argument("--sin-manifiesto", action="store_true", help="Reprocesar todo aunque no haya cambios")
+    p.set_defaults(funcion=cmd_optimizar)
+
+    p = sub.add_parser("vigilar", aliases=["watch"],
+                       help="Optimiza cada archivo nuevo en cuanto termina de copiarse a CARPETA")
+    _argumentos_optimizar(p)
+    p.add_argument("--espera", type=float, default=3.0,
+                   help="Segundos sin cambios de tamaño/mtime para dar un archivo por copiado")
+    p.add_argument("--sondeo", action="store_true", help="No usar inotify (p. ej. carpetas de red)")
+    p.set_defaults(funcion=cmd_vigilar)
+
+    p = sub.add_parser("resolve", aliases=["to-resolve"],
+                       help="Convierte los videos a H.264/AAC compatibles con DaVinci Resolve")
+    p.add_argument("carpeta")
+    p.set_defaults(funcion=cmd_resolve)
+
+    p = sub.add_parser("transcribir", aliases=["transcribe"], help="Genera subtítulos SRT con Whisper")
+    p.add_argument("entradas", nargs="+", help="Archivos o carpetas")
+    p.add_argument("--modelo", default="small", choices=["tiny", "base", "small", "medium", "large"])
+    p.add_argument("--procesos", type=int, default=1, help="Procesos en paralelo, cada uno con su modelo")
+    p.add_argument("--sobrescribir", action="store_true", help="Rehacer SRT ya existentes")
+    agregar_argumentos_cpu(p)
+    p.set_defaults(funcion=cmd_transcribir)
+
+    args = parser.parse_args(argv)
+    args.funcion(args)
+
+
+if __name__ == "__main__":
+    main()
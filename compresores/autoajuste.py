@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+
+import sondeo
+import orquestador
+
+"""
+Autoajuste de preset y CRF por tipo de video.
+Antes de codificar, se toman unas muestras cortas del original y se codifican
+con varios presets y CRF; de cada combinación se mide la velocidad, el bitrate
+resultante y la calidad objetiva (SSIM contra el original, con el filtro ssim
+de ffmpeg). Se elige la combinación más rápida que cumple el objetivo de
+calidad / tamaño, y la decisión se guarda por perfil de origen (resolución,
+fps, codec y formato de píxel), así los clips parecidos la reutilizan sin
+volver a muestrear. Una grabación de pantalla y un video de cámara suelen
+acabar con ajustes muy distintos.
+"""
+
+RUTA_CACHE = os.environ.get(
+    "COLCIS_CACHE_AUTOAJUSTE",
+    os.path.join(os.path.expanduser("~"), ".cache", "colcis", "autoajuste.json")
+)
+
+# Sólo x264/x265 comparten la escala de presets y CRF
+CODECS_AJUSTABLES = ("libx264", "libx265")
+# Del más rápido al más lento
+PRESETS_CANDIDATOS = ("veryfast", "faster", "fast", "medium")
+# Del archivo más pequeño al más grande
+CRFS_CANDIDATOS = (32, 28, 24)
+MUESTRAS = 3
+DURACION_MUESTRA = 4.0
+
+# Objetivo por defecto: SSIM medio mínimo y, opcionalmente, bitrate máximo (kbps)
+OBJETIVO = {"ssim_minimo": 0.97, "kbps_maximo": None}
+
+_lock = threading.Lock()
+_cache = None
+_locks_perfil = {}
+
+
+def _cargar_cache():
+    global _cache
+    if _cache is None:
+        try:
+            with open(RUTA_CACHE, encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _guardar_cache():
+    # Se escribe en cada decisión: son pocas y el proceso puede cortarse
+    os.makedirs(os.path.dirname(RUTA_CACHE), exist_ok=True)
+    ruta_tmp = f"{RUTA_CACHE}.{os.getpid()}.part"
+    with open(ruta_tmp, "w", encoding="utf-8") as f:
+        json.dump(_cache, f, indent=1)
+    os.replace(ruta_tmp, RUTA_CACHE)
+
+
+def perfil_origen(datos):
+    """
+    Perfil de un video según su sondeo: "1920x1080@29.97|h264|yuv420p".
+    """
+    video = next((s for s in datos["streams"] if s.get("codec_type") == "video"), {})
+    try:
+        numerador, denominador = video.get("r_frame_rate", "0/1").split("/")
+        fps = float(numerador) / float(denominador)
+    except (ValueError, ZeroDivisionError):
+        fps = 0.0
+    return (f"{video.get('width')}x{video.get('height')}@{fps:.2f}"
+            f"|{video.get('codec_name')}|{video.get('pix_fmt')}")
+
+
+def _muestras(duracion, cantidad=MUESTRAS, largo=DURACION_MUESTRA):
+    """
+    (inicio, largo) de cada muestra, repartidas a lo largo del video.
+    Un video corto se usa completo como única muestra. Sin duración conocida
+    o con menos de una muestra no hay nada fiable que medir: ValueError.
+    """
+    if not duracion or duracion < largo:
+        raise ValueError(f"duración {duracion or 0:.1f}s, menor que una muestra ({largo:.0f}s)")
+    if duracion <= cantidad * largo:
+        return [(0.0, duracion)]
+    return [(duracion * (i + 1) / (cantidad + 1) - largo / 2, largo) for i in range(cantidad)]
+
+
+def _ssim_medio(ruta_stats):
+    valores = []
+    with open(ruta_stats, encoding="utf-8") as f:
+        for linea in f:
+            for campo in linea.split():
+                if campo.startswith("All:"):
+                    valores.append(float(campo[4:]))
+    return sum(valores) / len(valores) if valores else 0.0
+
+
+def evaluar(ruta, muestras, codec_video, preset, crf, dir_trabajo, hilos_ffmpeg=None):
+    """
+    Codifica las muestras con (preset, crf) y devuelve
+    {"velocidad": x tiempo real, "kbps": bitrate de video, "ssim": SSIM medio}.
+    """
+    nombre = os.path.basename(ruta)
+    # Mismos límites de hilos que la codificación real (decodificador y
+    # codificador), así la velocidad medida es la que tendrá en el carril
+    entrada = ["-threads", str(hilos_ffmpeg)] if hilos_ffmpeg else []
+    hilos = [argumento
+             for opcion, valor in orquestador.opciones_hilos(codec_video, hilos_ffmpeg).items()
+             for argumento in (f"-{opcion}", str(valor))]
+    segundos_reloj, segundos_video, bytes_salida, ssims = 0.0, 0.0, 0, []
+    for i, (inicio, largo) in enumerate(muestras):
+        salida = os.path.join(dir_trabajo, f"{preset}_{crf}_{i}.mkv")
+        antes = time.monotonic()
+        orquestador.ejecutar([
+            *entrada, "-ss", f"{inicio:.3f}", "-t", f"{largo:.3f}", "-i", ruta,
+            "-map", "0:v:0", "-an", "-c:v", codec_video, "-preset", preset,
+            "-crf", str(crf), *hilos, salida
+        ], [salida], largo, f"{nombre} (autoajuste {preset} crf {crf})")
+        segundos_reloj += time.monotonic() - antes
+        segundos_video += largo
+        bytes_salida += os.path.getsize(salida)
+
+        # SSIM de la muestra contra el mismo tramo del original
+        ruta_stats = os.path.join(dir_trabajo, f"{preset}_{crf}_{i}.ssim")
+        # Dentro de un filtro ":" separa opciones (C:\... en Windows)
+        ruta_filtro = ruta_stats.replace("\\", "/").replace(":", "\\:")
+        orquestador.ejecutar([
+            "-ss", f"{inicio:.3f}", "-t", f"{largo:.3f}", "-i", ruta, "-i", salida,
+            "-filter_complex",
+            f"[0:v]format=yuv420p[a];[1:v]format=yuv420p[b];[a][b]ssim=stats_file={ruta_filtro}",
+            "-f", "null", "-"
+        ], (), largo, f"{nombre} (ssim {preset} crf {crf})")
+        ssims.append(_ssim_medio(ruta_stats))
+
+    return {
+        "velocidad": segundos_video / segundos_reloj if segundos_reloj else 0.0,
+        "kbps": bytes_salida * 8 / 1000 / segundos_video if segundos_video else 0.0,
+        "ssim": sum(ssims) / len(ssims) if ssims else 0.0,
+    }
+
+
+def _cumple(resultado, objetivo):
+    if resultado["ssim"] < objetivo.get("ssim_minimo", 0):
+        return False
+    kbps_maximo = objetivo.get("kbps_maximo")
+    return not kbps_maximo or resultado["kbps"] <= kbps_maximo
+
+
+def buscar_ajustes(ruta, codec_video, objetivo, hilos_ffmpeg=None, datos=None):
+    """
+    Muestrea el video y devuelve la decisión
+    {"preset", "crf", "velocidad", "kbps", "ssim", "cumple"}.
+    Los presets se prueban del más rápido al más lento y, en cada uno, los CRF
+    del más alto (archivo más pequeño) al más bajo: la primera combinación que
+    cumple es la más rápida que alcanza el objetivo y ahí termina el muestreo.
+    Si ninguna cumple se queda con la de mejor SSIM.
+    """
+    datos = datos or sondeo.sondear(ruta)
+    muestras = _muestras(sondeo.duracion(datos))
+    dir_trabajo = tempfile.mkdtemp(prefix=".autoajuste-")
+    candidatos = []
+    try:
+        for preset in PRESETS_CANDIDATOS:
+            for crf in CRFS_CANDIDATOS:
+                resultado = evaluar(ruta, muestras, codec_video, preset, crf,
+                                    dir_trabajo, hilos_ffmpeg)
+                resultado.update(preset=preset, crf=crf, cumple=_cumple(resultado, objetivo))
+                if resultado["cumple"]:
+                    return resultado
+                candidatos.append(resultado)
+    finally:
+        shutil.rmtree(dir_trabajo, ignore_errors=True)
+    return max(candidatos, key=lambda c: c["ssim"])
+
+
+def elegir_ajustes(ruta, codec_video, preset, crf, objetivo=None, hilos_ffmpeg=None):
+    """
+    (preset, crf) para codificar `ruta` con `codec_video`, usando la decisión
+    guardada para su perfil o muestreándolo la primera vez. Si el codec no se
+    puede ajustar o el muestreo falla, devuelve el `preset` y `crf` recibidos.
+    """
+    if codec_video not in CODECS_AJUSTABLES:
+        return preset, crf
+    objetivo = objetivo or OBJETIVO
+    try:
+        datos = sondeo.sondear(ruta)
+    except Exception as e:
+        print(f"⚠️| Autoajuste: no se pudo sondear {ruta}: {e}")
+        return preset, crf
+    clave = "|".join([
+        perfil_origen(datos), codec_video, json.dumps(objetivo, sort_keys=True),
+        ",".join(PRESETS_CANDIDATOS), ",".join(map(str, CRFS_CANDIDATOS))
+    ])
+
+    with _lock:
+        lock_perfil = _locks_perfil.setdefault(clave, threading.Lock())
+    # Dos clips del mismo perfil a la vez: el segundo espera la decisión del primero
+    with lock_perfil:
+        with _lock:
+            decision = _cargar_cache().get(clave)
+        if decision is None:
+            duracion = sondeo.duracion(datos)
+            if duracion < DURACION_MUESTRA:
+                # Un perfil no se decide (ni se guarda) con un clip que no se puede muestrear
+                print(f"⚠️| Autoajuste: {ruta} dura {duracion:.1f}s, se usa {preset} crf {crf}")
+                return preset, crf
+            try:
+                decision = buscar_ajustes(ruta, codec_video, objetivo, hilos_ffmpeg, datos)
+            except Exception as e:
+                print(f"⚠️| Autoajuste falló con {ruta}, se usa {preset} crf {crf}: {e}")
+                return preset, crf
+            with _lock:
+                _cargar_cache()[clave] = decision
+                _guardar_cache()
+            estado = "✅" if decision["cumple"] else "⚠️ no alcanza el objetivo,"
+            print(f"🎛️| Autoajuste {perfil_origen(datos)}: {estado} {decision['preset']} "
+                  f"crf {decision['crf']} (SSIM {decision['ssim']:.4f}, "
+                  f"{decision['kbps']:.0f} kbps, {decision['velocidad']:.2f}x)")
+    return decision["preset"], decision["crf"]
@@ -0,0 +1,365 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import importlib.util
+from types import SimpleNamespace
+
+import orquestador
+
+"""
+Cola de trabajos durable para repartir la optimización entre varias máquinas.
+El recorrido de la carpeta deja un trabajo por archivo en un SQLite que vive en
+el almacenamiento compartido; cualquier cantidad de trabajadores (en cualquier
+nodo que monte la carpeta en la misma ruta) reclama trabajos con un arriendo
+que renueva con latidos mientras procesa. Si un trabajador muere, su arriendo
+vence y el trabajo vuelve a quedar disponible.
+
+Uso:
+    python cola.py encolar CARPETA [--esperar]
+    python cola.py trabajar CARPETA   (uno o varios, en uno o varios nodos)
+"""
+
+# Segundos que dura un arriendo sin latidos antes de devolver el trabajo a la cola
+DURACION_ARRIENDO = 120
+MAX_INTENTOS = 3
+
+PENDIENTE, EN_CURSO, HECHO, FALLIDO = "pendiente", "en_curso", "hecho", "fallido"
+
+
+def ruta_cola_por_defecto(carpeta):
+    return os.path.join(os.path.abspath(carpeta).rstrip(os.sep) + "-optimizados", ".cola.sqlite")
+
+
+class ColaTrabajos:
+    """
+    Cola persistente en SQLite con arriendos. Cada proceso abre su propia
+    instancia; las reclamaciones usan BEGIN IMMEDIATE para que dos
+    trabajadores nunca tomen el mismo trabajo.
+    Usa el diario clásico (no WAL) porque WAL no funciona en montajes de red.
+    """
+
+    def __init__(self, ruta_db, duracion_arriendo=DURACION_ARRIENDO,
+                 max_intentos=MAX_INTENTOS, commit_cada=200, segundos_por_lote=1.0):
+        self.ruta_db = ruta_db
+        self.duracion_arriendo = duracion_arriendo
+        self.max_intentos = max_intentos
+        self.commit_cada = commit_cada
+        self.segundos_por_lote = segundos_por_lote
+        self._pendientes = 0
+        self._inicio_lote = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(ruta_db)), exist_ok=True)
+        self._con = sqlite3.connect(ruta_db, timeout=60, check_same_thread=False,
+                                    isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=DELETE")
+        self._con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS trabajos (
+                id          INTEGER PRIMARY KEY,
+                ruta        TEXT UNIQUE NOT NULL,
+                argumentos  TEXT NOT NULL,
+                parametros  TEXT NOT NULL,
+                tamano      INTEGER NOT NULL,
+                mtime_ns    INTEGER NOT NULL,
+                estado      TEXT NOT NULL,
+                intentos    INTEGER NOT NULL DEFAULT 0,
+                trabajador  TEXT,
+                vence       REAL,
+                salidas     TEXT,
+                error       TEXT,
+                registrado  INTEGER NOT NULL DEFAULT 0,
+                actualizado REAL NOT NULL
+            )
+            """
+        )
+        self._con.execute("CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, id)")
+
+    # ---- Lado del recorrido ----
+
+    def encolar(self, ruta, argumentos, parametros, st):
+        """
+        Deja (o vuelve a dejar) un archivo como pendiente. `argumentos` son los
+        de procesar_archivo como diccionario; los trabajos en curso no se tocan.
+        Uno que ya estaba pendiente toma los argumentos y parámetros nuevos y
+        conserva su lugar en la cola y sus intentos.
+        Las escrituras se agrupan en lotes cortos (para no bloquear a los
+        trabajadores): llamar a confirmar() al terminar el recorrido.
+        """
+        with self._lock:
+            if not self._con.in_transaction:
+                self._con.execute("BEGIN IMMEDIATE")
+                self._inicio_lote = time.monotonic()
+            self._con.execute(
+                "INSERT INTO trabajos (ruta, argumentos, parametros, tamano, mtime_ns, "
+                "estado, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(ruta) DO UPDATE SET argumentos = excluded.argumentos, "
+                "parametros = excluded.parametros, tamano = excluded.tamano, "
+                "mtime_ns = excluded.mtime_ns, estado = excluded.estado, "
+                "intentos = CASE WHEN trabajos.estado = ? THEN trabajos.intentos ELSE 0 END, "
+                "trabajador = NULL, vence = NULL, error = NULL, registrado = 0, "
+                "actualizado = excluded.actualizado "
+                "WHERE trabajos.estado != ?",
+                (ruta, json.dumps(argumentos), json.dumps(parametros, sort_keys=True),
+                 st.st_size, st.st_mtime_ns, PENDIENTE, time.time(), PENDIENTE, EN_CURSO)
+            )
+            self._pendientes += 1
+            if self._pendientes >= self.commit_cada or \
+                    time.monotonic() - self._inicio_lote > self.segundos_por_lote:
+                self._con.commit()
+                self._pendientes = 0
+
+    def confirmar(self):
+        with self._lock:
+            if self._con.in_transaction:
+                self._con.commit()
+            self._pendientes = 0
+
+    def terminados_sin_registrar(self):
+        """
+        Trabajos terminados que aún no se pasaron al manifiesto:
+        lista de (id, ruta, parametros, salidas, st).
+        """
+        with self._lock:
+            filas = self._con.execute(
+                "SELECT id, ruta, parametros, salidas, tamano, mtime_ns FROM trabajos "
+                "WHERE estado = ? AND registrado = 0", (HECHO,)
+            ).fetchall()
+        return [
+            (id_trabajo, ruta, json.loads(parametros), json.loads(salidas),
+             SimpleNamespace(st_size=tamano, st_mtime_ns=mtime_ns))
+            for id_trabajo, ruta, parametros, salidas, tamano, mtime_ns in filas
+        ]
+
+    def marcar_registrados(self, ids):
+        with self._lock:
+            self._con.executemany("UPDATE trabajos SET registrado = 1 WHERE id = ?",
+                                  [(i,) for i in ids])
+
+    def resumen(self):
+        """
+        Cantidad de trabajos por estado.
+        """
+        with self._lock:
+            filas = self._con.execute(
+                "SELECT estado, COUNT(*) FROM trabajos GROUP BY estado").fetchall()
+        conteo = {PENDIENTE: 0, EN_CURSO: 0, HECHO: 0, FALLIDO: 0}
+        conteo.update(dict(filas))
+        return conteo
+
+    # ---- Lado del trabajador ----
+
+    def reclamar(self, trabajador):
+        """
+        Toma el siguiente trabajo pendiente (o uno con el arriendo vencido) y
+        devuelve (id, ruta, argumentos), o None si no hay nada que hacer.
+        Los trabajos que agotan sus intentos pasan a "fallido".
+        """
+        with self._lock:
+            while True:
+                ahora = time.time()
+                self._con.execute("BEGIN IMMEDIATE")
+                try:
+                    fila = self._con.execute(
+                        "SELECT id, ruta, argumentos, intentos FROM trabajos "
+                        "WHERE estado = ? OR (estado = ? AND vence < ?) ORDER BY id LIMIT 1",
+                        (PENDIENTE, EN_CURSO, ahora)
+                    ).fetchone()
+                    if fila is None:
+                        self._con.commit()
+                        return None
+                    id_trabajo, ruta, argumentos, intentos = fila
+                    if intentos >= self.max_intentos:
+                        self._con.execute(
+                            "UPDATE trabajos SET estado = ?, trabajador = NULL, vence = NULL, "
+                            "error = COALESCE(error, 'arriendo vencido'), actualizado = ? "
+                            "WHERE id = ?", (FALLIDO, ahora, id_trabajo))
+                        self._con.commit()
+                        continue
+                    self._con.execute(
+                        "UPDATE trabajos SET estado = ?, trabajador = ?, vence = ?, "
+                        "intentos = intentos + 1, actualizado = ? WHERE id = ?",
+                        (EN_CURSO, trabajador, ahora + self.duracion_arriendo, ahora, id_trabajo))
+                    self._con.commit()
+                    return id_trabajo, ruta, json.loads(argumentos)
+                except BaseException:
+                    self._con.rollback()
+                    raise
+
+    def latir(self, id_trabajo, trabajador):
+        """
+        Renueva el arriendo. Devuelve False si el trabajo ya no es de este
+        trabajador (su arriendo venció y lo tomó otro).
+        """
+        with self._lock:
+            cursor = self._con.execute(
+                "UPDATE trabajos SET vence = ? WHERE id = ? AND trabajador = ? AND estado = ?",
+                (time.time() + self.duracion_arriendo, id_trabajo, trabajador, EN_CURSO))
+            return cursor.rowcount == 1
+
+    def completar(self, id_trabajo, trabajador, salidas):
+        with self._lock:
+            self._con.execute(
+                "UPDATE trabajos SET estado = ?, salidas = ?, error = NULL, vence = NULL, "
+                "actualizado = ? WHERE id = ? AND trabajador = ? AND estado = ?",
+                (HECHO, json.dumps(list(salidas)), time.time(), id_trabajo, trabajador, EN_CURSO))
+
+    def fallar(self, id_trabajo, trabajador, error):
+        """
+        Registra un fallo: vuelve a la cola si le quedan intentos.
+        """
+        with self._lock:
+            self._con.execute(
+                "UPDATE trabajos SET estado = CASE WHEN intentos < ? THEN ? ELSE ? END, "
+                "error = ?, trabajador = NULL, vence = NULL, actualizado = ? "
+                "WHERE id = ? AND trabajador = ? AND estado = ?",
+                (self.max_intentos, PENDIENTE, FALLIDO, str(error), time.time(),
+                 id_trabajo, trabajador, EN_CURSO))
+
+    def cerrar(self):
+        self.confirmar()
+        with self._lock:
+            self._con.close()
+
+
+def _cargar_optimizador():
+    """
+    Carga optimizer-3-hilos.py (su nombre con guiones no se puede importar).
+    """
+    nombre = "optimizer_3_hilos"
+    if nombre not in sys.modules:
+        ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), "optimizer-3-hilos.py")
+        spec = importlib.util.spec_from_file_location(nombre, ruta)
+        modulo = importlib.util.module_from_spec(spec)
+        sys.modules[nombre] = modulo
+        spec.loader.exec_module(modulo)
+    return sys.modules[nombre]
+
+
+def trabajar(ruta_cola, hilos_ffmpeg=None, segmentos_largos=None,
+             salir_al_vaciar=False, espera=5):
+    """
+    Bucle de un trabajador: reclama un trabajo, lo procesa con procesar_archivo
+    mientras un hilo renueva el arriendo, y reporta el resultado.
+    Si el arriendo se pierde (otro trabajador ya tomó el archivo) se cancelan
+    los ffmpeg de este proceso y el resultado no se reporta.
+    Con `salir_al_vaciar` termina cuando no quedan trabajos pendientes.
+    """
+    optimizador = _cargar_optimizador()
+    cola = ColaTrabajos(ruta_cola)
+    trabajador = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"👷| Trabajador {trabajador} sobre {ruta_cola}")
+    hechos = 0
+    try:
+        while True:
+            trabajo = cola.reclamar(trabajador)
+            if trabajo is None:
+                if salir_al_vaciar and not cola.resumen()[EN_CURSO]:
+                    break
+                time.sleep(espera)
+                continue
+
+            id_trabajo, ruta, argumentos = trabajo
+            detener_latidos = threading.Event()
+            arriendo_perdido = threading.Event()
+
+            def latir():
+                while not detener_latidos.wait(cola.duracion_arriendo / 3):
+                    if not cola.latir(id_trabajo, trabajador):
+                        print(f"⚠️| Se perdió el arriendo de {ruta}, se cancela")
+                        arriendo_perdido.set()
+                        break
+                # Este proceso trabaja de a un archivo: cancelar todo corta sólo el
+                # suyo, y se repite por si procesar_archivo lanza otro ffmpeg después
+                while arriendo_perdido.is_set():
+                    orquestador.cancelar()
+                    if detener_latidos.wait(1):
+                        break
+
+            hilo_latidos = threading.Thread(target=latir, daemon=True)
+            hilo_latidos.start()
+            try:
+                argumentos.update(hilos_ffmpeg=hilos_ffmpeg, segmentos_largos=segmentos_largos)
+                salidas = optimizador.procesar_archivo(ruta, **argumentos)
+                if arriendo_perdido.is_set():
+                    pass  # el resultado lo reporta el trabajador que lo tomó
+                elif salidas:
+                    cola.completar(id_trabajo, trabajador, salidas)
+                    hechos += 1
+                else:
+                    cola.fallar(id_trabajo, trabajador, "sin salidas")
+            except Exception as e:
+                if not arriendo_perdido.is_set():
+                    print(f"❌| Error con {ruta}: {e}")
+                    cola.fallar(id_trabajo, trabajador, e)
+            finally:
+                detener_latidos.set()
+                hilo_latidos.join()
+    finally:
+        cola.cerrar()
+    print(f"👷| {trabajador}: {hechos} trabajos terminados")
+
+
+def esperar(carpeta, ruta_cola, intervalo=10):
+    """
+    Espera a que la cola se vacíe, pasando al manifiesto lo que van
+    terminando los trabajadores.
+    """
+    optimizador = _cargar_optimizador()
+    cola = ColaTrabajos(ruta_cola)
+    try:
+        while True:
+            optimizador.registrar_terminados(carpeta, cola)
+            conteo = cola.resumen()
+            print(f"📋| Pendientes: {conteo[PENDIENTE]} | En curso: {conteo[EN_CURSO]} | "
+                  f"Hechos: {conteo[HECHO]} | Fallidos: {conteo[FALLIDO]}")
+            if not conteo[PENDIENTE] and not conteo[EN_CURSO]:
+                return conteo
+            time.sleep(intervalo)
+    finally:
+        cola.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimización distribuida con cola de trabajos")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_encolar = sub.add_parser("encolar", help="Recorre la carpeta y encola los archivos")
+    p_encolar.add_argument("carpeta")
+    p_encolar.add_argument("--cola", help="Archivo de la cola (por defecto CARPETA-optimizados/.cola.sqlite)")
+    p_encolar.add_argument("--salidas-video", nargs="+", default=["resolve"], choices=["opt", "resolve"])
+    p_encolar.add_argument("--versiones", action="store_true", help="Generar miniaturas y proxies")
+    p_encolar.add_argument("--renombrar", action="store_true")
+    p_encolar.add_argument("--esperar", action="store_true",
+                           help="Quedarse hasta que los trabajadores vacíen la cola")
+
+    p_trabajar = sub.add_parser("trabajar", help="Procesa trabajos de la cola")
+    p_trabajar.add_argument("carpeta")
+    p_trabajar.add_argument("--cola")
+    p_trabajar.add_argument("--hilos-ffmpeg", type=int, help="Valor de -threads de cada ffmpeg")
+    p_trabajar.add_argument("--segmentos", type=int, help="Trozos paralelos para videos largos")
+    p_trabajar.add_argument("--salir-al-vaciar", action="store_true")
+    args = parser.parse_args()
+
+    carpeta = os.path.abspath(args.carpeta)
+    ruta_cola = args.cola or ruta_cola_por_defecto(carpeta)
+
+    if args.comando == "encolar":
+        optimizador = _cargar_optimizador()
+        opciones = dict(salidas_video=tuple(args.salidas_video))
+        if args.versiones:
+            opciones.update(versiones_img=optimizador.VERSIONES_IMG,
+                            versiones_video=optimizador.VERSIONES_VIDEO)
+        optimizador.encolar_carpeta(carpeta, ruta_cola, renombrar=args.renombrar, **opciones)
+        if args.esperar:
+            esperar(carpeta, ruta_cola)
+    else:
+        trabajar(ruta_cola, args.hilos_ffmpeg, args.segmentos, args.salir_al_vaciar)
+
+
+if __name__ == "__main__":
+    main()
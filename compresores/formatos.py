@@ -0,0 +1,104 @@
+import io
+import math
+from PIL import Image, ImageChops, ImageStat, features
+
+"""
+Elección del formato de salida de cada imagen por tamaño.
+La imagen ya decodificada se codifica en memoria a cada formato candidato
+habilitado (JPEG, WebP y AVIF si Pillow lo soporta) y se queda el resultado
+más pequeño que pasa el umbral de calidad (PSNR contra la imagen de partida).
+Las imágenes con transparencia real no se ofrecen a JPEG, así el canal alfa se
+conserva; el EXIF se copia igual en todos los formatos.
+"""
+
+# Formatos por defecto, en orden de preferencia ante un empate de tamaño
+FORMATOS_IMG = ("jpeg", "webp", "avif")
+EXTENSIONES_FORMATO = {"jpeg": ".jpeg", "webp": ".webp", "avif": ".avif"}
+
+# Calidad mínima aceptada (dB); por encima de ~40 dB las diferencias apenas se ven
+PSNR_MINIMO = 36.0
+# Lado con el que se compara la calidad (medir a tamaño completo no cambia la decisión)
+_LADO_COMPARACION = 1024
+
+
+def formatos_disponibles(formatos=FORMATOS_IMG):
+    """
+    Filtra los formatos que el Pillow instalado sabe escribir.
+    """
+    disponibles = []
+    for formato in formatos:
+        if formato == "jpeg" or (formato in ("webp", "avif") and features.check(formato)):
+            disponibles.append(formato)
+    return tuple(disponibles)
+
+
+def tiene_alfa(img):
+    """
+    Indica si la imagen tiene transparencia real (no sólo un canal alfa opaco).
+    """
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        return img.convert("RGBA").getchannel("A").getextrema()[0] < 255
+    return False
+
+
+def _opciones(formato, calidad):
+    if formato == "jpeg":
+        return {"quality": calidad, "optimize": True}
+    if formato == "webp":
+        return {"quality": calidad, "method": 4}
+    return {"quality": calidad, "speed": 6}
+
+
+def psnr(original, candidata):
+    """
+    PSNR en dB entre dos imágenes del mismo tamaño (inf si son idénticas).
+    Se mide sobre una copia reducida, en el modo de la original.
+    """
+    if max(original.size) > _LADO_COMPARACION:
+        original = original.copy()
+        original.thumbnail((_LADO_COMPARACION, _LADO_COMPARACION))
+        candidata = candidata.resize(original.size)
+    candidata = candidata.convert(original.mode)
+    cuadrados = ImageStat.Stat(ImageChops.difference(original, candidata)).rms
+    mse = sum(v * v for v in cuadrados) / len(cuadrados)
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def codificar(img, formato, calidad, exif_bytes=None):
+    """
+    Codifica `img` en memoria y devuelve los bytes.
+    """
+    if formato == "jpeg" and img.mode != "RGB":
+        img = img.convert("RGB")
+    opciones = _opciones(formato, calidad)
+    if exif_bytes:
+        opciones["exif"] = exif_bytes
+    buffer = io.BytesIO()
+    img.save(buffer, formato.upper(), **opciones)
+    return buffer.getvalue()
+
+
+def elegir_formato(img, calidad, formatos=FORMATOS_IMG, exif_bytes=None,
+                   psnr_minimo=PSNR_MINIMO):
+    """
+    Devuelve (formato, datos, psnr) con la codificación más pequeña de `img`
+    que alcanza `psnr_minimo`. Si ninguna lo alcanza se queda la de mejor
+    PSNR. `img` debe venir en RGB, o en RGBA si tiene transparencia.
+    """
+    candidatos = formatos_disponibles(formatos)
+    if tiene_alfa(img):
+        candidatos = tuple(f for f in candidatos if f != "jpeg") or ("webp",)
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    resultados = []
+    for formato in candidatos:
+        datos = codificar(img, formato, calidad, exif_bytes)
+        with Image.open(io.BytesIO(datos)) as decodificada:
+            calidad_medida = psnr(img, decodificada)
+        resultados.append((formato, datos, calidad_medida))
+
+    validos = [r for r in resultados if r[2] >= psnr_minimo]
+    if validos:
+        return min(validos, key=lambda r: len(r[1]))
+    return max(resultados, key=lambda r: r[2])
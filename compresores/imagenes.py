@@ -0,0 +1,300 @@
+import os
+import uuid
+import shutil
+import threading
+import subprocess
+from PIL import Image, ImageOps
+import metricas
+import metadatos
+import formatos as formatos_img
+
+"""
+Optimización de imágenes independiente de los scripts principales.
+Vive en su propio módulo para que pueda ejecutarse en un ProcessPoolExecutor
+(las funciones de optimizer-3-hilos.py no se pueden importar por nombre).
+"""
+
+EXTENSIONES_IMG = (".jpg", ".png")
+
+# Versiones reducidas que se pueden pedir junto a la imagen optimizada
+VERSIONES_IMG = {
+    "miniatura": {"sufijo": "_thumb.jpeg", "lado": 320, "calidad": 70, "carpeta": "miniaturas"},
+    "vista": {"sufijo": "_preview.jpeg", "lado": 1600, "calidad": 80, "carpeta": "miniaturas"},
+}
+
+# Memoria que pueden ocupar a la vez las imágenes decodificadas (MB)
+MEMORIA_IMG_MB = 2048
+
+# Distinta en cada proceso: dos trabajadores de la cola (quizá en otros nodos)
+# que procesen el mismo archivo nunca escriben ni borran el mismo temporal
+_MARCA_TEMPORAL = uuid.uuid4().hex[:8]
+
+# Tabla de cuantización de luminancia de referencia (JPEG Anexo K, calidad 50);
+# libjpeg la escala según la calidad pedida
+_TABLA_LUMINANCIA = (
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99,
+)
+
+# Bytes por píxel de cada modo de Pillow (los no listados se cuentan como 4)
+_BYTES_POR_PIXEL = {"1": 1, "L": 1, "P": 1, "LA": 2, "I;16": 2, "RGB": 3,
+                    "YCbCr": 3, "LAB": 3, "HSV": 3, "RGBA": 4, "CMYK": 4,
+                    "I": 4, "F": 4}
+
+
+def memoria_estimada(ruta):
+    """
+    Estima la memoria que ocupa decodificar una imagen leyendo sólo la cabecera
+    (vía la caché de metadatos): ancho x alto x bandas del original más la
+    copia RGB que se guarda.
+    Devuelve 0 si no se puede leer la cabecera (el error saldrá al procesarla).
+    """
+    try:
+        datos = metadatos.datos_imagen(ruta)
+        ancho, alto = datos["ancho"], datos["alto"]
+        bytes_pixel = _BYTES_POR_PIXEL.get(datos["modo"], 4)
+    except Exception:
+        return 0
+    return ancho * alto * (bytes_pixel + 3)
+
+
+class PresupuestoMemoria:
+    """
+    Control de admisión por memoria: antes de decodificar una imagen se
+    reserva su tamaño estimado, y sólo si cabe en el límite junto a las que ya
+    están en curso. Una imagen mayor que el límite entero se admite sola,
+    cuando no hay otras. Quien no consigue reservar no espera aquí: así una
+    imagen grande que espera memoria no frena a las pequeñas que sí caben.
+    """
+
+    def __init__(self, limite_mb=MEMORIA_IMG_MB):
+        self.limite = int(limite_mb * 1024 * 1024)
+        self.en_uso = 0
+        self._lock = threading.Lock()
+
+    def intentar_reservar(self, cantidad):
+        """
+        Reserva `cantidad` bytes si caben ahora; si no, devuelve False.
+        """
+        with self._lock:
+            if self.en_uso and self.en_uso + cantidad > self.limite:
+                return False
+            self.en_uso += cantidad
+            return True
+
+    def liberar(self, cantidad):
+        with self._lock:
+            self.en_uso -= cantidad
+
+
+def ruta_temporal(ruta):
+    """
+    Ruta temporal junto a la salida final (conserva la extensión para ffmpeg).
+    Se escribe ahí y se renombra al terminar, así una ejecución interrumpida
+    nunca deja una salida a medias con el nombre definitivo.
+    """
+    base, ext = os.path.splitext(ruta)
+    return f"{base}.{_MARCA_TEMPORAL}.part{ext}"
+
+
+def ruta_version(ruta_destino, nombre, version):
+    """
+    Ruta de salida de una versión (miniatura, vista previa, proxy...):
+    `carpeta` opcional dentro del destino + nombre + `sufijo`.
+    """
+    return os.path.join(ruta_destino, version.get("carpeta", ""), f"{nombre}{version['sufijo']}")
+
+
+def reducir(img, lado):
+    """
+    Reduce `img` para que su lado mayor no pase de `lado`: primero reduce()
+    por un factor entero (rápido, promedia bloques) y luego un ajuste fino.
+    """
+    factor = max(1, max(img.size) // lado)
+    if factor > 1:
+        img = img.reduce(factor)
+    if max(img.size) > lado:
+        img = ImageOps.contain(img, (lado, lado), Image.LANCZOS)
+    return img
+
+
+def calidad_jpeg(img):
+    """
+    Estima la calidad (1-100, escala de libjpeg) con la que se guardó un JPEG
+    a partir de su tabla de cuantización de luminancia, que Pillow lee de la
+    cabecera al abrir el archivo (sin decodificar píxeles).
+    Devuelve None si no es un JPEG o no trae tablas.
+    """
+    tablas = getattr(img, "quantization", None)
+    if not tablas or 0 not in tablas:
+        return None
+    escala = sum(tablas[0]) * 100 / sum(_TABLA_LUMINANCIA)
+    # Inversa del escalado de libjpeg: 5000/q por debajo de 50, 200-2q por encima
+    calidad = (200 - escala) / 2 if escala <= 100 else 5000 / escala
+    return max(1, min(100, round(calidad)))
+
+
+def copiar_sin_recodificar(ruta_origen, ruta):
+    """
+    Copia un JPEG a `ruta` sin recodificarlo: con jpegtran (si está instalado)
+    se reoptimizan las tablas Huffman sin pérdida y se conserva todo el EXIF;
+    si no, copia tal cual. Devuelve "jpegtran" o "copia".
+    """
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    ruta_tmp = ruta_temporal(ruta)
+    jpegtran = shutil.which("jpegtran")
+    if jpegtran:
+        resultado = subprocess.run(
+            [jpegtran, "-copy", "all", "-optimize", "-outfile", ruta_tmp, ruta_origen],
+            capture_output=True
+        )
+        # Si no se gana nada (o falla) se copia el original
+        if resultado.returncode == 0 and os.path.getsize(ruta_tmp) < os.path.getsize(ruta_origen):
+            os.replace(ruta_tmp, ruta)
+            return "jpegtran"
+    shutil.copyfile(ruta_origen, ruta_tmp)
+    os.replace(ruta_tmp, ruta)
+    return "copia"
+
+
+def _guardar_jpeg(img, ruta, calidad, exif_bytes=None):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    ruta_tmp = ruta_temporal(ruta)
+    if exif_bytes:
+        img.save(ruta_tmp, "JPEG", quality=calidad, optimize=True, exif=exif_bytes)
+    else:
+        img.save(ruta_tmp, "JPEG", quality=calidad, optimize=True)
+    os.replace(ruta_tmp, ruta)
+
+
+def _guardar_bytes(datos, ruta):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    ruta_tmp = ruta_temporal(ruta)
+    with open(ruta_tmp, "wb") as f:
+        f.write(datos)
+    os.replace(ruta_tmp, ruta)
+
+
+def _salidas_principales(ruta_destino, nombre):
+    # Una ejecución con elección de formato puede haber dejado cualquiera de ellas
+    return [os.path.join(ruta_destino, f"{nombre}_opt{ext}")
+            for ext in formatos_img.EXTENSIONES_FORMATO.values()]
+
+
+def _quitar_otros_formatos(ruta_destino, nombre, ruta_nueva):
+    """
+    Borra la salida principal en los otros formatos: si en esta ejecución se
+    eligió otro (p. ej. .avif donde antes salió .webp), la vieja no debe quedar.
+    """
+    for ruta in _salidas_principales(ruta_destino, nombre):
+        if ruta != ruta_nueva and os.path.exists(ruta):
+            os.remove(ruta)
+
+
+def optimizar_imagen(ruta_archivo, ruta_destino, calidad_img, sobrescribir=False,
+                     versiones=None, formatos=None):
+    """
+    Comprime una imagen a JPEG conservando el EXIF original si existe.
+    `versiones` ({nombre: {"sufijo", "lado", "calidad", "carpeta"}}) añade
+    copias reducidas (miniaturas, vistas previas) sacadas de la misma
+    decodificación. Si sólo faltan versiones, el JPEG se decodifica ya
+    reducido con draft().
+    Un JPEG guardado ya con calidad igual o menor que `calidad_img` (estimada
+    por sus tablas de cuantización) se copia, o se optimiza sin pérdida con
+    jpegtran si está disponible; esa copia es la salida final.
+    Con `formatos` (p. ej. ("jpeg", "webp", "avif")) la imagen se codifica en
+    cada uno y se guarda el más pequeño que pasa el umbral de calidad
+    (`_opt.jpeg`, `_opt.webp` o `_opt.avif`); la transparencia se conserva.
+    Devuelve la lista de salidas generadas, o None si se saltó; si falla se
+    relanza la excepción, para que quien la llama la cuente como error.
+    """
+    nombre, ext = os.path.splitext(os.path.basename(ruta_archivo))
+    ext = ext.lower()
+    ruta_nueva = os.path.join(ruta_destino, f"{nombre}_opt.jpeg")
+    if formatos:
+        # La salida de una ejecución anterior puede tener cualquiera de las extensiones
+        ruta_nueva = next(
+            (r for r in _salidas_principales(ruta_destino, nombre) if os.path.exists(r)),
+            ruta_nueva
+        )
+    versiones = versiones or {}
+    rutas_versiones = {clave: ruta_version(ruta_destino, nombre, version)
+                       for clave, version in versiones.items()}
+    falta_principal = sobrescribir or not os.path.exists(ruta_nueva)
+    versiones_pendientes = [clave for clave, ruta in rutas_versiones.items()
+                            if sobrescribir or not os.path.exists(ruta)]
+    if not falta_principal and not versiones_pendientes:
+        print(f"⏭️ Saltado (ya existe): {ruta_nueva}")
+        return None
+
+    with metricas.etapa("imagen", ruta_archivo, codec="jpeg",
+                        versiones=versiones_pendientes) as evento:
+        img = Image.open(ruta_archivo)
+        recodificar = falta_principal
+        copia = None
+        if falta_principal and not formatos and img.format == "JPEG":
+            # Recodificar a la misma calidad o mayor suma pérdida sin
+            # ahorrar bytes: se copia sin pérdida y esa es la salida final
+            calidad_origen = calidad_jpeg(img)
+            evento["calidad_origen"] = calidad_origen
+            if calidad_origen is not None and calidad_origen <= calidad_img:
+                copia = copiar_sin_recodificar(ruta_archivo, ruta_nueva)
+                recodificar = False
+                _quitar_otros_formatos(ruta_destino, nombre, ruta_nueva)
+                print(f"🖼️| SR ({copia}, calidad ~{calidad_origen}): "
+                      f"{ruta_archivo} -> {ruta_nueva}") #SR: Sin recodificar
+        if falta_principal:
+            evento["decision"] = copia or "recodificar"
+
+        if not recodificar and not versiones_pendientes:
+            salidas = [ruta_nueva, *rutas_versiones.values()]
+            evento["bytes_salida"] = metricas.tamano(salidas)
+            return salidas
+        if not recodificar:
+            # Sólo hacen falta versiones pequeñas: el decodificador JPEG
+            # puede entregar la imagen ya reducida a 1/2, 1/4 u 1/8
+            lado = max(versiones[clave]["lado"] for clave in versiones_pendientes)
+            img.draft("RGB", (lado, lado))
+        img = ImageOps.exif_transpose(img)
+        # Sólo la elección de formato puede conservar el canal alfa
+        con_alfa = bool(formatos) and recodificar and formatos_img.tiene_alfa(img)
+        img = img.convert("RGBA" if con_alfa else "RGB")
+
+        if recodificar:
+            # Intentar obtener EXIF si existe
+            # (el de img.info ya viene sin la orientación aplicada)
+            exif_bytes = img.info.get("exif", None)
+            if not exif_bytes and ext != ".png":
+                # EXIF en bruto ya leído por la caché de metadatos
+                exif_bytes = metadatos.datos_imagen(ruta_archivo).get("exif")
+
+            # Guardar conservando metadatos si existen
+            if formatos:
+                formato, datos, psnr = formatos_img.elegir_formato(
+                    img, calidad_img, formatos, exif_bytes)
+                ruta_nueva = os.path.join(
+                    ruta_destino, f"{nombre}_opt{formatos_img.EXTENSIONES_FORMATO[formato]}")
+                _guardar_bytes(datos, ruta_nueva)
+                evento.update(codec=formato, psnr=round(min(psnr, 99.0), 2))  # idénticas: inf
+            else:
+                _guardar_jpeg(img, ruta_nueva, calidad_img, exif_bytes)
+            _quitar_otros_formatos(ruta_destino, nombre, ruta_nueva)
+            if exif_bytes:
+                print(f"🖼️| CM: {ruta_archivo} -> {ruta_nueva}") #CM: Con metadatos
+            else:
+                print(f"🖼️| SM:{ruta_archivo} -> {ruta_nueva}") #SM: Sin metadatos
+
+        # Versiones de mayor a menor: cada una se reduce desde la anterior
+        if con_alfa:
+            img = img.convert("RGB")
+        for clave in sorted(versiones_pendientes, key=lambda c: -versiones[c]["lado"]):
+            version = versiones[clave]
+            img = reducir(img, version["lado"])
+            _guardar_jpeg(img, rutas_versiones[clave], version.get("calidad", calidad_img))
+            print(f"🖼️| {clave}: {ruta_archivo} -> {rutas_versiones[clave]}")
+
+        salidas = [ruta_nueva, *rutas_versiones.values()]
+        evento["bytes_salida"] = metricas.tamano(salidas)
+        return salidas
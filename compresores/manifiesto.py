@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+"""
+Manifiesto incremental de optimización.
+Guarda en un archivo SQLite qué archivos de origen ya se procesaron, con qué
+parámetros y qué salidas generaron, para que una re-ejecución sólo procese
+archivos nuevos, modificados o con parámetros distintos.
+"""
+
+
+def hash_contenido(ruta, tam_bloque=1 << 20):
+    """
+    Calcula un hash (BLAKE2b de 128 bits) del contenido completo de un archivo.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(tam_bloque), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def con_hash(tarea, ruta_origen, *args):
+    """
+    Ejecuta `tarea(ruta_origen, *args)` y devuelve (salidas, hash del origen).
+    Para calcular el hash en el proceso o hilo de trabajo, que lee el archivo
+    de todos modos, y no después, en serie, al registrarlo.
+    """
+    salidas = tarea(ruta_origen, *args)
+    return salidas, hash_contenido(ruta_origen) if salidas else None
+
+
+class Manifiesto:
+    """
+    Registro persistente de archivos optimizados.
+    Por cada archivo de origen guarda tamaño, mtime, hash opcional del contenido,
+    parámetros de codificación y rutas de salida.
+    Es seguro usarlo desde varios hilos.
+    """
+
+    def __init__(self, ruta_db, usar_hash=False, commit_cada=200):
+        self.ruta_db = ruta_db
+        self.usar_hash = usar_hash
+        self.commit_cada = commit_cada
+        self._pendientes = 0
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(ruta_db, timeout=30, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archivos (
+                ruta_origen TEXT PRIMARY KEY,
+                tamano      INTEGER NOT NULL,
+                mtime_ns    INTEGER NOT NULL,
+                hash        TEXT,
+                parametros  TEXT NOT NULL,
+                salidas     TEXT NOT NULL,
+                fecha       REAL NOT NULL
+            )
+            """
+        )
+        self._con.commit()
+
+    @staticmethod
+    def _serializar(parametros):
+        return json.dumps(parametros, sort_keys=True)
+
+    def necesita_proceso(self, ruta_origen, parametros, st=None):
+        """
+        Indica si un archivo debe (re)procesarse: es nuevo, cambió su contenido,
+        cambiaron los parámetros o alguna de sus salidas ya no existe.
+        `st` permite reutilizar un os.stat ya obtenido durante el recorrido.
+        """
+        st = st or os.stat(ruta_origen)
+        with self._lock:
+            fila = self._con.execute(
+                "SELECT tamano, mtime_ns, hash, parametros, salidas "
+                "FROM archivos WHERE ruta_origen = ?",
+                (ruta_origen,)
+            ).fetchone()
+        if fila is None:
+            return True
+
+        tamano, mtime_ns, hash_guardado, parametros_guardados, salidas = fila
+        if parametros_guardados != self._serializar(parametros):
+            return True
+        if not all(os.path.exists(s) for s in json.loads(salidas)):
+            return True
+        if tamano == st.st_size and mtime_ns == st.st_mtime_ns:
+            return False
+
+        # Mismo tamaño pero otro mtime: con hash se distingue un "touch" de una edición real
+        if self.usar_hash and hash_guardado and tamano == st.st_size:
+            if hash_contenido(ruta_origen) == hash_guardado:
+                with self._lock:
+                    self._con.execute(
+                        "UPDATE archivos SET mtime_ns = ? WHERE ruta_origen = ?",
+                        (st.st_mtime_ns, ruta_origen)
+                    )
+                    self._contar_cambio()
+                return False
+        return True
+
+    def registrar(self, ruta_origen, parametros, salidas, st=None, hash_archivo=None):
+        """
+        Registra un archivo como procesado correctamente.
+        Debe llamarse sólo después de que todas sus salidas estén completas.
+        Con `usar_hash`, `hash_archivo` evita leer aquí el archivo entero
+        (ver con_hash); si falta se calcula.
+        """
+        st = st or os.stat(ruta_origen)
+        if not self.usar_hash:
+            hash_archivo = None
+        elif hash_archivo is None:
+            hash_archivo = hash_contenido(ruta_origen)
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO archivos "
+                "(ruta_origen, tamano, mtime_ns, hash, parametros, salidas, fecha) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ruta_origen, st.st_size, st.st_mtime_ns, hash_archivo,
+                 self._serializar(parametros), json.dumps(list(salidas)), time.time())
+            )
+            self._contar_cambio()
+
+    def _contar_cambio(self):
+        # Se llama con el lock tomado; agrupa los commits para no escribir por archivo
+        self._pendientes += 1
+        if self._pendientes >= self.commit_cada:
+            self._con.commit()
+            self._pendientes = 0
+
+    def cerrar(self):
+        with self._lock:
+            self._con.commit()
+            self._con.close()
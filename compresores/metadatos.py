@@ -0,0 +1,263 @@
+import os
+import json
+import struct
+import sqlite3
+import threading
+from datetime import datetime
+from PIL import Image
+import ffmpeg
+
+"""
+Caché persistente de metadatos por archivo, compartida por el renombrado,
+los optimizadores y los convertidores a Resolve.
+Por cada archivo, identificado por (ruta, tamaño, mtime), guarda la fecha de
+captura, dimensiones y modo, orientación, el EXIF en bruto y el sondeo de
+ffprobe. Así cada archivo se analiza una sola vez en todo el flujo y entre
+ejecuciones. Al renombrar un archivo su entrada se mueve con él.
+"""
+
+RUTA_CACHE = os.environ.get(
+    "COLCIS_CACHE_METADATOS",
+    os.path.join(os.path.expanduser("~"), ".cache", "colcis", "metadatos.sqlite")
+)
+FORMATO_FECHA = "%Y:%m:%d %H:%M:%S"
+
+_TAG_ORIENTACION = 0x0112
+_TAG_EXIF_IFD = 0x8769
+_TAG_FECHA_ORIGINAL = 0x9003  # DateTimeOriginal
+
+# Marcadores SOF (inicio de fotograma) de JPEG: traen alto, ancho y componentes
+_MARCADORES_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_MODO_POR_COMPONENTES = {1: "L", 3: "RGB", 4: "CMYK"}
+
+
+# ---- Lectura rápida de JPEG ----
+
+def _buscar_en_ifd(tiff, desplazamiento, etiqueta, endian):
+    """
+    Busca una etiqueta en un IFD de un bloque TIFF y devuelve (tipo, cantidad,
+    valor o desplazamiento, posición del campo de valor) o None.
+    """
+    cantidad_entradas = struct.unpack_from(endian + "H", tiff, desplazamiento)[0]
+    for i in range(cantidad_entradas):
+        inicio = desplazamiento + 2 + i * 12
+        tag, tipo, cantidad, valor = struct.unpack_from(endian + "HHII", tiff, inicio)
+        if tag == etiqueta:
+            return tipo, cantidad, valor, inicio + 8
+    return None
+
+
+def _fecha_valida(texto):
+    # Descarta fechas ilegibles (p. ej. "0000:00:00 00:00:00" o texto corrupto)
+    try:
+        datetime.strptime(texto, FORMATO_FECHA)
+    except (TypeError, ValueError):
+        return None
+    return texto
+
+
+def analizar_exif(exif):
+    """
+    Extrae fecha de captura (texto EXIF) y orientación de un bloque EXIF
+    ("Exif\\0\\0" + TIFF) buscando directamente las etiquetas 0x9003 y 0x0112.
+    """
+    resultado = {"fecha": None, "orientacion": None}
+    tiff = exif[6:] if exif[:6] == b"Exif\x00\x00" else exif
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if endian is None:
+        return resultado
+    try:
+        ifd0 = struct.unpack_from(endian + "I", tiff, 4)[0]
+        entrada = _buscar_en_ifd(tiff, ifd0, _TAG_ORIENTACION, endian)
+        if entrada:
+            # SHORT: el valor va en los primeros 2 bytes del campo
+            resultado["orientacion"] = struct.unpack_from(endian + "H", tiff, entrada[3])[0]
+
+        entrada = _buscar_en_ifd(tiff, ifd0, _TAG_EXIF_IFD, endian)
+        if entrada:
+            entrada = _buscar_en_ifd(tiff, entrada[2], _TAG_FECHA_ORIGINAL, endian)
+        if entrada:
+            _, cantidad, valor, posicion = entrada
+            # Cadenas de más de 4 bytes se guardan aparte, en `valor` (desplazamiento)
+            inicio = valor if cantidad > 4 else posicion
+            texto = tiff[inicio:inicio + cantidad].split(b"\x00")[0].decode("ascii").strip()
+            resultado["fecha"] = _fecha_valida(texto)
+    except (struct.error, UnicodeDecodeError):
+        pass
+    return resultado
+
+
+def leer_cabecera_jpeg(ruta):
+    """
+    Recorre los segmentos de un JPEG hasta el inicio de la imagen con lecturas
+    acotadas (se salta todo lo que no es APP1 "Exif" o SOF) y devuelve
+    {"ancho", "alto", "modo", "exif"}. Nunca decodifica píxeles.
+    """
+    datos = {"ancho": None, "alto": None, "modo": None, "exif": None}
+    with open(ruta, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            raise ValueError("no es un JPEG")
+        while True:
+            cabecera = f.read(4)
+            if len(cabecera) < 4 or cabecera[0] != 0xFF:
+                break
+            marcador = cabecera[1]
+            if marcador in (0xDA, 0xD9):  # inicio de la imagen / fin
+                break
+            longitud = struct.unpack(">H", cabecera[2:])[0]
+            if marcador == 0xE1 and datos["exif"] is None:
+                segmento = f.read(longitud - 2)
+                if segmento[:6] == b"Exif\x00\x00":
+                    datos["exif"] = segmento
+            elif marcador in _MARCADORES_SOF:
+                segmento = f.read(longitud - 2)
+                datos["alto"], datos["ancho"] = struct.unpack_from(">HH", segmento, 1)
+                datos["modo"] = _MODO_POR_COMPONENTES.get(segmento[5], "RGB")
+                break  # el EXIF siempre va antes del SOF
+            else:
+                f.seek(longitud - 2, os.SEEK_CUR)
+    return datos
+
+
+def _analizar_imagen(ruta):
+    if ruta.lower().endswith((".jpg", ".jpeg")):
+        try:
+            datos = leer_cabecera_jpeg(ruta)
+        except (OSError, ValueError, struct.error):
+            datos = None
+        if datos and datos["ancho"]:
+            datos.update(analizar_exif(datos["exif"]) if datos["exif"] else
+                         {"fecha": None, "orientacion": None})
+            return datos
+
+    # Otros formatos (PNG con chunk eXIf...): Pillow, cerrando el archivo
+    with Image.open(ruta) as img:
+        exif = img.getexif()
+        fecha = exif.get_ifd(_TAG_EXIF_IFD).get(_TAG_FECHA_ORIGINAL)
+        return {
+            "ancho": img.width, "alto": img.height, "modo": img.mode,
+            "orientacion": exif.get(_TAG_ORIENTACION),
+            "fecha": _fecha_valida(fecha.strip()) if isinstance(fecha, str) else None,
+            "exif": img.info.get("exif"),
+        }
+
+
+# ---- Caché ----
+
+_lock = threading.Lock()
+_con = None
+_pid = None
+
+
+def _conexion():
+    # Una conexión por proceso (los pools de procesos abren la suya)
+    global _con, _pid
+    if _con is None or _pid != os.getpid():
+        os.makedirs(os.path.dirname(RUTA_CACHE), exist_ok=True)
+        _con = sqlite3.connect(RUTA_CACHE, timeout=30, check_same_thread=False)
+        _con.execute("PRAGMA journal_mode=WAL")
+        _con.execute("PRAGMA synchronous=NORMAL")
+        _con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS metadatos (
+                ruta     TEXT PRIMARY KEY,
+                tamano   INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                campos   TEXT NOT NULL,
+                exif     BLOB
+            )
+            """
+        )
+        _con.commit()
+        _pid = os.getpid()
+    return _con
+
+
+def _leer(clave, st):
+    fila = _conexion().execute(
+        "SELECT tamano, mtime_ns, campos, exif FROM metadatos WHERE ruta = ?", (clave,)
+    ).fetchone()
+    if fila is None or fila[0] != st.st_size or fila[1] != st.st_mtime_ns:
+        return {}
+    campos = json.loads(fila[2])
+    if fila[3] is not None:
+        campos["exif"] = bytes(fila[3])
+    return campos
+
+
+def campos(ruta, st=None):
+    """
+    Metadatos guardados de un archivo ({} si no hay o si el archivo cambió).
+    """
+    st = st or os.stat(ruta)
+    with _lock:
+        return _leer(os.path.abspath(ruta), st)
+
+
+def actualizar(ruta, st=None, **nuevos):
+    """
+    Agrega o reemplaza campos de un archivo en la caché.
+    """
+    st = st or os.stat(ruta)
+    clave = os.path.abspath(ruta)
+    with _lock:
+        datos = _leer(clave, st)
+        datos.update(nuevos)
+        exif = datos.pop("exif", None)
+        con = _conexion()
+        con.execute(
+            "INSERT OR REPLACE INTO metadatos (ruta, tamano, mtime_ns, campos, exif) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (clave, st.st_size, st.st_mtime_ns, json.dumps(datos), exif)
+        )
+        con.commit()
+        if exif is not None:
+            datos["exif"] = exif
+    return datos
+
+
+def mover(origen, destino):
+    """
+    Traslada la entrada de un archivo renombrado (tamaño y mtime no cambian).
+    """
+    with _lock:
+        con = _conexion()
+        con.execute("DELETE FROM metadatos WHERE ruta = ?", (os.path.abspath(destino),))
+        con.execute("UPDATE metadatos SET ruta = ? WHERE ruta = ?",
+                    (os.path.abspath(destino), os.path.abspath(origen)))
+        con.commit()
+
+
+def datos_imagen(ruta, st=None):
+    """
+    Dimensiones, modo, orientación, fecha (texto EXIF) y EXIF en bruto de una
+    imagen; se leen del archivo sólo la primera vez.
+    """
+    st = st or os.stat(ruta)
+    datos = campos(ruta, st)
+    if "ancho" in datos:
+        return datos
+    return actualizar(ruta, st, **_analizar_imagen(ruta))
+
+
+def fecha_captura(ruta, st=None):
+    """
+    DateTimeOriginal de una imagen como datetime, o None si no tiene o no
+    se puede leer (quien llama usa entonces la fecha de modificación).
+    """
+    fecha = _fecha_valida(datos_imagen(ruta, st).get("fecha"))
+    return datetime.strptime(fecha, FORMATO_FECHA) if fecha else None
+
+
+def sondeo(ruta, st=None):
+    """
+    Resultado de ffprobe (formato y streams); se ejecuta sólo la primera vez.
+    """
+    st = st or os.stat(ruta)
+    datos = campos(ruta, st)
+    if "sondeo" in datos:
+        return datos["sondeo"]
+    resultado = ffmpeg.probe(ruta)
+    resultado = {"format": resultado.get("format", {}), "streams": resultado.get("streams", [])}
+    actualizar(ruta, st, sondeo=resultado)
+    return resultado
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+"""
+Registro estructurado de eventos por archivo y por etapa.
+Cada etapa (imagen, video, resolve, renombrado, transcripción...) emite una
+línea JSON con inicio/fin, duración, bytes de entrada/salida, codec y error.
+El destino se guarda en variables de entorno para que los procesos hijos
+(pools de procesos) escriban en el mismo archivo y con el mismo id de ejecución.
+"""
+
+VAR_DESTINO = "COLCIS_METRICAS"
+VAR_EJECUCION = "COLCIS_METRICAS_EJECUCION"
+
+_lock = threading.Lock()
+_archivo = None
+_ruta_abierta = None
+
+
+def configurar(ruta_jsonl=None):
+    """
+    Activa el registro en `ruta_jsonl` (la variable COLCIS_METRICAS tiene
+    prioridad) e inicia un nuevo id de ejecución. Devuelve la ruta usada.
+    """
+    ruta = os.environ.get(VAR_DESTINO) or ruta_jsonl
+    if not ruta:
+        return None
+    ruta = os.path.abspath(ruta)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    os.environ[VAR_DESTINO] = ruta
+    os.environ[VAR_EJECUCION] = uuid.uuid4().hex[:12]
+    return ruta
+
+
+def activo():
+    return bool(os.environ.get(VAR_DESTINO))
+
+
+def emitir(evento):
+    """
+    Escribe un evento como una línea JSON (no hace nada si no está configurado).
+    """
+    global _archivo, _ruta_abierta
+    ruta = os.environ.get(VAR_DESTINO)
+    if not ruta:
+        return
+    evento.setdefault("ejecucion", os.environ.get(VAR_EJECUCION))
+    evento.setdefault("pid", os.getpid())
+    linea = json.dumps(evento, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        if _ruta_abierta != ruta:
+            if _archivo:
+                _archivo.close()
+            # Modo append: las líneas cortas de varios procesos no se mezclan
+            _archivo = open(ruta, "a", encoding="utf-8")
+            _ruta_abierta = ruta
+        _archivo.write(linea)
+        _archivo.flush()
+
+
+def tamano(rutas):
+    """
+    Suma de tamaños en bytes de una ruta o lista de rutas (ignora las que no existen).
+    """
+    if isinstance(rutas, str):
+        rutas = [rutas]
+    total = 0
+    for ruta in rutas or []:
+        try:
+            total += os.path.getsize(ruta)
+        except OSError:
+            pass
+    return total
+
+
+@contextmanager
+def etapa(nombre, archivo, **campos):
+    """
+    Mide una etapa sobre un archivo y emite su evento al terminar.
+    Devuelve un diccionario que quien llama puede completar
+    (bytes_salida, codec, error...). Las excepciones se registran y se relanzan.
+    """
+    evento = {"etapa": nombre, "archivo": archivo, "bytes_entrada": tamano(archivo)}
+    evento.update(campos)
+    inicio = time.time()
+    try:
+        yield evento
+    except Exception as e:
+        evento["error"] = str(e)
+        raise
+    finally:
+        fin = time.time()
+        evento["inicio"] = inicio
+        evento["fin"] = fin
+        evento["duracion"] = round(fin - inicio, 4)
+        emitir(evento)
+
+
+def _percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return None
+    indice = min(len(valores_ordenados) - 1, max(0, round(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+def resumen(ruta_jsonl=None, ejecucion=None, lentos=10):
+    """
+    Lee los eventos de una ejecución (por defecto la actual) y calcula por etapa
+    cantidad, errores, bytes y percentiles de latencia, más los N archivos más lentos.
+    """
+    ruta = ruta_jsonl or os.environ.get(VAR_DESTINO)
+    ejecucion = ejecucion or os.environ.get(VAR_EJECUCION)
+    if not ruta or not os.path.exists(ruta):
+        return None
+
+    eventos = []
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                evento = json.loads(linea)
+            except ValueError:
+                continue
+            if ejecucion is None or evento.get("ejecucion") == ejecucion:
+                eventos.append(evento)
+
+    etapas = {}
+    for evento in eventos:
+        etapas.setdefault(evento["etapa"], []).append(evento)
+
+    # Los eventos de error emitidos fuera de una etapa pueden no traer duración
+    for evento in eventos:
+        evento.setdefault("duracion", 0.0)
+
+    por_etapa = {}
+    for nombre, lista in etapas.items():
+        duraciones = sorted(e["duracion"] for e in lista)
+        por_etapa[nombre] = {
+            "archivos": len(lista),
+            "errores": sum(1 for e in lista if e.get("error")),
+            "bytes_entrada": sum(e.get("bytes_entrada") or 0 for e in lista),
+            "bytes_salida": sum(e.get("bytes_salida") or 0 for e in lista),
+            "p50": _percentil(duraciones, 50),
+            "p90": _percentil(duraciones, 90),
+            "p99": _percentil(duraciones, 99),
+            "max": duraciones[-1],
+        }
+
+    mas_lentos = sorted(eventos, key=lambda e: e["duracion"], reverse=True)[:lentos]
+    return {"ejecucion": ejecucion, "etapas": por_etapa, "mas_lentos": mas_lentos}
+
+
+def imprimir_resumen(ruta_jsonl=None, lentos=10):
+    """
+    Imprime el resumen de la ejecución actual: latencias por etapa y archivos más lentos.
+    """
+    datos = resumen(ruta_jsonl, lentos=lentos)
+    if not datos or not datos["etapas"]:
+        return
+    print(f"\n📊| Resumen de métricas ({os.environ.get(VAR_DESTINO)})")
+    print(f"{'etapa':<16}{'archivos':>9}{'errores':>9}{'p50 s':>9}{'p90 s':>9}{'p99 s':>9}{'max s':>9}{'MB ent':>10}{'MB sal':>10}")
+    for nombre, d in sorted(datos["etapas"].items()):
+        print(f"{nombre:<16}{d['archivos']:>9}{d['errores']:>9}{d['p50']:>9.2f}{d['p90']:>9.2f}"
+              f"{d['p99']:>9.2f}{d['max']:>9.2f}{d['bytes_entrada'] / 1e6:>10.1f}{d['bytes_salida'] / 1e6:>10.1f}")
+    print(f"\n🐢| {len(datos['mas_lentos'])} archivos más lentos:")
+    for e in datos["mas_lentos"]:
+        error = f"  ❌ {e['error']}" if e.get("error") else ""
+        print(f"  {e['duracion']:>8.2f}s  {e['etapa']:<14} {e['archivo']}{error}")
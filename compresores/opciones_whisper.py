@@ -0,0 +1,45 @@
+"""
+Opciones de inferencia de Whisper compartidas por transcribir.py y colcis.py.
+Este módulo no importa Torch, Whisper ni numpy, así construir el parser (y
+`--help`) sigue siendo instantáneo.
+"""
+
+# Memoria total para modelos cargados, repartida entre los procesos de trabajo
+LIMITE_MEMORIA_MB = 8000
+
+
+def agregar_argumentos_cpu(parser):
+    """
+    Opciones de inferencia en CPU compartidas por transcribir.py y colcis.py.
+    """
+    parser.add_argument("--cuantizar", action="store_true",
+                        help="Cuantización dinámica int8 de las capas lineales (CPU)")
+    parser.add_argument("--dispositivo", choices=["cpu", "cuda"], default="cpu",
+                        help="Dónde carga el modelo cada proceso (cuda: una copia por proceso)")
+    parser.add_argument("--limite-memoria-mb", type=int, default=LIMITE_MEMORIA_MB,
+                        help="Memoria para modelos cargados, entre todos los procesos")
+    parser.add_argument("--hilos-interop", type=int, default=1,
+                        help="Hilos inter-op de Torch por proceso")
+    parser.add_argument("--beam-size", type=int, help="Búsqueda en haz (por defecto voraz)")
+    parser.add_argument("--best-of", type=int, help="Candidatos al muestrear con temperatura > 0")
+    parser.add_argument("--temperaturas", type=float, nargs="+",
+                        help="Escalera de respaldo, p. ej. 0 0.2 0.4 (sólo 0: sin respaldo)")
+
+
+def opciones_decodificacion(beam_size=None, best_of=None, temperaturas=None):
+    """
+    Opciones para model.transcribe. fp16 no se fija aquí: los procesos lo
+    desactivan sólo si el modelo quedó en CPU (ver transcribir.py); en GPU
+    queda el valor por defecto de Whisper.
+    `beam_size` None es búsqueda voraz (lo más rápido); `temperaturas` es la
+    escalera de respaldo que se recorre sólo cuando un tramo falla los umbrales
+    de compresión o logprob; con (0,) no hay respaldo.
+    """
+    opciones = {}
+    if beam_size:
+        opciones["beam_size"] = beam_size
+    if best_of:
+        opciones["best_of"] = best_of
+    if temperaturas:
+        opciones["temperature"] = tuple(temperaturas)
+    return opciones
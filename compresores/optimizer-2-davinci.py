@@ -2,31 +2,20 @@ import os
 from PIL import Image, ImageOps
 import ffmpeg
 import time
-from tkinter import Tk, filedialog
 from renombrarRegex import renombrarArchivos
+import metricas
 
 """
 Asegúrate de que ffmpeg esté instalado en el sistema y agregado al PATH.
 """
 
-def convertir_a_resolve(ruta_entrada, ruta_salida):
-    """
-    Convierte un video a un formato ampliamente compatible con DaVinci Resolve:
-    H.264 + yuv420p + AAC.
-    """
-    (
-        ffmpeg
-        .input(ruta_entrada)
-        .output(
-            ruta_salida,
-            vcodec="libx264",
-            pix_fmt="yuv420p",
-            acodec="aac",
-            movflags="+faststart"
-        )
-        .run(overwrite_output=True, quiet=True)
-    )
-    print(f"🎯 Convertido a Resolve: {ruta_entrada} → {ruta_salida}")
+# H.264 + yuv420p + AAC: formato ampliamente compatible con DaVinci Resolve
+OPCIONES_RESOLVE = dict(
+    vcodec="libx264",
+    pix_fmt="yuv420p",
+    acodec="aac",
+    movflags="+faststart"
+)
 
 
 def optimizar_archivos(carpeta, calidad_img=80,
@@ -34,7 +23,8 @@ def optimizar_archivos(carpeta, calidad_img=80,
     """
     Optimiza imágenes y videos en una carpeta (y subcarpetas) de forma recursiva.
     - Imágenes: se comprimen en JPEG.
-    - Videos: 1) se comprimen en H.265, 2) se convierten a formato DaVinci (H.264).
+    - Videos: se decodifican una vez y se generan a la vez la versión H.265
+      y la versión compatible con DaVinci (H.264).
     Genera una nueva carpeta raíz con sufijo '-optimizados'.
     """
     carpeta_opt = carpeta.rstrip(os.sep) + "-optimizados"
@@ -60,53 +50,58 @@ def optimizar_archivos(carpeta, calidad_img=80,
                 if os.path.exists(ruta_nueva):
                     print(f"⏭️ Saltado (ya existe): {ruta_nueva}")
                     continue
-                try:
-                    img = Image.open(ruta_archivo)
-                    img = ImageOps.exif_transpose(img).convert("RGB")
-                    img.save(ruta_nueva, "JPEG", optimize=True, quality=calidad_img)
-                    print(f"🖼️ {ruta_archivo} → {ruta_nueva}")
-                except Exception as e:
-                    print(f"❌ Error con imagen {ruta_archivo}: {e}")
+                with metricas.etapa("imagen", ruta_archivo, codec="jpeg") as evento:
+                    try:
+                        img = Image.open(ruta_archivo)
+                        img = ImageOps.exif_transpose(img).convert("RGB")
+                        img.save(ruta_nueva, "JPEG", optimize=True, quality=calidad_img)
+                        evento["bytes_salida"] = metricas.tamano(ruta_nueva)
+                        print(f"🖼️ {ruta_archivo} → {ruta_nueva}")
+                    except Exception as e:
+                        evento["error"] = str(e)
+                        print(f"❌ Error con imagen {ruta_archivo}: {e}")
 
             # ---- Videos ----
             elif ext in extensiones_vid:
-                # 1) Comprimir a H.265
-                nombre_opt = f"{nombre}_opt.mp4"
-                ruta_opt = os.path.normpath(os.path.join(ruta_destino, nombre_opt))
+                # 1) H.265 comprimido y 2) H.264 compatible DaVinci,
+                # ambos desde una sola decodificación del original
+                ruta_opt = os.path.normpath(os.path.join(ruta_destino, f"{nombre}_opt.mp4"))
+                ruta_resolve = os.path.normpath(os.path.join(ruta_destino, f"{nombre}_opt_R.mp4"))
+
+                entrada = ffmpeg.input(ruta_archivo)
+                salidas = []
                 if not os.path.exists(ruta_opt):
-                    try:
-                        (
-                            ffmpeg
-                            .input(ruta_archivo)
-                            .output(ruta_opt,
-                                    vcodec=codec_video,
-                                    crf=crf,
-                                    preset=preset,
-                                    acodec="aac")
-                            .run(overwrite_output=True, quiet=True)
-                        )
-                        print(f"🎬 {ruta_archivo} → {ruta_opt}")
-                    except Exception as e:
-                        print(f"❌ Error con video {ruta_archivo}: {e}")
-                        continue
+                    salidas.append(entrada.output(ruta_opt,
+                                                  vcodec=codec_video,
+                                                  crf=crf,
+                                                  preset=preset,
+                                                  acodec="aac"))
                 else:
                     print(f"⏭️ Saltado (ya existe): {ruta_opt}")
 
-                # 2) Convertir a formato compatible DaVinci
-                nombre_resolve = f"{nombre}_opt_R.mp4"
-                ruta_resolve = os.path.normpath(os.path.join(ruta_destino, nombre_resolve))
                 if not os.path.exists(ruta_resolve):
-                    try:
-                        convertir_a_resolve(ruta_opt, ruta_resolve)
-                    except Exception as e:
-                        print(f"❌ Error al convertir a Resolve {ruta_opt}: {e}")
+                    salidas.append(entrada.output(ruta_resolve, **OPCIONES_RESOLVE))
                 else:
                     print(f"⏭️ Saltado (ya existe): {ruta_resolve}")
 
+                if salidas:
+                    rutas_salida = [salida.node.kwargs["filename"] for salida in salidas]
+                    with metricas.etapa("video", ruta_archivo, codec=codec_video) as evento:
+                        try:
+                            ffmpeg.merge_outputs(*salidas).run(overwrite_output=True, quiet=True)
+                            evento["bytes_salida"] = metricas.tamano(rutas_salida)
+                            for ruta_salida in rutas_salida:
+                                print(f"🎬 {ruta_archivo} → {ruta_salida}")
+                        except Exception as e:
+                            evento["error"] = str(e)
+                            print(f"❌ Error con video {ruta_archivo}: {e}")
+
     print(f"\n🚀 Optimización completada. Carpeta generada: {carpeta_opt}")
 
 
 if __name__ == "__main__":
+    from tkinter import Tk, filedialog  # sólo la interfaz; sin ella se usa colcis.py
+
     Tk().withdraw()
     carpeta_seleccionada = filedialog.askdirectory(
         title="Selecciona la carpeta con imágenes y/o videos"
@@ -114,6 +109,7 @@ if __name__ == "__main__":
 
     if carpeta_seleccionada:
         start_time = time.time()
+        metricas.configurar(carpeta_seleccionada.rstrip(os.sep) + "-metricas.jsonl")
         renombrarArchivos(carpeta_seleccionada)
 
         print("\nSe comenzará a realizar la optimización de archivos: ")
@@ -130,5 +126,6 @@ if __name__ == "__main__":
         minutes, seconds = divmod(rem, 60)
         print("\n✅ Optimización de archivos completada")
         print(f"Tiempo transcurrido: {int(hours)}h {int(minutes)}m {seconds:.2f}s")
+        metricas.imprimir_resumen()
     else:
         print("No seleccionaste ninguna carpeta.")
@@ -1,141 +1,897 @@
 import os
 import time
-from PIL import Image, ImageOps
+import queue
+import threading
+import multiprocessing
 import ffmpeg
-import piexif
-from tkinter import Tk, filedialog
-from concurrent.futures import ThreadPoolExecutor
-from renombrarRegex import renombrarArchivos
+from types import SimpleNamespace
+from collections import deque
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor
+from renombrarRegex import renombrar_en_directorio
+from manifiesto import Manifiesto, con_hash
+import metricas
+import orquestador
+import sondeo
+from imagenes import (EXTENSIONES_IMG, MEMORIA_IMG_MB, VERSIONES_IMG, PresupuestoMemoria,
+                      memoria_estimada, optimizar_imagen, ruta_temporal, ruta_version)
+from segmentado import UMBRAL_SEGMENTADO, codificar_segmentado, conviene_segmentar
+from autoajuste import elegir_ajustes
+from vigilancia import ESPERA_ESTABLE, crear_vigilante, ignorar_interrupcion, lotes_estables
 
 """
 Optimiza imágenes y videos en una carpeta (y subcarpetas) de forma recursiva
-usando hilos de trabajo en paralelo. Los hilos son, como mínimo,
-la mitad de los hilos que soporta el procesador.
+en paralelo: las imágenes en un pool de procesos y los videos en un carril
+propio, repartiendo entre ambos el presupuesto de núcleos del procesador.
 """
 
-def convertir_a_resolve(ruta_entrada, ruta_salida):
+EXTENSIONES_VID = (".mp4", ".mov", ".avi", ".mkv", ".flv", ".wmv", ".webm")
+
+
+# Sufijo de cada entregable de video
+SUFIJOS_VIDEO = {
+    "opt": "_opt.mp4",      # comprimido con codec_video (H.265 por defecto)
+    "resolve": "_opt_R.mp4",  # H.264 + yuv420p + AAC para DaVinci Resolve
+}
+
+# Versiones reducidas que salen de la misma decodificación (grafo split/scale).
+# "alto" es la altura máxima (nunca se agranda); "fotograma" genera una sola
+# imagen representativa en lugar de un video.
+VERSIONES_VIDEO = {
+    "proxy": {
+        "sufijo": "_proxy.mp4", "alto": 540, "carpeta": "proxies",
+        "opciones": dict(vcodec="libx264", crf=23, preset="veryfast", pix_fmt="yuv420p",
+                         acodec="aac", movflags="+faststart")
+    },
+    "miniatura": {
+        "sufijo": "_thumb.jpg", "alto": 180, "carpeta": "miniaturas", "fotograma": True,
+        "opciones": {"vframes": 1, "update": 1, "q:v": 4}
+    },
+}
+
+
+def _opciones_video(tipo, codec_video, crf, preset, hilos_ffmpeg=None):
     """
-    Convierte un video a un formato ampliamente compatible con DaVinci Resolve:
-    H.264 + yuv420p + AAC.
+    Opciones de salida de ffmpeg para cada tipo de entregable de video.
+    Con `hilos_ffmpeg` se limita el número de hilos del codificador.
     """
-    (
-        ffmpeg
-        .input(ruta_entrada)
-        .output(
-            ruta_salida,
+    if tipo == "opt":
+        opciones = dict(
+            vcodec=codec_video,
+            crf=crf,
+            preset=preset,
+            acodec="aac",
+            movflags="+faststart+use_metadata_tags",
+            map_metadata=0  # <-- copia metadatos del original
+        )
+    else:
+        opciones = dict(
             vcodec="libx264",
             pix_fmt="yuv420p",
             acodec="aac",
-            movflags="+faststart"
+            movflags="+faststart+use_metadata_tags",
+            map_metadata=0
         )
-        .run(overwrite_output=True, quiet=True)
-    )
-    print(f"🎯| : {ruta_entrada} -> {ruta_salida}")
+
+    opciones.update(orquestador.opciones_hilos(opciones["vcodec"], hilos_ffmpeg))
+    return opciones
+
+
+def _opciones_version(version, hilos_ffmpeg=None):
+    opciones = dict(version["opciones"])
+    if not version.get("fotograma"):
+        opciones.update(orquestador.opciones_hilos(opciones.get("vcodec"), hilos_ffmpeg))
+    return opciones
+
+
+def _repartir_hilos(hilos_ffmpeg, codificadores):
+    """
+    Reparte los `hilos_ffmpeg` reservados para un video entre los
+    codificadores de sus salidas (el resto va a los primeros), así un proxy
+    junto al entregable no duplica los núcleos que ocupa el video.
+    Devuelve {tipo: hilos}, o None para todos si no hay límite.
+    """
+    if not hilos_ffmpeg or not codificadores:
+        return {tipo: None for tipo in codificadores}
+    base, resto = divmod(hilos_ffmpeg, len(codificadores))
+    return {tipo: max(1, base + (i < resto)) for i, tipo in enumerate(codificadores)}
+
+
+def _hilos_por_salida(salidas, versiones, hilos_ffmpeg):
+    # Los fotogramas sueltos apenas codifican: no cuentan en el reparto de hilos
+    return _repartir_hilos(hilos_ffmpeg, [
+        tipo for tipo in salidas
+        if tipo in SUFIJOS_VIDEO or not versiones[tipo].get("fotograma")
+    ])
+
+
+def _escalar(flujo, version):
+    flujo = flujo.filter("scale", -2, f"min(ih,{version['alto']})")
+    if version.get("fotograma"):
+        # Elige el fotograma más representativo (escalado antes, para no
+        # guardar fotogramas grandes en su memoria)
+        flujo = flujo.filter("thumbnail")
+    return flujo
+
+
+def _extraer_fotograma(ruta_entrada, ruta_salida, version):
+    """
+    Fotograma suelto para el modo segmentado: salta al 10 % del video y sólo
+    decodifica unos pocos fotogramas.
+    """
+    inicio = sondeo.duracion_archivo(ruta_entrada) * 0.1
+    entrada = ffmpeg.input(ruta_entrada, ss=f"{inicio:.3f}")
+    salida = _escalar(entrada.video, version).output(ruta_salida, **version["opciones"])
+    orquestador.ejecutar(ffmpeg.compile(salida)[1:], [ruta_salida])
+
+
+def codificar_video(ruta_entrada, salidas, codec_video, crf, preset, hilos_ffmpeg=None,
+                    segmentos=None, versiones=None, cupos_trozos=None):
+    """
+    Decodifica el video una sola vez y genera todas las salidas pedidas
+    ({tipo: ruta}) desde un mismo proceso ffmpeg con varias salidas.
+    Evita codificar a H.265 para luego volver a decodificar hacia H.264.
+    Los tipos que no están en SUFIJOS_VIDEO son versiones reducidas descritas
+    en `versiones` (proxy, miniatura...): salen de un split + scale del mismo
+    video decodificado, cada una con sus propias opciones.
+    Los `hilos_ffmpeg` del video se reparten entre los codificadores de sus
+    salidas, no se dan enteros a cada uno.
+    Con `segmentos` el archivo se parte en keyframes y los trozos se codifican
+    en paralelo (para videos largos), tantos a la vez como permita
+    `cupos_trozos` (los cupos libres del carril de video).
+    ffmpeg corre en el orquestador asíncrono: si se cuelga o supera su límite
+    de tiempo se mata y se lanza la excepción, sin frenar al resto del lote.
+    """
+    versiones = versiones or {}
+    hilos = _hilos_por_salida(salidas, versiones, hilos_ffmpeg)
+    opciones = {
+        tipo: _opciones_video(tipo, codec_video, crf, preset, hilos[tipo])
+        if tipo in SUFIJOS_VIDEO else _opciones_version(versiones[tipo], hilos.get(tipo))
+        for tipo in salidas
+    }
+    reducidas = [tipo for tipo in salidas if tipo not in SUFIJOS_VIDEO]
+    codecs = "+".join(opciones[tipo].get("vcodec", "mjpeg") for tipo in salidas)
+    modo = f"segmentado x{segmentos}" if segmentos else "continuo"
+
+    with metricas.etapa("video", ruta_entrada, codec=codecs, salidas=list(salidas),
+                        modo=modo) as evento:
+        for ruta in salidas.values():
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+        if segmentos:
+            opciones_segmentado = {}
+            for tipo, ruta in salidas.items():
+                if tipo not in reducidas:
+                    opciones_segmentado[ruta] = opciones[tipo]
+                elif not versiones[tipo].get("fotograma"):
+                    opciones_segmentado[ruta] = dict(
+                        opciones[tipo], vf=f"scale=-2:min(ih\\,{versiones[tipo]['alto']})")
+            codificar_segmentado(ruta_entrada, opciones_segmentado, segmentos,
+                                 cupos=cupos_trozos)
+            for tipo in reducidas:
+                if versiones[tipo].get("fotograma"):
+                    ruta_tmp = ruta_temporal(salidas[tipo])
+                    _extraer_fotograma(ruta_entrada, ruta_tmp, versiones[tipo])
+                    os.replace(ruta_tmp, salidas[tipo])
+        else:
+            opciones_entrada = {"threads": hilos_ffmpeg} if hilos_ffmpeg else {}
+            entrada = ffmpeg.input(ruta_entrada, **opciones_entrada)
+            temporales = {ruta: ruta_temporal(ruta) for ruta in salidas.values()}
+            nodos = [
+                entrada.output(temporales[ruta], **opciones[tipo])
+                for tipo, ruta in salidas.items() if tipo not in reducidas
+            ]
+            if reducidas:
+                ramas = entrada.video.split()
+                for i, tipo in enumerate(reducidas):
+                    version = versiones[tipo]
+                    flujos = [_escalar(ramas[i], version)]
+                    if not version.get("fotograma"):
+                        flujos.append(entrada["a?"])
+                    nodos.append(ffmpeg.output(*flujos, temporales[salidas[tipo]], **opciones[tipo]))
+            salida = ffmpeg.merge_outputs(*nodos)
+            # Con avance/ETA, límite de tiempo y borrado de temporales si falla
+            orquestador.ejecutar(ffmpeg.compile(salida)[1:], list(temporales.values()),
+                                 sondeo.duracion_archivo(ruta_entrada),
+                                 os.path.basename(ruta_entrada))
+
+            for ruta, ruta_tmp in temporales.items():
+                os.replace(ruta_tmp, ruta)
+
+        for ruta in salidas.values():
+            print(f"🎬| {ruta_entrada} -> {ruta} ({modo})")
+        evento["bytes_salida"] = metricas.tamano(list(salidas.values()))
 
 
 def procesar_archivo(ruta_archivo, ruta_destino,
-                     calidad_img, codec_video, crf, preset):
+                     calidad_img, codec_video, crf, preset,
+                     sobrescribir=False, salidas_video=("resolve",),
+                     hilos_ffmpeg=None, segmentos_largos=None,
+                     umbral_segmentado=UMBRAL_SEGMENTADO,
+                     versiones_img=None, versiones_video=None, autoajuste=None,
+                     formatos_img=None, cupos_trozos=None):
     """
     Procesa un solo archivo (imagen o video).
+    `salidas_video` elige qué entregables de video generar ("opt" y/o "resolve");
+    todos salen de una única decodificación del original, igual que las
+    versiones reducidas de `versiones_img` / `versiones_video` (p. ej.
+    VERSIONES_IMG y VERSIONES_VIDEO: miniaturas y proxies).
+    Los videos de al menos `umbral_segmentado` segundos se codifican en
+    `segmentos_largos` trozos (None desactiva el modo segmentado), que corren
+    en paralelo según `cupos_trozos` (sin él, todos a la vez).
+    Con `autoajuste` (objetivo de calidad/tamaño, p. ej. autoajuste.OBJETIVO)
+    el preset y el crf del entregable "opt" se eligen muestreando el video.
+    Con `formatos_img` (p. ej. formatos.FORMATOS_IMG) cada imagen se guarda en
+    el formato más pequeño que pasa el umbral de calidad.
+    Devuelve la lista de salidas generadas, o None si se saltó; los errores se
+    relanzan para que el carril o la cola los cuenten como fallos.
     """
     nombre, ext = os.path.splitext(os.path.basename(ruta_archivo))
     ext = ext.lower()
-    extensiones_img = (".jpg", ".png")
-    extensiones_vid = (".mp4", ".mov", ".avi", ".mkv", ".flv", ".wmv", ".webm")
 
-    try:
-        # ---- Imágenes ----
-        if ext in extensiones_img:
-                    ruta_nueva = os.path.join(ruta_destino, f"{nombre}_opt.jpeg")
-                    if os.path.exists(ruta_nueva):
-                        print(f"⏭️ Saltado (ya existe): {ruta_nueva}")
-                        return
-
-                    img = Image.open(ruta_archivo)
-                    img = ImageOps.exif_transpose(img).convert("RGB")
-
-                    # Intentar obtener EXIF si existe
-                    exif_bytes = img.info.get("exif", None)
-                    if not exif_bytes and ext != ".png":
-                        try:
-                            # piexif puede recuperar datos de archivos JPEG originales
-                            exif_dict = piexif.load(ruta_archivo)
-                            exif_bytes = piexif.dump(exif_dict)
-                        except Exception:
-                            exif_bytes = None
-
-                    # Guardar conservando metadatos si existen
-                    if exif_bytes:
-                        img.save(ruta_nueva, "JPEG", quality=calidad_img,
-                                optimize=True, exif=exif_bytes)
-                        print(f"🖼️| CM: {ruta_archivo} -> {ruta_nueva}") #CM: Con metadatos
-                    else:
-                        img.save(ruta_nueva, "JPEG", quality=calidad_img, optimize=True) #SM: Sin metadatos
-                        print(f"🖼️| SM:{ruta_archivo} -> {ruta_nueva}")
-
-        # ---- Videos ----
-        elif ext in extensiones_vid:
-            ruta_opt = os.path.join(ruta_destino, f"{nombre}_opt.mp4")
-            ruta_resolve = os.path.join(ruta_destino, f"{nombre}_opt_R.mp4")
-            if not os.path.exists(ruta_resolve):
-                (
-                    ffmpeg
-                    .input(ruta_archivo)
-                    .output(
-                        ruta_opt,
-                        vcodec=codec_video,
-                        crf=crf,
-                        preset=preset,
-                        acodec="aac",
-                        movflags="+faststart+use_metadata_tags",
-                        map_metadata=0  # <-- copia metadatos del original
-                    )
-                    .run(overwrite_output=True, quiet=True)
-                )
-                print(f"🎬| {ruta_archivo} -> {ruta_opt}")
-                convertir_a_resolve(ruta_opt, ruta_resolve)
-                os.remove(ruta_opt)
-            else:
-                print(f"⏭️| Saltado (ya existe): {ruta_opt}")
-
-    except Exception as e:
-        print(f"❌| Error con {ruta_archivo}: {e}")
+    # ---- Imágenes ----
+    if ext in EXTENSIONES_IMG:
+        return optimizar_imagen(ruta_archivo, ruta_destino, calidad_img, sobrescribir=sobrescribir,
+                                versiones=versiones_img, formatos=formatos_img)
+
+    # ---- Videos ----
+    if ext in EXTENSIONES_VID:
+        rutas = {
+            tipo: os.path.join(ruta_destino, f"{nombre}{SUFIJOS_VIDEO[tipo]}")
+            for tipo in salidas_video
+        }
+        for tipo, version in (versiones_video or {}).items():
+            rutas[tipo] = ruta_version(ruta_destino, nombre, version)
+        pendientes = {
+            tipo: ruta for tipo, ruta in rutas.items()
+            if sobrescribir or not os.path.exists(ruta)
+        }
+        if pendientes:
+            os.makedirs(ruta_destino, exist_ok=True)
+            segmentos = None
+            if segmentos_largos and umbral_segmentado and \
+                    conviene_segmentar(ruta_archivo, umbral_segmentado):
+                segmentos = segmentos_largos
+            if autoajuste and "opt" in pendientes:
+                # Las muestras usan los hilos que tendrá "opt" en la codificación real
+                hilos_opt = _hilos_por_salida(pendientes, versiones_video or {},
+                                              hilos_ffmpeg)["opt"]
+                preset, crf = elegir_ajustes(ruta_archivo, codec_video, preset, crf,
+                                             autoajuste, hilos_opt)
+            codificar_video(ruta_archivo, pendientes, codec_video, crf, preset,
+                            hilos_ffmpeg, segmentos, versiones_video, cupos_trozos)
+            return list(rutas.values())
+        else:
+            print(f"⏭️| Saltado (ya existe): {', '.join(rutas.values())}")
+    return None
+
+
+def repartir_cpu(presupuesto_cpu, hay_imagenes, hay_videos,
+                 fraccion_video=0.75, hilos_por_video=4):
+    """
+    Reparte el presupuesto de hilos de CPU entre los dos carriles de trabajo.
+    Devuelve (procesos_img, trabajos_video, hilos_ffmpeg): procesos del pool de
+    imágenes, videos codificándose a la vez y valor de -threads para cada ffmpeg.
+    Si sólo hay un tipo de archivo, ese carril recibe todo el presupuesto.
+    Con los dos carriles hacen falta al menos 2 núcleos (uno para cada uno);
+    con menos se lanza ValueError en lugar de pasarse del presupuesto.
+    """
+    presupuesto_cpu = max(1, presupuesto_cpu)
+    if hay_imagenes and hay_videos and presupuesto_cpu < 2:
+        raise ValueError(f"presupuesto_cpu={presupuesto_cpu}: se necesitan al menos 2 "
+                         f"núcleos para los carriles de imágenes y videos")
+    if not hay_videos:
+        return presupuesto_cpu, 0, 0
+    if not hay_imagenes:
+        cpu_video = presupuesto_cpu
+    else:
+        cpu_video = min(presupuesto_cpu - 1, round(presupuesto_cpu * fraccion_video))
+        cpu_video = max(1, cpu_video)
+
+    hilos_ffmpeg = max(1, min(hilos_por_video, cpu_video))
+    trabajos_video = max(1, cpu_video // hilos_ffmpeg)
+    procesos_img = max(1, presupuesto_cpu - trabajos_video * hilos_ffmpeg) if hay_imagenes else 0
+    return procesos_img, trabajos_video, hilos_ffmpeg
+
+
+def recorrer_archivos(carpeta, renombrar=False):
+    """
+    Recorre la carpeta con os.scandir y va produciendo (ruta_archivo, ruta_relativa, stat)
+    sin construir nunca la lista completa del árbol.
+    Con `renombrar` aplica el renombrado IMG_/MVI_ de cada directorio antes de
+    producir sus archivos, en el mismo recorrido.
+    Las rutas salen absolutas y normalizadas (son la clave del manifiesto: "."
+    y $PWD deben dar la misma), y la relativa de la raíz es "".
+    """
+    carpeta = os.path.abspath(carpeta)
+    pendientes = [carpeta]
+    while pendientes:
+        ruta_actual = pendientes.pop()
+        try:
+            with os.scandir(ruta_actual) as it:
+                entradas = list(it)
+        except OSError as e:
+            print(f"⚠️| No se pudo leer {ruta_actual}: {e}")
+            continue
+
+        archivos = {}
+        for entrada in entradas:
+            if entrada.is_dir(follow_symlinks=False):
+                pendientes.append(entrada.path)
+            elif entrada.is_file():
+                archivos[entrada.name] = entrada
+
+        nombres = list(archivos)
+        if renombrar:
+            nombres = renombrar_en_directorio(ruta_actual, nombres)
+
+        ruta_relativa = os.path.relpath(ruta_actual, carpeta)
+        if ruta_relativa == os.curdir:
+            ruta_relativa = ""  # sin "/./" en las rutas de destino
+        for nombre in nombres:
+            ruta_archivo = os.path.join(ruta_actual, nombre)
+            try:
+                # DirEntry.stat() reutiliza lo ya leído por scandir cuando es posible
+                st = archivos[nombre].stat() if nombre in archivos else os.stat(ruta_archivo)
+            except OSError:
+                continue
+            yield ruta_archivo, ruta_relativa, st
+
+
+class _Carril:
+    """
+    Carril de trabajo: cola acotada + hilo despachador + executor.
+    El recorrido deja tareas en la cola (bloqueándose si está llena) y el
+    despachador las envía al executor cuando `cupos` (acquire/release) lo permite.
+    Con `presupuesto` cada tarea reserva antes `costo(ruta)` bytes y los libera
+    al terminar, así sólo arranca si cabe en la memoria disponible. La que no
+    cabe queda retenida aparte y el despachador sigue con las siguientes (las
+    imágenes pequeñas no esperan detrás de una grande); cada tarea que termina
+    cede su cupo a la primera retenida que ya quepa.
+    `al_terminar(ruta, st, salidas, error)` recibe también las excepciones de
+    las tareas. Si el executor se rompe (un proceso del pool muere, p. ej. por
+    falta de memoria) el carril deja de despachar, vacía su cola sin bloquear
+    al recorrido y guarda el error en `error`; poner() lo relanza.
+    """
+
+    def __init__(self, executor, funcion, al_terminar, cupos, tam_cola=256,
+                 presupuesto=None, costo=None):
+        self.executor = executor
+        self.funcion = funcion
+        self.al_terminar = al_terminar
+        self.presupuesto = presupuesto
+        self.costo = costo
+        self.cola = queue.Queue(maxsize=tam_cola)
+        self._cupos = cupos
+        self._retenidas = deque()
+        self._admision = threading.Condition()
+        self.error = None
+        self._hilo = threading.Thread(target=self._despachar, daemon=True)
+        self._hilo.start()
+
+    def poner(self, ruta_archivo, st, args):
+        """
+        Deja una tarea en la cola (bloquea si está llena). Si el carril ya se
+        rompió lanza su error en lugar de encolar.
+        """
+        if self.error is not None:
+            raise self.error
+        self.cola.put((ruta_archivo, st, args))
+
+    def _despachar(self):
+        while True:
+            tarea = self.cola.get()
+            if tarea is None:
+                break
+            if self.error is not None:
+                continue  # roto: sólo se vacía la cola para no bloquear al recorrido
+            ruta_archivo, st, args = tarea
+            self._cupos.acquire()
+            reserva = 0
+            if self.presupuesto is not None:
+                reserva = self.costo(ruta_archivo)
+                # Decidir y retener bajo el mismo lock que usan las que terminan,
+                # así una retenida nunca se queda sin nadie que la relance
+                with self._admision:
+                    if not self.presupuesto.intentar_reservar(reserva):
+                        self._retenidas.append((ruta_archivo, st, args, reserva))
+                        self._cupos.release()
+                        continue
+            self._lanzar(ruta_archivo, st, args, reserva)
+
+    def _lanzar(self, ruta_archivo, st, args, reserva):
+        try:
+            futuro = self.executor.submit(self.funcion, *args)
+        except Exception as e:
+            self._romper(e)
+            self._liberar(reserva)
+            self._informar(ruta_archivo, st, None, e)
+            return
+        futuro.add_done_callback(
+            lambda f, ruta=ruta_archivo, st=st, reserva=reserva:
+                self._terminado(f, ruta, st, reserva))
+
+    def _terminado(self, futuro, ruta_archivo, st, reserva=0):
+        try:
+            salidas, error = futuro.result(), None
+        except Exception as e:
+            salidas, error = None, e
+            if isinstance(e, BrokenExecutor):
+                self._romper(e)
+        try:
+            self._informar(ruta_archivo, st, salidas, error)
+        finally:
+            self._liberar(reserva)
+
+    def _informar(self, ruta_archivo, st, salidas, error):
+        if error is not None:
+            print(f"❌| Error con {ruta_archivo}: {error}")
+            # Evento del carril: la falla queda registrada aunque la tarea no
+            # llegara a emitir el suyo (p. ej. su proceso murió)
+            metricas.emitir({"etapa": "carril", "archivo": ruta_archivo,
+                             "duracion": 0.0, "error": str(error)})
+        try:
+            self.al_terminar(ruta_archivo, st, salidas, error)
+        except Exception as e:
+            print(f"❌| Error con {ruta_archivo}: {e}")
+
+    def _liberar(self, reserva):
+        retenida = None
+        if reserva:
+            self.presupuesto.liberar(reserva)
+        if self.presupuesto is not None:
+            with self._admision:
+                if self.error is not None:
+                    self._retenidas.clear()
+                elif self._retenidas and \
+                        self.presupuesto.intentar_reservar(self._retenidas[0][3]):
+                    # Se lanza dentro del lock (reentrante) para que cerrar() no
+                    # dé el carril por vacío antes de que llegue al executor
+                    retenida = self._retenidas.popleft()
+                    self._lanzar(*retenida)  # hereda el cupo de la que terminó
+                self._admision.notify_all()
+        if retenida is None:
+            self._cupos.release()
+
+    def _romper(self, error):
+        if self.error is None:
+            self.error = error
+            print(f"❌| El carril dejó de despachar: {error!r}")
+
+    def cerrar(self):
+        self.cola.put(None)
+        self._hilo.join()
+        # Las retenidas se lanzan al terminar otras: esperar a que salgan todas
+        with self._admision:
+            while self._retenidas and self.error is None:
+                self._admision.wait()
+
+
+class _CuposCpu:
+    """
+    Núcleos del presupuesto compartidos por los dos carriles.
+    Cada video en curso ocupa `hilos_ffmpeg` núcleos, hasta `trabajos_video`
+    a la vez. Las imágenes tienen siempre `minimo_img` procesos y además usan
+    los núcleos que los videos no ocupan en ese momento, así un árbol sólo de
+    imágenes (o el tramo sin videos) usa la máquina entera. Un video que llega
+    no espera a las imágenes: son cortas y no se lanzan más hasta que haya
+    hueco. Cuando ya no quedan imágenes (sin_mas_imagenes) los videos pueden
+    ocupar también los núcleos del carril de imágenes.
+    """
+
+    def __init__(self, total, minimo_img, trabajos_video, hilos_ffmpeg):
+        self.total = total
+        self.minimo_img = minimo_img
+        self.trabajos_video = trabajos_video
+        self.hilos_ffmpeg = hilos_ffmpeg
+        self.max_videos = max(trabajos_video, total // hilos_ffmpeg)
+        self._imagenes = 0
+        self._videos = 0
+        self._sin_mas_imagenes = False
+        self._condicion = threading.Condition()
+        self.imagenes = SimpleNamespace(acquire=self._tomar_imagen, release=self._soltar_imagen)
+        self.videos = SimpleNamespace(acquire=self._tomar_video, release=self._soltar_video,
+                                      intentar=self._intentar_video)
+
+    def _tomar_imagen(self):
+        with self._condicion:
+            while self._imagenes >= max(self.minimo_img,
+                                        self.total - self._videos * self.hilos_ffmpeg):
+                self._condicion.wait()
+            self._imagenes += 1
+
+    def _soltar_imagen(self):
+        with self._condicion:
+            self._imagenes -= 1
+            self._condicion.notify_all()
+
+    def _tomar_video(self):
+        with self._condicion:
+            while self._videos >= self._limite_videos():
+                self._condicion.wait()
+            self._videos += 1
+
+    def _intentar_video(self):
+        # Cupo extra sin esperar, para los trozos de un video segmentado
+        with self._condicion:
+            if self._videos >= self._limite_videos():
+                return False
+            self._videos += 1
+            return True
+
+    def _soltar_video(self):
+        with self._condicion:
+            self._videos -= 1
+            self._condicion.notify_all()
+
+    def _limite_videos(self):
+        if self._sin_mas_imagenes and not self._imagenes:
+            return self.max_videos
+        return self.trabajos_video
+
+    def sin_mas_imagenes(self):
+        with self._condicion:
+            self._sin_mas_imagenes = True
+            self._condicion.notify_all()
+
+
+def _opciones_proceso(calidad_img=80, codec_video="libx265", crf=28, preset="medium",
+                      salidas_video=("resolve",), umbral_segmentado=UMBRAL_SEGMENTADO,
+                      versiones_img=None, versiones_video=None, autoajuste=None,
+                      formatos_img=None):
+    """
+    Argumentos de procesar_archivo (por nombre) comunes a todos los archivos
+    de una ejecución; los usan igual los modos por lotes, cola y vigilancia.
+    """
+    return dict(
+        calidad_img=calidad_img, codec_video=codec_video, crf=crf, preset=preset,
+        salidas_video=tuple(salidas_video), umbral_segmentado=umbral_segmentado,
+        versiones_img=versiones_img, versiones_video=versiones_video,
+        autoajuste=autoajuste, formatos_img=tuple(formatos_img) if formatos_img else None,
+    )
+
+
+def _parametros(opciones):
+    """
+    Parámetros que se guardan en el manifiesto (si cambian, el archivo se
+    vuelve a procesar). Las claves opcionales sólo aparecen cuando se usan,
+    así los manifiestos anteriores siguen siendo válidos.
+    """
+    parametros = {
+        "calidad_img": opciones["calidad_img"],
+        "codec_video": opciones["codec_video"],
+        "crf": opciones["crf"],
+        "preset": opciones["preset"],
+        "salidas_video": sorted(opciones["salidas_video"]),
+        "versiones_img": opciones["versiones_img"] or {},
+        "versiones_video": opciones["versiones_video"] or {},
+    }
+    if opciones["autoajuste"]:
+        parametros["autoajuste"] = opciones["autoajuste"]
+    if opciones["formatos_img"]:
+        parametros["formatos_img"] = list(opciones["formatos_img"])
+    return parametros
+
+
+def _tareas_carriles(opciones, sobrescribir, hilos_ffmpeg=None, segmentos_largos=None,
+                     cupos_trozos=None):
+    """
+    Funciones de los carriles de imágenes y de videos con los argumentos
+    comunes ya fijados por nombre (functools.partial): cada tarea sólo
+    recibe (ruta_archivo, ruta_destino).
+    """
+    tarea_img = partial(optimizar_imagen, calidad_img=opciones["calidad_img"],
+                        sobrescribir=sobrescribir, versiones=opciones["versiones_img"],
+                        formatos=opciones["formatos_img"])
+    tarea_vid = partial(procesar_archivo, sobrescribir=sobrescribir, hilos_ffmpeg=hilos_ffmpeg,
+                        segmentos_largos=segmentos_largos, cupos_trozos=cupos_trozos,
+                        **opciones)
+    return tarea_img, tarea_vid
+
+
+@contextmanager
+def _carriles(opciones, sobrescribir, al_terminar, presupuesto_cpu, fraccion_video,
+              hilos_por_video, memoria_img_mb, inicializador=None, usar_hash=False):
+    """
+    Abre el pool de imágenes (procesos) y el de videos (hilos) con sus
+    carriles y entrega `despachar(ruta_archivo, ruta_destino, st)`, que manda
+    cada archivo a su carril. Al salir espera a que termine lo despachado.
+    `inicializador` se ejecuta en cada proceso del pool de imágenes.
+    Con `usar_hash` cada tarea calcula además el hash de su origen para el
+    manifiesto, que llega a `al_terminar` como `hash_archivo`.
+    """
+    # El reparto fijo es el mínimo de cada carril; cada uno toma además lo que
+    # el otro no usa (el contenido del árbol no se conoce hasta recorrerlo)
+    # En una máquina de un solo núcleo el valor por defecto es el mínimo de 2
+    presupuesto_cpu = presupuesto_cpu or max(2, os.cpu_count() or 1)
+    procesos_img, trabajos_video, hilos_ffmpeg = repartir_cpu(
+        presupuesto_cpu, True, True, fraccion_video, hilos_por_video
+    )
+    cpu = _CuposCpu(presupuesto_cpu, procesos_img, trabajos_video, hilos_ffmpeg)
+    print(f"🔧| Imágenes: {procesos_img} procesos (hasta {presupuesto_cpu} sin videos) | "
+          f"Videos: {trabajos_video} a la vez x {hilos_ffmpeg} hilos ffmpeg\n")
+    # Un video largo se parte en tantos trozos como videos caben en el carril;
+    # cuántos corren a la vez depende de los cupos de video libres
+    tarea_img, tarea_vid = _tareas_carriles(opciones, sobrescribir, hilos_ffmpeg,
+                                            max(2, cpu.max_videos), cpu.videos)
+    informar = al_terminar
+    if usar_hash:
+        # El hash se calcula en la tarea: en el callback del executor frenaría
+        # la liberación de cupos y el despacho de todo el carril
+        tarea_img, tarea_vid = partial(con_hash, tarea_img), partial(con_hash, tarea_vid)
+
+        def informar(ruta_archivo, st, resultado, error=None):
+            salidas, hash_archivo = resultado if resultado is not None else (None, None)
+            al_terminar(ruta_archivo, st, salidas, error, hash_archivo)
+
+    # "spawn": un worker creado con fork mientras el carril de video lanza
+    # ffmpeg heredaría la tubería de error de ese Popen y lo dejaría colgado
+    # Los procesos de "spawn" se crean a demanda: max_workers es sólo el techo
+    with ProcessPoolExecutor(max_workers=presupuesto_cpu,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=inicializador) as pool_img, \
+         ThreadPoolExecutor(max_workers=cpu.max_videos) as pool_vid:
+        carril_img = _Carril(pool_img, tarea_img, informar, cpu.imagenes,
+                             presupuesto=PresupuestoMemoria(memoria_img_mb),
+                             costo=memoria_estimada)
+        carril_vid = _Carril(pool_vid, tarea_vid, informar, cpu.videos)
+
+        def despachar(ruta_archivo, ruta_destino, st):
+            carril = carril_img if ruta_archivo.lower().endswith(EXTENSIONES_IMG) else carril_vid
+            carril.poner(ruta_archivo, st, (ruta_archivo, ruta_destino))
+
+        try:
+            yield despachar
+        finally:
+            carril_img.cerrar()
+            cpu.sin_mas_imagenes()
+            carril_vid.cerrar()
+        for carril in (carril_img, carril_vid):
+            if carril.error is not None:
+                raise carril.error
 
 
 def optimizar_archivos_parallel(carpeta, calidad_img=80,
-                                codec_video="libx265", crf=28, preset="medium"):
+                                codec_video="libx265", crf=28, preset="medium",
+                                usar_manifiesto=True, usar_hash=False,
+                                salidas_video=("resolve",),
+                                presupuesto_cpu=None, fraccion_video=0.75,
+                                hilos_por_video=4, renombrar=False,
+                                umbral_segmentado=UMBRAL_SEGMENTADO,
+                                memoria_img_mb=MEMORIA_IMG_MB,
+                                versiones_img=None, versiones_video=None,
+                                autoajuste=None, formatos_img=None):
     """
-    Recorre la carpeta, prepara tareas y las ejecuta en paralelo.
+    Recorre la carpeta y va ejecutando las tareas en paralelo mientras recorre.
+    Con `usar_manifiesto` se lleva un registro (carpeta-optimizados/.manifiesto.sqlite)
+    y sólo se procesan archivos nuevos, modificados o con parámetros distintos.
+    `usar_hash` añade la comparación por contenido cuando cambia el mtime.
+    `salidas_video` se pasa a procesar_archivo (p. ej. ("opt", "resolve")), igual
+    que `versiones_img` / `versiones_video` (miniaturas y proxies) y
+    `autoajuste` (preset/crf elegidos por muestreo para cada perfil de video) y
+    `formatos_img` (formato de cada imagen elegido por tamaño).
+
+    Las imágenes van a un pool de procesos (Pillow no escala con hilos por el GIL)
+    y los videos a un carril propio. `presupuesto_cpu` (por defecto todos los
+    núcleos) se reparte entre ambos según `fraccion_video` (cada carril usa
+    además los núcleos que el otro no ocupa), y cada ffmpeg recibe
+    `hilos_por_video` hilos para no sobresuscribir la máquina. Los videos de al
+    menos `umbral_segmentado` segundos se parten en tantos trozos como videos
+    caben a la vez en el carril, para que un archivo largo no alargue el lote.
+    Antes de decodificar cada imagen se estima su tamaño en memoria por la
+    cabecera y sólo se lanza si cabe en `memoria_img_mb` junto a las que ya se
+    están procesando (las pequeñas siguen yendo a plena concurrencia).
+
+    El recorrido es un generador sobre os.scandir que alimenta colas acotadas,
+    así la codificación empieza con el primer archivo y la memoria no crece con
+    el tamaño del árbol. Con `renombrar` se aplica renombrarArchivos en el mismo
+    recorrido. Las carpetas de destino se crean al escribir la primera salida.
     """
+    carpeta = os.path.abspath(carpeta)
     carpeta_opt = carpeta.rstrip(os.sep) + "-optimizados"
     os.makedirs(carpeta_opt, exist_ok=True)
 
-    tareas = []
-    for ruta_actual, _, archivos in os.walk(carpeta):
-        ruta_relativa = os.path.relpath(ruta_actual, carpeta)
-        ruta_destino = os.path.join(carpeta_opt, ruta_relativa)
-        os.makedirs(ruta_destino, exist_ok=True)
+    manifiesto = None
+    if usar_manifiesto:
+        manifiesto = Manifiesto(os.path.join(carpeta_opt, ".manifiesto.sqlite"),
+                                usar_hash=usar_hash)
+    opciones = _opciones_proceso(calidad_img, codec_video, crf, preset, salidas_video,
+                                 umbral_segmentado, versiones_img, versiones_video,
+                                 autoajuste, formatos_img)
+    parametros = _parametros(opciones)
 
-        for archivo in archivos:
-            tareas.append((
-                os.path.join(ruta_actual, archivo),
-                ruta_destino,
-                calidad_img,
-                codec_video,
-                crf,
-                preset
-            ))
+    contadores = {"procesados": 0, "saltados": 0, "errores": 0}
+    lock_contadores = threading.Lock()
 
-    num_threads = max(1, os.cpu_count() // 2)
-    print(f"🔧| Usando {num_threads} hilos de trabajo…\n")
+    def al_terminar(ruta_archivo, st, salidas, error=None, hash_archivo=None):
+        if salidas and manifiesto is not None:
+            manifiesto.registrar(ruta_archivo, parametros, salidas, st, hash_archivo)
+        with lock_contadores:
+            contadores["errores" if error is not None else "procesados"] += 1
 
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        executor.map(lambda args: procesar_archivo(*args), tareas)
+    try:
+        with _carriles(opciones, manifiesto is not None, al_terminar, presupuesto_cpu,
+                       fraccion_video, hilos_por_video, memoria_img_mb,
+                       usar_hash=manifiesto is not None and usar_hash) as despachar:
+            for ruta_archivo, ruta_relativa, st in recorrer_archivos(carpeta, renombrar):
+                ext = os.path.splitext(ruta_archivo)[1].lower()
+                if ext not in EXTENSIONES_IMG + EXTENSIONES_VID:
+                    continue
+                if manifiesto is not None and \
+                        not manifiesto.necesita_proceso(ruta_archivo, parametros, st):
+                    contadores["saltados"] += 1
+                    continue
+                despachar(ruta_archivo, os.path.join(carpeta_opt, ruta_relativa), st)
+    finally:
+        if manifiesto is not None:
+            manifiesto.cerrar()
 
+    if manifiesto is not None:
+        print(f"\n📒| Manifiesto: {contadores['saltados']} sin cambios, "
+              f"{contadores['procesados']} procesados")
+    if contadores["errores"]:
+        print(f"⚠️| {contadores['errores']} archivos fallaron")
     print(f"\n🚀| Optimización completada. Carpeta generada: {carpeta_opt}")
 
 
+def encolar_carpeta(carpeta, ruta_cola, calidad_img=80,
+                    codec_video="libx265", crf=28, preset="medium",
+                    usar_manifiesto=True, usar_hash=False,
+                    salidas_video=("resolve",), renombrar=False,
+                    umbral_segmentado=UMBRAL_SEGMENTADO,
+                    versiones_img=None, versiones_video=None, autoajuste=None,
+                    formatos_img=None):
+    """
+    Modo cola: recorre la carpeta igual que optimizar_archivos_parallel pero,
+    en lugar de procesar, deja un trabajo por archivo en la cola SQLite
+    `ruta_cola` para los trabajadores de cola.py (en esta u otras máquinas).
+    Antes pasa al manifiesto lo que los trabajadores terminaron desde la
+    última vez, así sólo se encola lo nuevo o modificado.
+    """
+    from cola import ColaTrabajos
+
+    carpeta = os.path.abspath(carpeta)
+    carpeta_opt = carpeta.rstrip(os.sep) + "-optimizados"
+    os.makedirs(carpeta_opt, exist_ok=True)
+    cola = ColaTrabajos(ruta_cola)
+    manifiesto = None
+    if usar_manifiesto:
+        registrar_terminados(carpeta, cola, usar_hash)
+        manifiesto = Manifiesto(os.path.join(carpeta_opt, ".manifiesto.sqlite"),
+                                usar_hash=usar_hash)
+    opciones = _opciones_proceso(calidad_img, codec_video, crf, preset, salidas_video,
+                                 umbral_segmentado, versiones_img, versiones_video,
+                                 autoajuste, formatos_img)
+    parametros = _parametros(opciones)
+    encolados, saltados = 0, 0
+    try:
+        for ruta_archivo, ruta_relativa, st in recorrer_archivos(carpeta, renombrar):
+            ext = os.path.splitext(ruta_archivo)[1].lower()
+            if ext not in EXTENSIONES_IMG + EXTENSIONES_VID:
+                continue
+            if manifiesto is not None and \
+                    not manifiesto.necesita_proceso(ruta_archivo, parametros, st):
+                saltados += 1
+                continue
+            argumentos = dict(opciones, ruta_destino=os.path.join(carpeta_opt, ruta_relativa),
+                              sobrescribir=True)
+            cola.encolar(ruta_archivo, argumentos, parametros, st)
+            encolados += 1
+    finally:
+        cola.cerrar()
+        if manifiesto is not None:
+            manifiesto.cerrar()
+    print(f"📋| Cola {ruta_cola}: {encolados} encolados, {saltados} sin cambios")
+
+
+def registrar_terminados(carpeta, cola, usar_hash=False):
+    """
+    Pasa al manifiesto de la carpeta los trabajos que la cola tiene terminados.
+    Sólo este proceso escribe el manifiesto; los trabajadores escriben en la cola.
+    """
+    terminados = cola.terminados_sin_registrar()
+    if not terminados:
+        return 0
+    carpeta_opt = os.path.abspath(carpeta).rstrip(os.sep) + "-optimizados"
+    manifiesto = Manifiesto(os.path.join(carpeta_opt, ".manifiesto.sqlite"), usar_hash=usar_hash)
+    try:
+        for _, ruta, parametros, salidas, st in terminados:
+            manifiesto.registrar(ruta, parametros, salidas, st)
+    finally:
+        manifiesto.cerrar()
+    cola.marcar_registrados([t[0] for t in terminados])
+    return len(terminados)
+
+
+def vigilar_carpeta(carpeta, calidad_img=80,
+                    codec_video="libx265", crf=28, preset="medium",
+                    usar_hash=False, salidas_video=("resolve",),
+                    presupuesto_cpu=None, fraccion_video=0.75,
+                    hilos_por_video=4, renombrar=True,
+                    umbral_segmentado=UMBRAL_SEGMENTADO,
+                    memoria_img_mb=MEMORIA_IMG_MB,
+                    versiones_img=None, versiones_video=None, autoajuste=None,
+                    formatos_img=None, espera=ESPERA_ESTABLE, forzar_sondeo=False):
+    """
+    Modo vigilancia (no termina nunca; Ctrl+C para salir): observa la carpeta
+    de ingesta y optimiza cada archivo nuevo en cuanto termina de copiarse,
+    con los mismos carriles y parámetros que optimizar_archivos_parallel.
+    Al arrancar se revisa el árbol una vez (el manifiesto salta lo ya hecho);
+    después sólo se miran los archivos que avisa inotify (o el sondeo).
+    Un archivo entra cuando su tamaño y mtime llevan `espera` segundos sin
+    cambiar; los que llegan en ráfaga se renombran y despachan juntos.
+    """
+    carpeta = os.path.abspath(carpeta)
+    carpeta_opt = carpeta.rstrip(os.sep) + "-optimizados"
+    os.makedirs(carpeta_opt, exist_ok=True)
+    # Commit por archivo: el proceso puede detenerse en cualquier momento
+    manifiesto = Manifiesto(os.path.join(carpeta_opt, ".manifiesto.sqlite"),
+                            usar_hash=usar_hash, commit_cada=1)
+    opciones = _opciones_proceso(calidad_img, codec_video, crf, preset, salidas_video,
+                                 umbral_segmentado, versiones_img, versiones_video,
+                                 autoajuste, formatos_img)
+    parametros = _parametros(opciones)
+    # Firma de lo que está en curso: el renombrado propio y los eventos
+    # repetidos de un mismo archivo no deben encolarlo otra vez. Al terminar
+    # sale de aquí (lo terminado ya lo salta el manifiesto), así no crece
+    # durante toda la sesión
+    despachados = {}
+
+    def al_terminar(ruta_archivo, st, salidas, error=None, hash_archivo=None):
+        if salidas:
+            manifiesto.registrar(ruta_archivo, parametros, salidas, st, hash_archivo)
+            print(f"📥| Listo: {ruta_archivo}")
+        # Tras un error, que un nuevo evento del mismo archivo lo vuelva a
+        # intentar; si se despachó otra vez con otra firma, esa sigue en curso
+        if despachados.get(ruta_archivo) == (st.st_size, st.st_mtime_ns):
+            despachados.pop(ruta_archivo, None)
+
+    vigilante = crear_vigilante(carpeta, forzar_sondeo)
+    iniciales = [ruta for ruta, _, _ in recorrer_archivos(carpeta)]
+    print(f"👀| Vigilando {carpeta} ({type(vigilante).__name__}) -> {carpeta_opt}")
+    try:
+        with _carriles(opciones, True, al_terminar, presupuesto_cpu, fraccion_video,
+                       hilos_por_video, memoria_img_mb,
+                       inicializador=ignorar_interrupcion, usar_hash=usar_hash) as despachar:
+            try:
+                for lote in lotes_estables(vigilante, espera, iniciales=iniciales):
+                    # Renombrar por directorio, con las fechas de toda la ráfaga en bloque
+                    por_directorio = {}
+                    for ruta_archivo, st in lote:
+                        por_directorio.setdefault(os.path.dirname(ruta_archivo), {})[
+                            os.path.basename(ruta_archivo)] = st
+                    for raiz, archivos in por_directorio.items():
+                        nombres = list(archivos)
+                        if renombrar:
+                            nombres = renombrar_en_directorio(raiz, nombres)
+                        ruta_destino = os.path.normpath(
+                            os.path.join(carpeta_opt, os.path.relpath(raiz, carpeta)))
+                        for nombre in nombres:
+                            ruta_archivo = os.path.join(raiz, nombre)
+                            ext = os.path.splitext(nombre)[1].lower()
+                            if ext not in EXTENSIONES_IMG + EXTENSIONES_VID:
+                                continue
+                            try:
+                                st = os.stat(ruta_archivo)
+                            except OSError:
+                                continue
+                            firma = (st.st_size, st.st_mtime_ns)
+                            if despachados.get(ruta_archivo) == firma or \
+                                    not manifiesto.necesita_proceso(ruta_archivo, parametros, st):
+                                continue
+                            despachados[ruta_archivo] = firma
+                            despachar(ruta_archivo, ruta_destino, st)
+            except KeyboardInterrupt:
+                print("\n🛑| Vigilancia detenida, terminando lo que está en curso...")
+    finally:
+        vigilante.cerrar()
+        manifiesto.cerrar()
+
+
 if __name__ == "__main__":
+    from tkinter import Tk, filedialog  # sólo la interfaz; sin ella se usa colcis.py
+
     Tk().withdraw()
     carpeta_seleccionada = filedialog.askdirectory(
         title="Selecciona la carpeta con imágenes y/o videos"
@@ -143,15 +899,16 @@ if __name__ == "__main__":
 
     if carpeta_seleccionada:
         start_time = time.time()
-        renombrarArchivos(carpeta_seleccionada)
+        metricas.configurar(carpeta_seleccionada.rstrip(os.sep) + "-metricas.jsonl")
 
-        print("\nSe comenzará a realizar la optimización de archivos: ")
+        print("\nSe comenzará a renombrar y optimizar los archivos: ")
         optimizar_archivos_parallel(
             carpeta_seleccionada,
             calidad_img=80,
             codec_video="libx265",
             crf=28,
-            preset="medium"
+            preset="medium",
+            renombrar=True
         )
 
         elapsed_time = time.time() - start_time
@@ -159,5 +916,6 @@ if __name__ == "__main__":
         minutes, seconds = divmod(rem, 60)
         print("\n✅ Optimización de archivos completada")
         print(f"Tiempo transcurrido: {int(hours)}h {int(minutes)}m {seconds:.2f}s")
+        metricas.imprimir_resumen()
     else:
         print("No seleccionaste ninguna carpeta.")
@@ -2,17 +2,24 @@ import os
 from PIL import Image, ImageOps
 import ffmpeg
 import time
-from tkinter import Tk, filedialog
 from renombrarRegex import renombrarArchivos
+import metricas
+from autoajuste import elegir_ajustes
+from imagenes import optimizar_imagen
 
 """
 Es importante que el archivo de ffmpeg.zip se deba descomprimir y se añada al path en las variables del sistema
 """
 
-def optimizar_archivos(carpeta, calidad_img=80, codec_video="libx265", crf=28, preset="medium"):
+def optimizar_archivos(carpeta, calidad_img=80, codec_video="libx265", crf=28, preset="medium",
+                       autoajuste=None, formatos_img=None):
     """
     Optimiza imágenes y videos en una carpeta (y subcarpetas) de forma recursiva.
     Genera una nueva carpeta raíz con sufijo '-optimizados'.
+    Con `autoajuste` (p. ej. autoajuste.OBJETIVO) el preset y el crf de cada
+    video se eligen muestreándolo (la decisión se reutiliza por perfil).
+    Con `formatos_img` (p. ej. ("jpeg", "webp", "avif")) cada imagen se guarda
+    en el formato más pequeño que pasa el umbral de calidad.
     """
 
     carpeta_opt = carpeta.rstrip(os.sep) + "-optimizados"
@@ -34,7 +41,12 @@ def optimizar_archivos(carpeta, calidad_img=80, codec_video="libx265", crf=28, p
             ext = ext.lower()
 
             # Procesar imágenes
-            if ext in extensiones_img:
+            if ext in extensiones_img and formatos_img:
+                try:
+                    optimizar_imagen(ruta_archivo, ruta_destino, calidad_img, formatos=formatos_img)
+                except Exception as e:
+                    print(f"❌ Error con imagen {ruta_archivo}: {e}")
+            elif ext in extensiones_img:
                 nuevo_nombre = f"{nombre}_opt.jpeg"
                 ruta_nueva = os.path.normpath(os.path.join(ruta_destino, nuevo_nombre))
 
@@ -42,16 +54,19 @@ def optimizar_archivos(carpeta, calidad_img=80, codec_video="libx265", crf=28, p
                     print(f"⏭️ Saltado (ya existe): {ruta_nueva}")
                     continue
 
-                try:
-                    img = Image.open(ruta_archivo)
-                    img = ImageOps.exif_transpose(img).convert("RGB")
-                    nuevo_nombre = f"{nombre}_opt.jpeg"
-                    ruta_nueva = os.path.join(ruta_destino, nuevo_nombre)
+                with metricas.etapa("imagen", ruta_archivo, codec="jpeg") as evento:
+                    try:
+                        img = Image.open(ruta_archivo)
+                        img = ImageOps.exif_transpose(img).convert("RGB")
+                        nuevo_nombre = f"{nombre}_opt.jpeg"
+                        ruta_nueva = os.path.join(ruta_destino, nuevo_nombre)
 
-                    img.save(ruta_nueva, "JPEG", optimize=True, quality=calidad_img)
-                    print(f"🖼️ {ruta_archivo} → {ruta_nueva}")
-                except Exception as e:
-                    print(f"❌ Error con imagen {ruta_archivo}: {e}")
+                        img.save(ruta_nueva, "JPEG", optimize=True, quality=calidad_img)
+                        evento["bytes_salida"] = metricas.tamano(ruta_nueva)
+                        print(f"🖼️ {ruta_archivo} → {ruta_nueva}")
+                    except Exception as e:
+                        evento["error"] = str(e)
+                        print(f"❌ Error con imagen {ruta_archivo}: {e}")
 
             # Procesar videos
             elif ext in extensiones_vid:
@@ -62,26 +77,36 @@ def optimizar_archivos(carpeta, calidad_img=80, codec_video="libx265", crf=28, p
                     print(f"⏭️ Saltado (ya existe): {ruta_nueva}")
                     continue
 
-                try:
-                    (
-                        ffmpeg
-                        .input(ruta_archivo)
-                        .output(ruta_nueva, vcodec=codec_video, crf=crf, preset=preset, acodec="aac")
-                        .run(overwrite_output=True, quiet=True)
-                    )
-                    print(f"🎬 {ruta_archivo} → {ruta_nueva}")
-                except Exception as e:
-                    print(f"❌ Error con video {ruta_archivo}: {e}")
+                with metricas.etapa("video", ruta_archivo, codec=codec_video) as evento:
+                    try:
+                        preset_video, crf_video = preset, crf
+                        if autoajuste:
+                            preset_video, crf_video = elegir_ajustes(ruta_archivo, codec_video,
+                                                                     preset, crf, autoajuste)
+                        (
+                            ffmpeg
+                            .input(ruta_archivo)
+                            .output(ruta_nueva, vcodec=codec_video, crf=crf_video, preset=preset_video, acodec="aac")
+                            .run(overwrite_output=True, quiet=True)
+                        )
+                        evento["bytes_salida"] = metricas.tamano(ruta_nueva)
+                        print(f"🎬 {ruta_archivo} → {ruta_nueva}")
+                    except Exception as e:
+                        evento["error"] = str(e)
+                        print(f"❌ Error con video {ruta_archivo}: {e}")
 
     print(f"\n🚀 Optimización completada. Carpeta generada: {carpeta_opt}")
 
 
 if __name__ == "__main__":
+    from tkinter import Tk, filedialog  # sólo la interfaz; sin ella se usa colcis.py
+
     Tk().withdraw()
     carpeta_seleccionada = filedialog.askdirectory(title="Selecciona la carpeta con imágenes y/o videos")
 
     if carpeta_seleccionada:
         start_time = time.time()
+        metricas.configurar(carpeta_seleccionada.rstrip(os.sep) + "-metricas.jsonl")
         renombrarArchivos(carpeta_seleccionada)
         print("\nSe comenzará a realizar la optimización de archivos: ")
         optimizar_archivos(carpeta_seleccionada, calidad_img=80, codec_video="libx265", crf=28, preset="medium")
@@ -91,5 +116,6 @@ if __name__ == "__main__":
         minutes, seconds = divmod(rem, 60)
         print("\n✅ Optimización de archivos completada")
         print(f"Tiempo transcurrido: {int(hours)}h {int(minutes)}m {seconds:.2f}s")
+        metricas.imprimir_resumen()
     else:
         print("No seleccionaste ninguna carpeta.")
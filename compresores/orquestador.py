@@ -0,0 +1,310 @@
+import os
+import time
+import atexit
+import asyncio
+import threading
+from collections import deque
+
+"""
+Orquestador asíncrono de procesos ffmpeg.
+Un bucle asyncio en un hilo propio lanza cada ffmpeg con `-progress pipe:1`,
+lee fps/speed/out_time en vivo y muestra el avance y el ETA de cada trabajo y
+del conjunto. Cada trabajo tiene un límite de tiempo y un vigilante que lo mata
+si deja de avanzar; al cancelarlo o matarlo se borran sus salidas a medias,
+así un archivo colgado no puede detener todo el lote.
+Los hilos de trabajo llaman a `ejecutar(...)`, que bloquea hasta que termina.
+"""
+
+# Segundos sin que avance out_time para dar un ffmpeg por colgado
+TIEMPO_SIN_PROGRESO = 300
+# Límite por trabajo: FACTOR_TIEMPO_LIMITE x duración del video (mínimo TIEMPO_LIMITE_MINIMO)
+FACTOR_TIEMPO_LIMITE = 30
+TIEMPO_LIMITE_MINIMO = 600
+# Cada cuántos segundos se imprime el avance
+INTERVALO_INFORME = 10
+
+
+def formato_eta(segundos):
+    if segundos is None:
+        return "--:--:--"
+    horas, resto = divmod(int(segundos), 3600)
+    minutos, segundos = divmod(resto, 60)
+    return f"{horas:02}:{minutos:02}:{segundos:02}"
+
+
+def opciones_hilos(vcodec, hilos_ffmpeg):
+    """
+    Opciones de salida de ffmpeg que limitan a `hilos_ffmpeg` los hilos del
+    codificador `vcodec` ({} sin límite). Las usan igual la codificación real
+    y las muestras del autoajuste, para que midan lo mismo.
+    """
+    if not hilos_ffmpeg:
+        return {}
+    opciones = {"threads": hilos_ffmpeg}
+    # libx265 ignora -threads para su propio pool de hilos
+    if vcodec == "libx265":
+        opciones["x265-params"] = f"pools={hilos_ffmpeg}"
+    return opciones
+
+
+def _leer_numero(valor, sufijo=""):
+    try:
+        return float(valor.strip().rstrip(sufijo))
+    except (AttributeError, ValueError):
+        return None
+
+
+class _Trabajo:
+    def __init__(self, etiqueta, duracion, rutas_salida, tiempo_limite):
+        self.etiqueta = etiqueta
+        self.duracion = duracion or None
+        self.rutas_salida = list(rutas_salida or [])
+        self.tiempo_limite = tiempo_limite
+        self.inicio = time.monotonic()
+        self.ultimo_avance = self.inicio
+        self.segundos = 0.0   # out_time: segundos del video ya codificados
+        self.fps = None
+        self.velocidad = None  # speed: segundos de video por segundo real
+        self.tarea = None
+        self.cancelado = False
+
+    def progreso(self):
+        if not self.duracion:
+            return None
+        return min(1.0, self.segundos / self.duracion)
+
+    def eta(self):
+        if not self.duracion or not self.velocidad:
+            return None
+        return max(0.0, self.duracion - self.segundos) / self.velocidad
+
+
+class Orquestador:
+    """
+    Ejecuta procesos ffmpeg de forma asíncrona desde cualquier hilo.
+    """
+
+    def __init__(self, intervalo_informe=INTERVALO_INFORME, sin_progreso=TIEMPO_SIN_PROGRESO):
+        self.intervalo_informe = intervalo_informe
+        self.sin_progreso = sin_progreso
+        self._trabajos = {}
+        self._siguiente_id = 0
+        self._loop = asyncio.new_event_loop()
+        self._hilo = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._hilo.start()
+        if intervalo_informe:
+            asyncio.run_coroutine_threadsafe(self._informar(), self._loop)
+
+    # ---- API para los hilos de trabajo ----
+
+    def ejecutar(self, argumentos, rutas_salida=(), duracion=None, etiqueta=None,
+                 tiempo_limite=None):
+        """
+        Ejecuta ffmpeg con `argumentos` (sin el nombre del programa) y bloquea
+        hasta que termine. `duracion` (segundos del video) permite calcular
+        el avance y el ETA. Si falla, se agota `tiempo_limite` o se cancela,
+        se borran las `rutas_salida` a medias y se lanza RuntimeError,
+        TimeoutError o concurrent.futures.CancelledError.
+        """
+        if tiempo_limite is None and duracion:
+            tiempo_limite = max(TIEMPO_LIMITE_MINIMO, duracion * FACTOR_TIEMPO_LIMITE)
+        etiqueta = etiqueta or os.path.basename(str(argumentos[-1]))
+        trabajo = _Trabajo(etiqueta, duracion, rutas_salida, tiempo_limite)
+        futuro = asyncio.run_coroutine_threadsafe(self._ejecutar(argumentos, trabajo), self._loop)
+        return futuro.result()
+
+    def cancelar(self, etiqueta=None):
+        """
+        Cancela los trabajos con esa etiqueta (o todos): mata el proceso y
+        borra sus salidas a medias. Cada trabajo se cancela una sola vez, así
+        una segunda llamada no interrumpe esa limpieza.
+        """
+        for trabajo in list(self._trabajos.values()):
+            if (etiqueta is None or trabajo.etiqueta == etiqueta) and not trabajo.cancelado:
+                trabajo.cancelado = True
+                self._loop.call_soon_threadsafe(trabajo.tarea.cancel)
+
+    def estado(self):
+        """
+        Foto del avance de los trabajos en curso (útil para interfaces).
+        """
+        return [
+            {"etiqueta": t.etiqueta, "progreso": t.progreso(), "fps": t.fps,
+             "velocidad": t.velocidad, "eta": t.eta(),
+             "transcurrido": time.monotonic() - t.inicio}
+            for t in list(self._trabajos.values())
+        ]
+
+    def eta_total(self):
+        """
+        ETA del conjunto: segundos de video que faltan entre la velocidad
+        sumada de los trabajos en curso (None si no se puede estimar).
+        """
+        trabajos = [t for t in list(self._trabajos.values()) if t.duracion and t.velocidad]
+        velocidad = sum(t.velocidad for t in trabajos)
+        if not velocidad:
+            return None
+        return sum(max(0.0, t.duracion - t.segundos) for t in trabajos) / velocidad
+
+    def cerrar(self):
+        """
+        Cancela lo que quede en curso y detiene el bucle.
+        """
+        if not self._loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._cancelar_todo(), self._loop).result(timeout=15)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._hilo.join(timeout=5)
+
+    # ---- Dentro del bucle ----
+
+    async def _cancelar_todo(self):
+        tareas = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+    async def _ejecutar(self, argumentos, trabajo):
+        trabajo.tarea = asyncio.current_task()
+        id_trabajo = self._siguiente_id
+        self._siguiente_id += 1
+
+        proceso = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+            "-nostats", "-progress", "pipe:1", "-y", *map(str, argumentos),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            # Sesión propia: el Ctrl+C de la terminal no llega a ffmpeg, así
+            # quien lo atiende puede dejar terminar lo que está en curso; al
+            # cerrar el orquestador (atexit) se detienen los que queden
+            start_new_session=True,
+        )
+        self._trabajos[id_trabajo] = trabajo
+        errores = deque(maxlen=20)
+        lectores = [
+            asyncio.ensure_future(self._leer_progreso(proceso.stdout, trabajo)),
+            asyncio.ensure_future(self._leer_errores(proceso.stderr, errores)),
+        ]
+        try:
+            await self._vigilar(proceso, trabajo)
+            await asyncio.gather(*lectores)
+            if proceso.returncode != 0:
+                raise RuntimeError("\n".join(errores)[-500:] or f"ffmpeg terminó con código {proceso.returncode}")
+        except BaseException:
+            await self._detener(proceso)
+            for lector in lectores:
+                lector.cancel()
+            self._borrar_salidas(trabajo)
+            raise
+        finally:
+            self._trabajos.pop(id_trabajo, None)
+
+    async def _vigilar(self, proceso, trabajo):
+        """
+        Espera al proceso comprobando cada segundo el límite de tiempo y que
+        siga avanzando.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(proceso.wait(), timeout=1)
+                return
+            except asyncio.TimeoutError:
+                pass
+            ahora = time.monotonic()
+            if trabajo.tiempo_limite and ahora - trabajo.inicio > trabajo.tiempo_limite:
+                raise TimeoutError(f"{trabajo.etiqueta}: superó el límite de {trabajo.tiempo_limite:.0f}s")
+            if self.sin_progreso and ahora - trabajo.ultimo_avance > self.sin_progreso:
+                raise TimeoutError(f"{trabajo.etiqueta}: sin avanzar en {self.sin_progreso:.0f}s")
+
+    async def _leer_progreso(self, stdout, trabajo):
+        """
+        Lee los bloques clave=valor de -progress y actualiza el trabajo.
+        """
+        async for linea in stdout:
+            clave, _, valor = linea.decode(errors="ignore").partition("=")
+            clave = clave.strip()
+            if clave in ("out_time_us", "out_time_ms"):  # ambos vienen en microsegundos
+                segundos = _leer_numero(valor)
+                if segundos is not None and segundos / 1e6 > trabajo.segundos:
+                    trabajo.segundos = segundos / 1e6
+                    trabajo.ultimo_avance = time.monotonic()
+            elif clave == "fps":
+                trabajo.fps = _leer_numero(valor)
+            elif clave == "speed":
+                trabajo.velocidad = _leer_numero(valor, "x")
+
+    async def _leer_errores(self, stderr, errores):
+        async for linea in stderr:
+            errores.append(linea.decode(errors="ignore").rstrip())
+
+    async def _detener(self, proceso):
+        """
+        Pide a ffmpeg que termine (SIGTERM) y si no lo hace en 5 s lo mata
+        (un ffmpeg bloqueado leyendo la entrada puede ignorar SIGTERM).
+        """
+        if proceso.returncode is not None:
+            return
+        try:
+            proceso.terminate()
+            await asyncio.wait_for(proceso.wait(), timeout=5)
+        except ProcessLookupError:
+            pass
+        except asyncio.TimeoutError:
+            proceso.kill()
+            await proceso.wait()
+
+    def _borrar_salidas(self, trabajo):
+        for ruta in trabajo.rutas_salida:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+    async def _informar(self):
+        while True:
+            await asyncio.sleep(self.intervalo_informe)
+            trabajos = list(self._trabajos.values())
+            if not trabajos:
+                continue
+            print(f"⏳| {len(trabajos)} ffmpeg en curso | ETA total {formato_eta(self.eta_total())}")
+            for t in trabajos:
+                progreso = t.progreso()
+                porcentaje = f"{progreso * 100:5.1f}%" if progreso is not None else "  ?  "
+                velocidad = f"{t.velocidad:.2f}x" if t.velocidad else "-"
+                fps = f"{t.fps:.0f} fps" if t.fps else "-"
+                print(f"    {porcentaje} {velocidad:>7} {fps:>8}  ETA {formato_eta(t.eta())}  {t.etiqueta}")
+
+
+_orquestador = None
+_lock = threading.Lock()
+
+
+def obtener():
+    """
+    Orquestador compartido por el proceso (se crea al primer uso y se cierra
+    al salir, matando los ffmpeg que queden y borrando sus salidas a medias).
+    """
+    global _orquestador
+    with _lock:
+        if _orquestador is None:
+            _orquestador = Orquestador()
+            atexit.register(_orquestador.cerrar)
+        return _orquestador
+
+
+def ejecutar(argumentos, rutas_salida=(), duracion=None, etiqueta=None, tiempo_limite=None):
+    """
+    Atajo a Orquestador.ejecutar sobre el orquestador compartido.
+    """
+    return obtener().ejecutar(argumentos, rutas_salida, duracion, etiqueta, tiempo_limite)
+
+
+def cancelar(etiqueta=None):
+    """
+    Atajo a Orquestador.cancelar sobre el orquestador compartido.
+    """
+    obtener().cancelar(etiqueta)
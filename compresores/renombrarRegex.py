@@ -1,32 +1,52 @@
 import os
 import re
 from datetime import datetime
-from PIL import Image, ExifTags
-import piexif
+from concurrent.futures import ThreadPoolExecutor
+import json
 import subprocess
+import metricas
+import metadatos
+
+EXTENSIONES_VIDEO_EXIFTOOL = ('.mp4', '.mov', '.avi')
+FORMATO_FECHA = metadatos.FORMATO_FECHA
+
+# Hilos para leer fechas de imágenes en paralelo (es E/S, no CPU)
+HILOS_FECHAS = 16
+
+
+def _fecha_video_guardada(ruta_archivo):
+    """
+    Fecha de un video ya consultada a exiftool en otra ejecución:
+    (True, datetime o None) si está en la caché de metadatos, (False, None) si no.
+    """
+    datos = metadatos.campos(ruta_archivo)
+    if "fecha" not in datos:
+        return False, None
+    fecha = datos["fecha"]
+    return True, datetime.strptime(fecha, FORMATO_FECHA) if fecha else None
+
 
 def obtener_fecha_captura(ruta_archivo):
     try:
-        # Para imágenes (JPEG, PNG, etc.)
+        # Imágenes: la caché de metadatos lee el EXIF una sola vez (JPEG por el
+        # segmento APP1 directo, PNG con chunk eXIf por Pillow)
         if ruta_archivo.lower().endswith(('.jpg', '.jpeg', '.png')):
-            img = Image.open(ruta_archivo)
-            exif_data = img._getexif() or {}
-
-            # Buscar la fecha en los metadatos EXIF
-            for tag, value in exif_data.items():
-                tag_nombre = ExifTags.TAGS.get(tag, tag)
-                if tag_nombre == 'DateTimeOriginal':
-                    fecha_str = value
-                    return datetime.strptime(fecha_str, "%Y:%m:%d %H:%M:%S")
+            fecha = metadatos.fecha_captura(ruta_archivo)
+            if fecha:
+                return fecha
 
         # Para videos (usando exiftool externo)
-        elif ruta_archivo.lower().endswith(('.mp4', '.mov', '.avi')):
-            result = subprocess.run(
-                ['exiftool', '-CreateDate', '-d', '%Y:%m:%d %H:%M:%S', '-s3', ruta_archivo],
-                capture_output=True, text=True
-            )
-            if result.stdout.strip():
-                return datetime.strptime(result.stdout.strip(), "%Y:%m:%d %H:%M:%S")
+        elif ruta_archivo.lower().endswith(EXTENSIONES_VIDEO_EXIFTOOL):
+            encontrada, fecha = _fecha_video_guardada(ruta_archivo)
+            if not encontrada:
+                result = subprocess.run(
+                    ['exiftool', '-CreateDate', '-d', FORMATO_FECHA, '-s3', ruta_archivo],
+                    capture_output=True, text=True
+                )
+                fecha = datetime.strptime(result.stdout.strip(), FORMATO_FECHA) if result.stdout.strip() else None
+                metadatos.actualizar(ruta_archivo, fecha=fecha.strftime(FORMATO_FECHA) if fecha else None)
+            if fecha:
+                return fecha
 
     except Exception as e:
         print(f"⚠️ No se pudo obtener la fecha de captura para {ruta_archivo}: {e}")
@@ -36,31 +56,157 @@ def obtener_fecha_captura(ruta_archivo):
     return datetime.fromtimestamp(timestamp_mod)
 
 
+def _clave_ruta(ruta):
+    # exiftool puede devolver la ruta con otras barras (p. ej. en Windows)
+    return os.path.normcase(os.path.normpath(ruta))
+
+
+def obtener_fechas_videos(rutas, tam_lote=500):
+    """
+    Lee la fecha de creación de muchos videos con una sola invocación de
+    exiftool por lote (salida JSON, rutas enviadas por stdin con -@ -).
+    Evita arrancar un intérprete de Perl por cada archivo; los videos cuya
+    fecha ya está en la caché de metadatos no se vuelven a consultar.
+    Devuelve {ruta: datetime} sólo para los archivos con fecha válida.
+    """
+    fechas = {}
+    pendientes = []
+    for ruta in rutas:
+        encontrada, fecha = _fecha_video_guardada(ruta)
+        if not encontrada:
+            pendientes.append(ruta)
+        elif fecha:
+            fechas[ruta] = fecha
+
+    for i in range(0, len(pendientes), tam_lote):
+        lote = pendientes[i:i + tam_lote]
+        originales = {_clave_ruta(r): r for r in lote}
+        try:
+            result = subprocess.run(
+                ['exiftool', '-json', '-fast', '-CreateDate', '-d', FORMATO_FECHA,
+                 '-charset', 'filename=utf8', '-@', '-'],
+                input="\n".join(lote), capture_output=True, text=True, encoding="utf-8"
+            )
+            for item in json.loads(result.stdout or "[]"):
+                ruta = originales.get(_clave_ruta(item.get("SourceFile", "")))
+                valor = item.get("CreateDate")
+                if ruta is None or not isinstance(valor, str):
+                    continue
+                try:
+                    fechas[ruta] = datetime.strptime(valor, FORMATO_FECHA)
+                except ValueError:
+                    pass  # p. ej. "0000:00:00 00:00:00"
+            # Guardar también los que no tienen fecha, para no volver a preguntar
+            if result.returncode in (0, 1):
+                for ruta in lote:
+                    fecha = fechas.get(ruta)
+                    metadatos.actualizar(ruta, fecha=fecha.strftime(FORMATO_FECHA) if fecha else None)
+        except Exception as e:
+            print(f"⚠️ No se pudo leer el lote de exiftool ({len(lote)} archivos): {e}")
+    return fechas
+
+
+def obtener_fechas_captura(rutas, hilos=HILOS_FECHAS):
+    """
+    Resuelve en bloque la fecha de captura de una lista de archivos.
+    Los videos se consultan por lotes a exiftool; las imágenes se leen en un
+    pool de hilos a la vez que corre exiftool, así todas las fechas del
+    directorio están listas antes de renombrar nada.
+    Si no hay metadatos se usa la fecha de modificación.
+    """
+    videos = [r for r in rutas if r.lower().endswith(EXTENSIONES_VIDEO_EXIFTOOL)]
+    imagenes = [r for r in rutas if not r.lower().endswith(EXTENSIONES_VIDEO_EXIFTOOL)]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(hilos, len(imagenes) + 1))) as pool:
+        futuro_videos = pool.submit(obtener_fechas_videos, videos) if videos else None
+        fechas = dict(zip(imagenes, pool.map(obtener_fecha_captura, imagenes)))
+        fechas_videos = futuro_videos.result() if futuro_videos else {}
+
+    for ruta in videos:
+        fechas[ruta] = fechas_videos.get(ruta) or datetime.fromtimestamp(os.path.getmtime(ruta))
+    return fechas
+
+
+PATRON_RENOMBRADO = re.compile(r'^(IMG|MVI)_(\d+)\.(.+)$', re.IGNORECASE)
+
+
+def _renombrar_candidatos(candidatos):
+    """
+    Renombra una lista de candidatos (raiz, archivo, grupos del patrón).
+    Devuelve {ruta_original: ruta_final}, con None si el archivo se eliminó
+    por duplicado y la ruta original si no se pudo renombrar.
+    """
+    # Resolver todas las fechas de captura en bloque
+    rutas = [os.path.join(raiz, archivo) for raiz, archivo, _ in candidatos]
+    if not rutas:
+        return {}
+    with metricas.etapa("fechas_captura", os.path.commonpath(rutas), archivos=len(rutas)):
+        fechas = obtener_fechas_captura(rutas)
+
+    resultado = {}
+    for raiz, archivo, (prefijo, numero, extension) in candidatos:
+        ruta_completa = os.path.join(raiz, archivo)
+        resultado[ruta_completa] = ruta_completa
+
+        fecha_str = fechas[ruta_completa].strftime("%Y%m%d")
+
+        nuevo_nombre = f"{fecha_str}_{numero}.{extension}"
+        nueva_ruta = os.path.join(raiz, nuevo_nombre)
+
+        with metricas.etapa("renombrado", ruta_completa) as evento:
+            try:
+                # Si ya existe un archivo con el nombre destino
+                if os.path.exists(nueva_ruta):
+                    print(f"⚠️ Ya existe {nuevo_nombre}, eliminando {archivo} para evitar duplicado...")
+                    os.remove(ruta_completa)
+                    resultado[ruta_completa] = None
+                    evento["duplicado"] = True
+                    continue  # saltar al siguiente archivo
+
+                os.rename(ruta_completa, nueva_ruta)
+                metadatos.mover(ruta_completa, nueva_ruta)
+                resultado[ruta_completa] = nueva_ruta
+                evento["destino"] = nueva_ruta
+                print(f"✅ Renombrado: {archivo} → {nuevo_nombre}")
+            except Exception as e:
+                evento["error"] = str(e)
+                print(f"❌ Error al renombrar {archivo}: {e}")
+    return resultado
+
+
+def renombrar_en_directorio(raiz, archivos):
+    """
+    Renombra los archivos IMG_/MVI_ de un solo directorio (ya listado por quien
+    llama) y devuelve la lista de nombres resultante, sin los eliminados.
+    Permite renombrar durante el mismo recorrido que hace la optimización.
+    """
+    candidatos = []
+    for archivo in archivos:
+        coincidencia = PATRON_RENOMBRADO.match(archivo)
+        if coincidencia:
+            candidatos.append((raiz, archivo, coincidencia.groups()))
+    if not candidatos:
+        return list(archivos)
+
+    resultado = _renombrar_candidatos(candidatos)
+    nombres = []
+    for archivo in archivos:
+        ruta_final = resultado.get(os.path.join(raiz, archivo), os.path.join(raiz, archivo))
+        if ruta_final is not None:
+            nombres.append(os.path.basename(ruta_final))
+    return list(dict.fromkeys(nombres))
+
+
 def renombrarArchivos(directorio):
-    patron = re.compile(r'^(IMG|MVI)_(\d+)\.(.+)$', re.IGNORECASE)
     print(f"🔍 Buscando archivos desde: {directorio}...")
 
+    # 1) Reunir candidatos
+    candidatos = []
     for raiz, _, archivos in os.walk(directorio):
         for archivo in archivos:
-            coincidencia = patron.match(archivo)
+            coincidencia = PATRON_RENOMBRADO.match(archivo)
             if coincidencia:
-                prefijo, numero, extension = coincidencia.groups()
-                ruta_completa = os.path.join(raiz, archivo)
-
-                fecha_captura = obtener_fecha_captura(ruta_completa)
-                fecha_str = fecha_captura.strftime("%Y%m%d")
+                candidatos.append((raiz, archivo, coincidencia.groups()))
 
-                nuevo_nombre = f"{fecha_str}_{numero}.{extension}"
-                nueva_ruta = os.path.join(raiz, nuevo_nombre)
-
-                try:
-                    # Si ya existe un archivo con el nombre destino
-                    if os.path.exists(nueva_ruta):
-                        print(f"⚠️ Ya existe {nuevo_nombre}, eliminando {archivo} para evitar duplicado...")
-                        os.remove(ruta_completa)
-                        continue  # saltar al siguiente archivo
-
-                    os.rename(ruta_completa, nueva_ruta)
-                    print(f"✅ Renombrado: {archivo} → {nuevo_nombre}")
-                except Exception as e:
-                    print(f"❌ Error al renombrar {archivo}: {e}")
+    # 2) Resolver fechas en bloque y renombrar
+    _renombrar_candidatos(candidatos)
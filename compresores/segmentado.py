@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import sondeo
+import orquestador
+
+"""
+Codificación segmentada de videos largos.
+El video se parte en los keyframes (sin recodificar) en N trozos, los trozos se
+codifican en paralelo, el audio se codifica aparte de una sola vez para que sea
+continuo, y al final todo se une sin pérdidas con el demuxer concat.
+"""
+
+# A partir de esta duración conviene partir el archivo (segundos)
+UMBRAL_SEGMENTADO = 20 * 60
+
+# Opciones que sólo tienen sentido en el archivo final, no en cada trozo
+_OPCIONES_FINALES = ("acodec", "movflags", "map_metadata")
+
+
+def ejecutar_ffmpeg(argumentos, duracion=None, etiqueta=None, rutas_salida=()):
+    """
+    Ejecuta ffmpeg con la lista de argumentos dada (sin el nombre del programa)
+    en el orquestador compartido: con avance, límite de tiempo y cancelación.
+    Si falla, el orquestador borra las `rutas_salida` a medio escribir.
+    """
+    orquestador.ejecutar(argumentos, rutas_salida=rutas_salida,
+                         duracion=duracion, etiqueta=etiqueta)
+
+
+def _argumentos(opciones):
+    """
+    Convierte un diccionario de opciones estilo ffmpeg-python en argumentos de CLI.
+    """
+    argumentos = []
+    for clave, valor in opciones.items():
+        argumentos.append(f"-{clave}")
+        if valor is not None:
+            argumentos.append(str(valor))
+    return argumentos
+
+
+def conviene_segmentar(ruta, umbral=UMBRAL_SEGMENTADO):
+    """
+    Indica si un video es lo bastante largo para el modo segmentado.
+    """
+    return sondeo.duracion_archivo(ruta) >= umbral
+
+
+def _en_paralelo(tareas, cupos=None):
+    """
+    Ejecuta las funciones de `tareas` y relanza el primer error.
+    Sin `cupos` corren todas a la vez. Con `cupos` (acquire/release del carril
+    de video más intentar(), que no espera) corre una con el cupo que ya tiene
+    el video y otra más por cada cupo libre que el carril preste al empezar;
+    así los trozos nunca pasan del presupuesto de núcleos del carril.
+    """
+    prestados = 0
+    if cupos is not None:
+        while prestados < len(tareas) - 1 and cupos.intentar():
+            prestados += 1
+    hilos = len(tareas) if cupos is None else 1 + prestados
+    pool = ThreadPoolExecutor(max_workers=hilos)
+    try:
+        for futuro in [pool.submit(tarea) for tarea in tareas]:
+            futuro.result()
+    finally:
+        # Si un trozo falla, los que aún no empezaron ya no se lanzan
+        pool.shutdown(cancel_futures=True)
+        for _ in range(prestados):
+            cupos.release()
+
+
+def codificar_segmentado(ruta_entrada, salidas, segmentos=None,
+                         opciones_audio=None, ejecutar=None, cupos=None):
+    """
+    Codifica `ruta_entrada` partiéndolo en `segmentos` trozos en paralelo.
+    `salidas` es {ruta_salida: opciones de video estilo ffmpeg-python}; cada
+    trozo se decodifica una vez y genera todas las salidas a la vez.
+    `opciones_audio` son las opciones del audio (AAC por defecto).
+    `ejecutar(argumentos, duracion, etiqueta, rutas_salida)` permite cambiar cómo
+    se lanza ffmpeg; debe borrar las `rutas_salida` si falla.
+    `cupos` limita cuántos trozos corren a la vez (ver _en_paralelo).
+    Las salidas se escriben primero con nombre temporal y se renombran al final.
+    """
+    ejecutar = ejecutar or ejecutar_ffmpeg
+    opciones_audio = opciones_audio or {"acodec": "aac"}
+    datos = sondeo.sondear(ruta_entrada)
+    duracion = sondeo.duracion(datos)
+    tiene_audio = any(s.get("codec_type") == "audio" for s in datos["streams"])
+    segmentos = segmentos or max(2, (os.cpu_count() or 2) // 4)
+    nombre = os.path.basename(ruta_entrada)
+
+    dir_salida = os.path.dirname(os.path.abspath(next(iter(salidas))))
+    os.makedirs(dir_salida, exist_ok=True)
+    dir_trabajo = tempfile.mkdtemp(prefix=".segmentos-", dir=dir_salida)
+    try:
+        # 1) Partir sólo el video en keyframes, sin recodificar
+        # (los trozos quedan en dir_trabajo, que se borra entero al final)
+        ejecutar([
+            "-i", ruta_entrada, "-map", "0:v:0", "-c", "copy",
+            "-f", "segment", "-segment_time", f"{max(1.0, duracion / segmentos):.3f}",
+            "-reset_timestamps", "1",
+            os.path.join(dir_trabajo, "trozo_%04d.mkv")
+        ], duracion, f"{nombre} (partir)")
+        trozos = sorted(t for t in os.listdir(dir_trabajo) if t.startswith("trozo_"))
+
+        # 2) Codificar trozos (y el audio completo) en paralelo
+        def codificar_trozo(indice_trozo):
+            argumentos = ["-i", os.path.join(dir_trabajo, trozos[indice_trozo])]
+            rutas = []
+            for indice_salida, opciones in enumerate(salidas.values()):
+                opciones = {k: v for k, v in opciones.items() if k not in _OPCIONES_FINALES}
+                rutas.append(os.path.join(dir_trabajo, f"cod_{indice_salida}_{indice_trozo:04d}.mkv"))
+                argumentos += ["-map", "0:v", *_argumentos(opciones), "-an", rutas[-1]]
+            ejecutar(argumentos, duracion / len(trozos),
+                     f"{nombre} (trozo {indice_trozo + 1}/{len(trozos)})", rutas)
+
+        ruta_audio = os.path.join(dir_trabajo, "audio.mka")
+
+        def codificar_audio():
+            ejecutar(["-i", ruta_entrada, "-map", "0:a:0", "-vn",
+                      *_argumentos(opciones_audio), ruta_audio], duracion, f"{nombre} (audio)",
+                     [ruta_audio])
+
+        tareas = [lambda i=i: codificar_trozo(i) for i in range(len(trozos))]
+        if tiene_audio:
+            tareas.insert(0, codificar_audio)  # un solo hilo de AAC, mejor que empiece ya
+        _en_paralelo(tareas, cupos)
+
+        # 3) Unir sin pérdidas: trozos de video + audio continuo + metadatos del original
+        for indice_salida, (ruta_salida, opciones) in enumerate(salidas.items()):
+            ruta_lista = os.path.join(dir_trabajo, f"lista_{indice_salida}.txt")
+            with open(ruta_lista, "w", encoding="utf-8") as f:
+                for i in range(len(trozos)):
+                    f.write(f"file 'cod_{indice_salida}_{i:04d}.mkv'\n")
+
+            argumentos = ["-f", "concat", "-safe", "0", "-i", ruta_lista]
+            mapas = ["-map", "0:v"]
+            if tiene_audio:
+                argumentos += ["-i", ruta_audio]
+                mapas += ["-map", "1:a"]
+            argumentos += ["-i", ruta_entrada]
+            indice_original = 2 if tiene_audio else 1
+
+            # Dentro de dir_trabajo (único por ejecución, mismo disco que la salida)
+            ruta_tmp = os.path.join(dir_trabajo,
+                                    f"salida_{indice_salida}{os.path.splitext(ruta_salida)[1]}")
+            ejecutar(argumentos + mapas + [
+                "-map_metadata", str(indice_original), "-c", "copy",
+                "-movflags", opciones.get("movflags", "+faststart"), ruta_tmp
+            ], duracion, f"{nombre} (unir)", [ruta_tmp])
+            os.replace(ruta_tmp, ruta_salida)
+    finally:
+        shutil.rmtree(dir_trabajo, ignore_errors=True)
@@ -0,0 +1,87 @@
+import struct
+import metadatos
+
+"""
+Sondeo de videos con ffprobe.
+Los resultados se guardan en la caché compartida de metadatos, por (ruta,
+tamaño, mtime), así un mismo archivo sólo se sondea una vez aunque se vuelva a
+procesar o lo use otro script.
+"""
+
+
+def sondear(ruta):
+    """
+    Devuelve el resultado de ffprobe (formato y streams), usando la caché.
+    """
+    return metadatos.sondeo(ruta)
+
+
+def _primer_stream(sondeo, tipo):
+    for stream in sondeo["streams"]:
+        if stream.get("codec_type") == tipo:
+            return stream
+    return None
+
+
+def duracion(sondeo):
+    try:
+        return float(sondeo["format"]["duration"])
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+
+def duracion_archivo(ruta):
+    """
+    Duración en segundos de un archivo (0.0 si no se puede sondear).
+    """
+    try:
+        return duracion(sondear(ruta))
+    except Exception:
+        return 0.0
+
+
+def clasificar_para_resolve(sondeo):
+    """
+    Indica qué partes de un video ya cumplen H.264 + yuv420p / AAC / MP4.
+    Devuelve {"video_ok", "audio_ok", "contenedor_ok"}; un archivo sin audio
+    cuenta como audio_ok.
+    """
+    video = _primer_stream(sondeo, "video")
+    audio = _primer_stream(sondeo, "audio")
+    formato = sondeo["format"].get("format_name", "")
+    # ffprobe da "mov,mp4,..." también para los .mov: los distingue la marca del ftyp
+    marca = sondeo["format"].get("tags", {}).get("major_brand", "").strip()
+    return {
+        "video_ok": bool(video) and video.get("codec_name") == "h264"
+                    and video.get("pix_fmt") == "yuv420p",
+        "audio_ok": audio is None or audio.get("codec_name") == "aac",
+        "contenedor_ok": "mp4" in formato.split(",") and marca not in ("", "qt"),
+    }
+
+
+def moov_al_inicio(ruta):
+    """
+    Indica si el átomo moov de un MP4 va antes que mdat (lo que hace
+    +faststart), recorriendo sólo las cabeceras de los átomos de primer nivel.
+    Devuelve False si no se encuentra o el archivo no se puede leer.
+    """
+    try:
+        with open(ruta, "rb") as f:
+            while True:
+                cabecera = f.read(8)
+                if len(cabecera) < 8:
+                    return False
+                tamano, tipo = struct.unpack(">I4s", cabecera)
+                if tipo == b"moov":
+                    return True
+                if tipo == b"mdat" or tamano == 0:  # 0: el átomo llega hasta el final
+                    return False
+                if tamano == 1:  # tamaño de 64 bits tras el tipo
+                    tamano = struct.unpack(">Q", f.read(8))[0]
+                    f.seek(tamano - 16, 1)
+                elif tamano < 8:
+                    return False
+                else:
+                    f.seek(tamano - 8, 1)
+    except (OSError, struct.error):
+        return False
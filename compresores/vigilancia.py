@@ -0,0 +1,272 @@
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import signal
+import ctypes
+import ctypes.util
+
+"""
+Vigilancia de una carpeta de ingesta.
+En Linux usa inotify (vía ctypes, sin dependencias) para enterarse de cada
+archivo que termina de escribirse o se mueve a la carpeta, sin recorrer el
+árbol; en otros sistemas, o si inotify no está disponible, compara
+periódicamente el tamaño y el mtime de los archivos.
+Un archivo sólo se entrega cuando su tamaño y mtime dejan de cambiar durante
+unos segundos (una copia en curso nunca se procesa a medias), y los archivos
+que se estabilizan juntos se agrupan en lotes (una ráfaga de copias se
+renombra y despacha de una vez).
+"""
+
+# Segundos que tamaño y mtime deben quedarse quietos para dar un archivo por copiado
+ESPERA_ESTABLE = 3.0
+# Segundos que se sigue juntando una ráfaga antes de entregar el lote
+VENTANA_LOTE = 2.0
+# Intervalo del modo por sondeo (sin inotify)
+INTERVALO_SONDEO = 5.0
+
+# Constantes de <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+_MASCARA = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_ONLYDIR
+_EVENTO = struct.Struct("iIII")
+
+
+def es_ignorable(nombre):
+    # Ocultos (.manifiesto, rsync .archivo.XXXX) y temporales de copias / ffmpeg
+    return nombre.startswith(".") or nombre.endswith((".part", ".tmp", ".crdownload", "~"))
+
+
+def ignorar_interrupcion():
+    """
+    Inicializador de los procesos del pool: Ctrl+C llega a todo el grupo de
+    procesos y sólo el principal debe atenderlo (para cerrar ordenadamente).
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _listar(carpeta):
+    """
+    Archivos bajo `carpeta` como {ruta: (tamaño, mtime_ns)}.
+    """
+    archivos = {}
+    pendientes = [carpeta]
+    while pendientes:
+        try:
+            with os.scandir(pendientes.pop()) as it:
+                for entrada in it:
+                    if es_ignorable(entrada.name):
+                        continue
+                    if entrada.is_dir(follow_symlinks=False):
+                        pendientes.append(entrada.path)
+                    elif entrada.is_file():
+                        st = entrada.stat()
+                        archivos[entrada.path] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            continue
+    return archivos
+
+
+class VigilanteInotify:
+    """
+    Observa `carpeta` y sus subcarpetas con inotify.
+    """
+
+    def __init__(self, carpeta):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify sólo existe en Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(_IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+        self.carpeta = carpeta
+        self._carpetas = {}  # descriptor de vigilancia -> ruta
+        self._nuevos = []
+        self._observar_arbol(carpeta, informar=False)
+
+    def _observar(self, ruta):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(ruta), _MASCARA)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                if not self._carpetas:
+                    raise OSError(error, "se alcanzó fs.inotify.max_user_watches")
+                print(f"⚠️| Sin vigilancias de inotify libres, no se observa {ruta}")
+            return  # la carpeta desapareció entre tanto
+        self._carpetas[wd] = ruta
+
+    def _observar_arbol(self, raiz, informar=True):
+        # Una carpeta nueva puede traer archivos que llegaron antes de vigilarla
+        self._observar(raiz)
+        pendientes = [raiz]
+        while pendientes:
+            try:
+                with os.scandir(pendientes.pop()) as it:
+                    for entrada in it:
+                        if es_ignorable(entrada.name):
+                            continue
+                        if entrada.is_dir(follow_symlinks=False):
+                            self._observar(entrada.path)
+                            pendientes.append(entrada.path)
+                        elif informar and entrada.is_file():
+                            self._nuevos.append(entrada.path)
+            except OSError:
+                continue
+
+    def eventos(self, timeout):
+        """
+        Espera hasta `timeout` segundos y devuelve las rutas de archivos
+        creados, escritos o movidos aquí desde la última llamada.
+        """
+        rutas, self._nuevos = self._nuevos, []
+        listos, _, _ = select.select([self._fd], [], [], 0 if rutas else timeout)
+        if not listos:
+            return rutas
+        datos = os.read(self._fd, 64 * 1024)
+        desplazamiento = 0
+        while desplazamiento < len(datos):
+            wd, mascara, _, longitud = _EVENTO.unpack_from(datos, desplazamiento)
+            desplazamiento += _EVENTO.size
+            nombre = os.fsdecode(datos[desplazamiento:desplazamiento + longitud].rstrip(b"\0"))
+            desplazamiento += longitud
+
+            if mascara & _IN_Q_OVERFLOW:
+                # Se perdieron eventos: única situación en la que se recorre todo
+                print("⚠️| Cola de inotify desbordada, recorriendo la carpeta")
+                rutas.extend(_listar(self.carpeta))
+                continue
+            if mascara & _IN_IGNORED:
+                self._carpetas.pop(wd, None)
+                continue
+            carpeta = self._carpetas.get(wd)
+            if carpeta is None or not nombre or es_ignorable(nombre):
+                continue
+            ruta = os.path.join(carpeta, nombre)
+            if mascara & _IN_ISDIR:
+                if mascara & (_IN_CREATE | _IN_MOVED_TO):
+                    self._observar_arbol(ruta)
+            else:
+                rutas.append(ruta)
+        rutas.extend(self._nuevos)
+        self._nuevos = []
+        return rutas
+
+    def cerrar(self):
+        os.close(self._fd)
+
+
+class VigilanteSondeo:
+    """
+    Alternativa sin inotify: cada `intervalo` segundos compara tamaño y mtime
+    de todos los archivos con la pasada anterior.
+    """
+
+    def __init__(self, carpeta, intervalo=INTERVALO_SONDEO):
+        self.carpeta = carpeta
+        self.intervalo = intervalo
+        self._anterior = _listar(carpeta)
+        self._siguiente = time.monotonic() + intervalo
+
+    def eventos(self, timeout):
+        espera = self._siguiente - time.monotonic()
+        if espera > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, espera))
+        self._siguiente = time.monotonic() + self.intervalo
+        actual = _listar(self.carpeta)
+        rutas = [r for r, firma in actual.items() if self._anterior.get(r) != firma]
+        self._anterior = actual
+        return rutas
+
+    def cerrar(self):
+        pass
+
+
+def crear_vigilante(carpeta, forzar_sondeo=False, intervalo=INTERVALO_SONDEO):
+    """
+    VigilanteInotify si se puede; si no, VigilanteSondeo.
+    """
+    if not forzar_sondeo:
+        try:
+            return VigilanteInotify(carpeta)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️| inotify no disponible ({e}), se vigila por sondeo cada {intervalo:.0f}s")
+    return VigilanteSondeo(carpeta, intervalo)
+
+
+class Estabilizador:
+    """
+    Retiene cada archivo hasta que su tamaño y mtime no cambian en `espera`
+    segundos; así no se procesa una copia a medias.
+    """
+
+    def __init__(self, espera=ESPERA_ESTABLE):
+        self.espera = espera
+        self._pendientes = {}  # ruta -> ((tamaño, mtime_ns), último cambio)
+
+    def __len__(self):
+        return len(self._pendientes)
+
+    def agregar(self, ruta):
+        # Un evento nuevo reinicia la espera aunque la firma no haya cambiado aún
+        self._pendientes[ruta] = (None, time.monotonic())
+
+    def listos(self):
+        """
+        Devuelve [(ruta, stat)] de los archivos que ya se estabilizaron.
+        """
+        ahora = time.monotonic()
+        listos = []
+        for ruta, (firma, desde) in list(self._pendientes.items()):
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                del self._pendientes[ruta]  # borrado o renombrado por quien copia
+                continue
+            firma_actual = (st.st_size, st.st_mtime_ns)
+            if firma_actual != firma:
+                self._pendientes[ruta] = (firma_actual, ahora)
+            elif ahora - desde >= self.espera:
+                del self._pendientes[ruta]
+                listos.append((ruta, st))
+        return listos
+
+
+def lotes_estables(vigilante, espera=ESPERA_ESTABLE, ventana=VENTANA_LOTE,
+                   max_lote=500, iniciales=()):
+    """
+    Generador infinito de lotes [(ruta, stat)] de archivos ya copiados.
+    Un lote se entrega cuando pasa un tick sin que se estabilicen más archivos
+    o cuando lleva `ventana` segundos (o `max_lote` archivos) acumulando.
+    Ningún lote pasa de `max_lote`: una ráfaga mayor (como la revisión
+    inicial) sale en varios.
+    `iniciales` son rutas que ya estaban en la carpeta al arrancar.
+    """
+    estabilizador = Estabilizador(espera)
+    for ruta in iniciales:
+        estabilizador.agregar(ruta)
+    lote, inicio_lote = [], None
+    tick = min(0.5, espera / 2) if espera else 0.5
+    while True:
+        for ruta in vigilante.eventos(tick if len(estabilizador) or lote else 60):
+            estabilizador.agregar(ruta)
+        nuevos = estabilizador.listos()
+        if nuevos and not lote:
+            inicio_lote = time.monotonic()
+        lote.extend(nuevos)
+        while len(lote) >= max_lote:
+            yield lote[:max_lote]
+            lote = lote[max_lote:]
+            inicio_lote = time.monotonic()
+        if lote and (not nuevos or time.monotonic() - inicio_lote >= ventana):
+            yield lote
+            lote = []
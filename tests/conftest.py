@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos compartidos viven en compresores/ y se importan por nombre
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "compresores"))
+
+import metadatos
+
+
+@pytest.fixture(autouse=True)
+def cache_metadatos(tmp_path, monkeypatch):
+    """
+    Caché de metadatos propia de cada prueba: nunca toca ~/.cache/colcis.
+    """
+    monkeypatch.setattr(metadatos, "RUTA_CACHE", str(tmp_path / "metadatos.sqlite"))
+    monkeypatch.setattr(metadatos, "_con", None)
+    yield
+    if metadatos._con is not None:
+        metadatos._con.close()
@@ -0,0 +1,153 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import cola
+from cola import ColaTrabajos, EN_CURSO, FALLIDO, HECHO, PENDIENTE
+
+
+class Reloj:
+    """
+    time.time() controlado a mano, para vencer arriendos sin esperar.
+    """
+
+    def __init__(self):
+        self.ahora = 1_000_000.0
+
+    def time(self):
+        return self.ahora
+
+    def avanzar(self, segundos):
+        self.ahora += segundos
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(cola, "time", SimpleNamespace(time=reloj.time, monotonic=time.monotonic))
+    return reloj
+
+
+@pytest.fixture
+def ruta_db(tmp_path):
+    return str(tmp_path / "cola.sqlite")
+
+
+def _encolar(ruta_db, cantidad):
+    cola_encolar = ColaTrabajos(ruta_db)
+    for i in range(cantidad):
+        cola_encolar.encolar(f"/datos/archivo_{i:03d}.jpg", {"ruta_destino": "/salida"},
+                             {"calidad_img": 80}, SimpleNamespace(st_size=i, st_mtime_ns=i))
+    cola_encolar.cerrar()
+
+
+def test_reclamar_y_completar(ruta_db, reloj):
+    _encolar(ruta_db, 1)
+    trabajos = ColaTrabajos(ruta_db)
+    id_trabajo, ruta, argumentos = trabajos.reclamar("a")
+    assert ruta == "/datos/archivo_000.jpg"
+    assert argumentos == {"ruta_destino": "/salida"}
+    assert trabajos.reclamar("b") is None
+
+    trabajos.completar(id_trabajo, "a", ["/salida/archivo_000_opt.jpeg"])
+    assert trabajos.resumen()[HECHO] == 1
+    [(_, _, parametros, salidas, st)] = trabajos.terminados_sin_registrar()
+    assert parametros == {"calidad_img": 80}
+    assert salidas == ["/salida/archivo_000_opt.jpeg"]
+    trabajos.cerrar()
+
+
+def test_un_trabajo_nunca_se_reclama_dos_veces(ruta_db):
+    _encolar(ruta_db, 60)
+    reclamados = []
+    lock = threading.Lock()
+
+    def trabajador(nombre):
+        # Cada trabajador con su propia conexión, como procesos distintos
+        trabajos = ColaTrabajos(ruta_db)
+        while (trabajo := trabajos.reclamar(nombre)) is not None:
+            with lock:
+                reclamados.append(trabajo[0])
+        trabajos.cerrar()
+
+    hilos = [threading.Thread(target=trabajador, args=(f"t{i}",)) for i in range(6)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert len(reclamados) == 60
+    assert len(set(reclamados)) == 60
+
+
+def test_arriendo_vencido_vuelve_a_reclamarse(ruta_db, reloj):
+    _encolar(ruta_db, 1)
+    a, b = ColaTrabajos(ruta_db, duracion_arriendo=10), ColaTrabajos(ruta_db, duracion_arriendo=10)
+    id_trabajo, _, _ = a.reclamar("a")
+
+    reloj.avanzar(5)
+    assert a.latir(id_trabajo, "a")  # renueva hasta +15
+    reloj.avanzar(9)
+    assert b.reclamar("b") is None
+
+    reloj.avanzar(2)
+    assert b.reclamar("b")[0] == id_trabajo
+    # El primero ya no es dueño: ni latir ni completar tienen efecto
+    assert not a.latir(id_trabajo, "a")
+    a.completar(id_trabajo, "a", ["/salida/de_a"])
+    assert b.resumen() == {PENDIENTE: 0, EN_CURSO: 1, HECHO: 0, FALLIDO: 0}
+
+    b.completar(id_trabajo, "b", ["/salida/de_b"])
+    assert b.terminados_sin_registrar()[0][3] == ["/salida/de_b"]
+    a.cerrar()
+    b.cerrar()
+
+
+def test_agotar_intentos_lo_deja_fallido(ruta_db, reloj):
+    _encolar(ruta_db, 1)
+    trabajos = ColaTrabajos(ruta_db, duracion_arriendo=10, max_intentos=2)
+    for nombre in ("a", "b"):
+        assert trabajos.reclamar(nombre) is not None
+        reloj.avanzar(11)
+    assert trabajos.reclamar("c") is None
+    assert trabajos.resumen()[FALLIDO] == 1
+    trabajos.cerrar()
+
+
+def test_fallar_devuelve_a_la_cola_mientras_queden_intentos(ruta_db, reloj):
+    _encolar(ruta_db, 1)
+    trabajos = ColaTrabajos(ruta_db, max_intentos=2)
+    id_trabajo, _, _ = trabajos.reclamar("a")
+    trabajos.fallar(id_trabajo, "a", "error 1")
+    assert trabajos.resumen()[PENDIENTE] == 1
+
+    id_trabajo, _, _ = trabajos.reclamar("a")
+    trabajos.fallar(id_trabajo, "a", "error 2")
+    assert trabajos.resumen()[FALLIDO] == 1
+    trabajos.cerrar()
+
+
+def test_reencolar_no_toca_trabajos_en_curso(ruta_db, reloj):
+    _encolar(ruta_db, 1)
+    trabajos = ColaTrabajos(ruta_db)
+    trabajos.reclamar("a")
+    _encolar(ruta_db, 1)
+    assert trabajos.resumen()[EN_CURSO] == 1
+    trabajos.cerrar()
+
+
+def test_reencolar_pendiente_actualiza_parametros(ruta_db, reloj):
+    _encolar(ruta_db, 1)
+    trabajos = ColaTrabajos(ruta_db)
+    st = SimpleNamespace(st_size=0, st_mtime_ns=0)
+    trabajos.encolar("/datos/archivo_000.jpg", {"ruta_destino": "/salida", "calidad_img": 60},
+                     {"calidad_img": 60}, st)
+    trabajos.confirmar()
+
+    id_trabajo, _, argumentos = trabajos.reclamar("a")
+    assert argumentos["calidad_img"] == 60
+    trabajos.completar(id_trabajo, "a", ["/salida/archivo_000_opt.jpeg"])
+    [(_, _, parametros, _, _)] = trabajos.terminados_sin_registrar()
+    assert parametros == {"calidad_img": 60}
+    trabajos.cerrar()
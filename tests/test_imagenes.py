@@ -0,0 +1,22 @@
+import pytest
+from PIL import Image
+
+from imagenes import optimizar_imagen
+
+
+def test_optimiza_y_devuelve_las_salidas(tmp_path):
+    ruta = tmp_path / "foto.png"
+    Image.new("RGB", (64, 48), "blue").save(ruta, "PNG")
+
+    salidas = optimizar_imagen(str(ruta), str(tmp_path / "opt"), 80)
+
+    assert salidas == [str(tmp_path / "opt" / "foto_opt.jpeg")]
+
+
+def test_una_imagen_rota_lanza_en_vez_de_devolver_none(tmp_path):
+    # Quien la llama (carril o cola) tiene que poder contarla como fallo
+    ruta = tmp_path / "rota.jpg"
+    ruta.write_bytes(b"no es un jpeg")
+
+    with pytest.raises(Exception):
+        optimizar_imagen(str(ruta), str(tmp_path / "opt"), 80)
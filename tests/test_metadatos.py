@@ -0,0 +1,109 @@
+import os
+import struct
+from datetime import datetime
+
+import piexif
+import pytest
+from PIL import Image
+
+import metadatos
+
+FECHA = "2023:05:06 07:08:09"
+
+
+def _exif(orientacion=6, fecha=FECHA):
+    return piexif.dump({
+        "0th": {piexif.ImageIFD.Orientation: orientacion},
+        "Exif": {piexif.ExifIFD.DateTimeOriginal: fecha.encode("ascii")},
+    })
+
+
+@pytest.fixture
+def jpeg_con_exif(tmp_path):
+    ruta = tmp_path / "foto.jpg"
+    Image.new("RGB", (64, 48), "blue").save(ruta, "JPEG", exif=_exif())
+    return str(ruta)
+
+
+def test_fecha_y_orientacion_de_un_jpeg(jpeg_con_exif):
+    datos = metadatos.datos_imagen(jpeg_con_exif)
+    assert (datos["ancho"], datos["alto"], datos["modo"]) == (64, 48, "RGB")
+    assert datos["orientacion"] == 6
+    assert datos["fecha"] == FECHA
+    assert datos["exif"].startswith(b"Exif\x00\x00")
+    assert metadatos.fecha_captura(jpeg_con_exif) == datetime(2023, 5, 6, 7, 8, 9)
+
+
+def test_la_cabecera_no_decodifica_pixeles(jpeg_con_exif, monkeypatch):
+    # Un JPEG con SOF se resuelve sin Pillow
+    monkeypatch.setattr(metadatos.Image, "open", None)
+    assert metadatos.datos_imagen(jpeg_con_exif)["fecha"] == FECHA
+
+
+def test_exif_little_endian():
+    # TIFF "II" con un único IFD: orientación (SHORT) = 8 y sin más IFDs
+    tiff = b"II*\x00" + struct.pack("<I", 8) + struct.pack("<H", 1)
+    tiff += struct.pack("<HHIHH", 0x0112, 3, 1, 8, 0) + struct.pack("<I", 0)
+    assert metadatos.analizar_exif(b"Exif\x00\x00" + tiff) == {"fecha": None, "orientacion": 8}
+
+
+def test_fecha_vacia_se_descarta():
+    assert metadatos.analizar_exif(_exif(fecha="0000:00:00 00:00:00"))["fecha"] is None
+
+
+def test_fecha_ilegible_en_png_se_descarta(tmp_path):
+    ruta = tmp_path / "captura.png"
+    Image.new("RGB", (8, 8)).save(ruta, "PNG", exif=_exif(fecha="ayer por la tarde"))
+    assert metadatos.datos_imagen(str(ruta))["fecha"] is None
+    assert metadatos.fecha_captura(str(ruta)) is None
+
+
+@pytest.mark.parametrize("largo", [0, 4, 10, 20, 40])
+def test_exif_truncado_no_falla(largo):
+    resultado = metadatos.analizar_exif(_exif()[:largo])
+    assert resultado["fecha"] is None
+    assert resultado["orientacion"] in (None, 6)
+
+
+@pytest.mark.parametrize("largo", [2, 5, 30, 60])
+def test_cabecera_jpeg_truncada(jpeg_con_exif, tmp_path, largo):
+    ruta = tmp_path / "cortado.jpg"
+    with open(jpeg_con_exif, "rb") as f:
+        ruta.write_bytes(f.read()[:largo])
+    datos = metadatos.leer_cabecera_jpeg(str(ruta))
+    assert datos["ancho"] is None and datos["alto"] is None
+
+
+def test_no_es_jpeg(tmp_path):
+    ruta = tmp_path / "falso.jpg"
+    ruta.write_bytes(b"\x89PNG")
+    with pytest.raises(ValueError):
+        metadatos.leer_cabecera_jpeg(str(ruta))
+
+
+def test_jpeg_truncado_no_se_guarda_en_cache(jpeg_con_exif, tmp_path):
+    ruta = tmp_path / "cortado.jpg"
+    with open(jpeg_con_exif, "rb") as f:
+        ruta.write_bytes(f.read()[:60])
+    with pytest.raises(OSError):
+        metadatos.datos_imagen(str(ruta))
+    assert metadatos.campos(str(ruta)) == {}
+
+
+def test_cache_se_invalida_si_cambia_el_archivo(jpeg_con_exif):
+    metadatos.datos_imagen(jpeg_con_exif)
+    assert metadatos.campos(jpeg_con_exif)["orientacion"] == 6
+
+    Image.new("RGB", (32, 32), "red").save(jpeg_con_exif, "JPEG", exif=_exif(orientacion=3))
+    st = os.stat(jpeg_con_exif)
+    os.utime(jpeg_con_exif, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert metadatos.campos(jpeg_con_exif) == {}
+    assert metadatos.datos_imagen(jpeg_con_exif)["orientacion"] == 3
+
+
+def test_mover_conserva_la_entrada(jpeg_con_exif, tmp_path):
+    metadatos.datos_imagen(jpeg_con_exif)
+    destino = str(tmp_path / "renombrada.jpg")
+    os.rename(jpeg_con_exif, destino)
+    metadatos.mover(jpeg_con_exif, destino)
+    assert metadatos.campos(destino)["fecha"] == FECHA
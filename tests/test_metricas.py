@@ -0,0 +1,44 @@
+import json
+
+import metricas
+
+
+def _escribir(ruta, eventos):
+    with open(ruta, "w", encoding="utf-8") as f:
+        for evento in eventos:
+            f.write(json.dumps(evento) + "\n")
+
+
+def test_resumen_con_evento_de_error_sin_duracion(tmp_path, capsys, monkeypatch):
+    ruta = str(tmp_path / "metricas.jsonl")
+    _escribir(ruta, [
+        {"etapa": "imagen", "archivo": "a.jpg", "duracion": 1.5,
+         "bytes_entrada": 100, "bytes_salida": 40, "ejecucion": "x"},
+        # Como los que emite un carril cuando la tarea muere antes de medir su etapa
+        {"etapa": "carril", "archivo": "b.mp4", "error": "pool roto", "ejecucion": "x"},
+    ])
+
+    datos = metricas.resumen(ruta, ejecucion="x")
+
+    assert datos["etapas"]["imagen"]["archivos"] == 1
+    assert datos["etapas"]["carril"]["errores"] == 1
+    assert datos["etapas"]["carril"]["max"] == 0.0
+    assert [e["archivo"] for e in datos["mas_lentos"]] == ["a.jpg", "b.mp4"]
+
+    monkeypatch.setenv(metricas.VAR_DESTINO, ruta)
+    monkeypatch.setenv(metricas.VAR_EJECUCION, "x")
+    metricas.imprimir_resumen()
+    assert "pool roto" in capsys.readouterr().out
+
+
+def test_resumen_filtra_por_ejecucion(tmp_path):
+    ruta = str(tmp_path / "metricas.jsonl")
+    _escribir(ruta, [
+        {"etapa": "video", "archivo": "a.mp4", "duracion": 3.0, "ejecucion": "vieja"},
+        {"etapa": "video", "archivo": "b.mp4", "duracion": 2.0, "ejecucion": "nueva"},
+    ])
+
+    datos = metricas.resumen(ruta, ejecucion="nueva")
+
+    assert datos["etapas"]["video"]["archivos"] == 1
+    assert datos["mas_lentos"][0]["archivo"] == "b.mp4"
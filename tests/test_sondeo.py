@@ -0,0 +1,36 @@
+import struct
+
+import sondeo
+
+
+def _atomo(tipo, cuerpo=b""):
+    return struct.pack(">I4s", 8 + len(cuerpo), tipo) + cuerpo
+
+
+def _mp4(tmp_path, *atomos):
+    ruta = tmp_path / "clip.mp4"
+    ruta.write_bytes(b"".join(atomos))
+    return str(ruta)
+
+
+def test_moov_antes_que_mdat(tmp_path):
+    ruta = _mp4(tmp_path, _atomo(b"ftyp", b"isom" * 4), _atomo(b"moov", b"\0" * 32),
+                _atomo(b"mdat", b"\1" * 64))
+    assert sondeo.moov_al_inicio(ruta)
+
+
+def test_moov_al_final(tmp_path):
+    ruta = _mp4(tmp_path, _atomo(b"ftyp", b"isom" * 4), _atomo(b"mdat", b"\1" * 64),
+                _atomo(b"moov", b"\0" * 32))
+    assert not sondeo.moov_al_inicio(ruta)
+
+
+def test_atomo_de_64_bits_antes_del_moov(tmp_path):
+    libre = struct.pack(">I4sQ", 1, b"free", 16 + 8) + b"\0" * 8
+    ruta = _mp4(tmp_path, _atomo(b"ftyp", b"isom"), libre, _atomo(b"moov"))
+    assert sondeo.moov_al_inicio(ruta)
+
+
+def test_sin_moov_o_truncado(tmp_path):
+    assert not sondeo.moov_al_inicio(_mp4(tmp_path, _atomo(b"ftyp", b"isom"), b"\0\0"))
+    assert not sondeo.moov_al_inicio(str(tmp_path / "no-existe.mp4"))
@@ -0,0 +1,23 @@
+from vigilancia import lotes_estables
+
+
+class VigilanteQuieto:
+    """
+    Vigilante sin eventos: sólo cuentan los archivos iniciales.
+    """
+
+    def eventos(self, timeout):
+        return []
+
+
+def test_revision_inicial_respeta_max_lote(tmp_path):
+    rutas = []
+    for i in range(7):
+        ruta = tmp_path / f"foto{i}.jpg"
+        ruta.write_bytes(b"x")
+        rutas.append(str(ruta))
+
+    lotes = lotes_estables(VigilanteQuieto(), espera=0, max_lote=3, iniciales=rutas)
+    tamanos = [len(next(lotes)) for _ in range(3)]
+
+    assert tamanos == [3, 3, 1]
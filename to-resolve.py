@@ -1,25 +1,114 @@
 import os
+import sys
+import shutil
+import threading
 import ffmpeg
-from tkinter import Tk, filedialog
+from types import SimpleNamespace
 
-def convertir_a_resolve(ruta_entrada, ruta_salida):
+# Módulos compartidos con los compresores (métricas, etc.)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "compresores"))
+import metricas
+import sondeo
+import orquestador
+from segmentado import codificar_segmentado, conviene_segmentar
+
+# Hilos de ffmpeg por trozo en el modo segmentado (como hilos_por_video en optimizer-3-hilos)
+HILOS_POR_TROZO = 4
+
+
+def cupos_segmentado(presupuesto_cpu=None, hilos_por_trozo=HILOS_POR_TROZO):
+    """
+    Reparte `presupuesto_cpu` núcleos (por defecto todos) entre los trozos de
+    un video segmentado. Devuelve (trozos, hilos_ffmpeg, cupos): cuántos
+    trozos hacer, el -threads de cada uno y los cupos para codificar_segmentado
+    (el trozo que ya corre más uno por cada cupo), así nunca corren más trozos
+    de los que caben en el presupuesto.
+    """
+    presupuesto_cpu = presupuesto_cpu or os.cpu_count() or 1
+    hilos_ffmpeg = max(1, min(hilos_por_trozo, presupuesto_cpu))
+    a_la_vez = max(1, presupuesto_cpu // hilos_ffmpeg)
+    libres = threading.BoundedSemaphore(a_la_vez - 1) if a_la_vez > 1 else None
+    cupos = SimpleNamespace(
+        intentar=lambda: libres is not None and libres.acquire(blocking=False),
+        release=lambda: libres.release(),
+    )
+    return max(2, a_la_vez), hilos_ffmpeg, cupos
+
+
+def plan_resolve(ruta_entrada):
+    """
+    Decide qué hay que transcodificar según el sondeo (cacheado) del video.
+    Devuelve (modo, opciones de salida de ffmpeg), con modo "copia" cuando el
+    archivo ya es H.264/AAC en MP4 con el moov al inicio, "remux" cuando sólo
+    hay que cambiar de contenedor o mover el moov, "audio"/"video" si sólo falla esa parte, o "completo".
+    """
+    clasificacion = sondeo.clasificar_para_resolve(sondeo.sondear(ruta_entrada))
+    opciones = {"movflags": "+faststart"}
+
+    if clasificacion["video_ok"]:
+        opciones["vcodec"] = "copy"
+    else:
+        opciones.update(vcodec="libx264", pix_fmt="yuv420p")
+
+    opciones["acodec"] = "copy" if clasificacion["audio_ok"] else "aac"
+
+    if clasificacion["video_ok"] and clasificacion["audio_ok"]:
+        # Copiar tal cual sólo si ya tiene faststart; si no, el remux lo añade
+        modo = "copia" if clasificacion["contenedor_ok"] and \
+            sondeo.moov_al_inicio(ruta_entrada) else "remux"
+    elif clasificacion["video_ok"]:
+        modo = "audio"
+    elif clasificacion["audio_ok"]:
+        modo = "video"
+    else:
+        modo = "completo"
+    return modo, opciones
+
+
+def convertir_a_resolve(ruta_entrada, ruta_salida, presupuesto_cpu=None):
     """
     Convierte un video a un formato ampliamente compatible con DaVinci Resolve:
     H.264 + yuv420p + AAC.
+    Sólo se transcodifica lo que no cumple; un video ya compatible en otro
+    contenedor (o un MP4 con el moov al final) se re-empaqueta con -c copy y
+    +faststart, y uno que ya es MP4 con faststart se copia tal cual, sin pasar
+    por ffmpeg.
+    Los videos largos se codifican por trozos dentro de `presupuesto_cpu`
+    núcleos (por defecto todos), ver cupos_segmentado.
     """
-    (
-        ffmpeg
-        .input(ruta_entrada)
-        .output(
-            ruta_salida,
-            vcodec="libx264",
-            pix_fmt="yuv420p",
-            acodec="aac",
-            movflags="+faststart"
-        )
-        .run(overwrite_output=True, quiet=True)
-    )
-    print(f"🎯 Convertido a Resolve: {ruta_entrada} → {ruta_salida}")
+    try:
+        modo, opciones = plan_resolve(ruta_entrada)
+    except Exception as e:
+        print(f"⚠️ No se pudo sondear {ruta_entrada}, se convierte completo: {e}")
+        modo, opciones = "completo", dict(vcodec="libx264", pix_fmt="yuv420p",
+                                          acodec="aac", movflags="+faststart")
+
+    # Los videos largos que hay que recodificar se parten en trozos paralelos
+    segmentado = opciones["vcodec"] != "copy" and conviene_segmentar(ruta_entrada)
+    if segmentado:
+        modo = f"{modo}, segmentado"
+
+    with metricas.etapa("resolve", ruta_entrada, codec=opciones["vcodec"], modo=modo) as evento:
+        if segmentado:
+            segmentos, hilos_ffmpeg, cupos = cupos_segmentado(presupuesto_cpu)
+            opciones_video = {k: v for k, v in opciones.items() if k != "acodec"}
+            opciones_video.update(orquestador.opciones_hilos(opciones["vcodec"], hilos_ffmpeg))
+            codificar_segmentado(ruta_entrada, {ruta_salida: opciones_video}, segmentos,
+                                 opciones_audio={"acodec": opciones["acodec"]}, cupos=cupos)
+        elif modo == "copia":
+            try:
+                shutil.copyfile(ruta_entrada, ruta_salida)
+            except BaseException:
+                if os.path.exists(ruta_salida):
+                    os.remove(ruta_salida)
+                raise
+        else:
+            # Si ffmpeg falla, se cuelga o se cancela, no queda una salida a medias
+            salida = ffmpeg.input(ruta_entrada).output(ruta_salida, **opciones)
+            orquestador.ejecutar(ffmpeg.compile(salida)[1:], [ruta_salida],
+                                 sondeo.duracion_archivo(ruta_entrada))
+        evento["bytes_salida"] = metricas.tamano(ruta_salida)
+    print(f"🎯 Convertido a Resolve ({modo}): {ruta_entrada} → {ruta_salida}")
 
 def convertir_videos_en_carpeta(carpeta):
     """
@@ -49,10 +138,14 @@ def convertir_videos_en_carpeta(carpeta):
     print("\n✅ Conversión completa. Todos los videos compatibles con DaVinci Resolve están listos.")
 
 if __name__ == "__main__":
+    from tkinter import Tk, filedialog  # sólo la interfaz; sin ella se usa colcis.py
+
     Tk().withdraw()
     carpeta = filedialog.askdirectory(title="Selecciona la carpeta con tus videos")
 
     if carpeta:
+        metricas.configurar(carpeta.rstrip(os.sep) + "-metricas.jsonl")
         convertir_videos_en_carpeta(carpeta)
+        metricas.imprimir_resumen()
     else:
         print("❌ No seleccionaste ninguna carpeta.")
@@ -1,12 +1,483 @@
-import whisper
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
 import threading
 import os
+import gc
+import sys
 import time
+import hashlib
+import warnings
+import argparse
+import subprocess
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# Tk puede no estar instalado en servidores: ahí sólo se usa el modo por lotes
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+except ImportError:
+    tk = filedialog = messagebox = ttk = None
+
+# Módulos compartidos con los compresores (métricas, etc.)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "compresores"))
+import metricas
+import sondeo
+from opciones_whisper import LIMITE_MEMORIA_MB, agregar_argumentos_cpu, opciones_decodificacion
+
+EXTENSIONES_MEDIA = (".wav", ".mp3", ".ogg", ".flac", ".m4a", ".mp4", ".avi", ".mov", ".mkv", ".wmv")
+
+
+def formato_tiempo_srt(t):
+    """
+    Convierte segundos a formato de tiempo SRT (HH:MM:SS,mmm).
+    """
+    horas = int(t // 3600)
+    minutos = int((t % 3600) // 60)
+    segundos = int(t % 60)
+    milis = int((t % 1) * 1000)
+    return f"{horas:02}:{minutos:02}:{segundos:02},{milis:03}"
+
+
+def escribir_segmentos_srt(f, segmentos, indice=1):
+    """
+    Escribe segmentos de Whisper en un archivo SRT ya abierto.
+    Devuelve el siguiente índice, para poder seguir escribiendo por partes.
+    """
+    for segmento in segmentos:
+        f.write(f"{indice}\n")
+        f.write(f"{formato_tiempo_srt(segmento['start'])} --> {formato_tiempo_srt(segmento['end'])}\n")
+        f.write(f"{segmento['text'].strip()}\n\n")
+        indice += 1
+    return indice
+
+
+def ruta_srt(archivo):
+    return f"{os.path.splitext(archivo)[0]}_subtitulos.srt"
+
+
+def guardar_srt(segmentos, archivo_srt):
+    with open(archivo_srt, "w", encoding="utf-8") as f:
+        escribir_segmentos_srt(f, segmentos)
+
+
+# ---- Preparación de audio con caché ----
+
+MUESTRAS_POR_SEGUNDO = 16000  # Whisper trabaja con audio mono a 16 kHz
+DIR_CACHE_AUDIO = os.environ.get(
+    "SUBTITULADOR_CACHE_AUDIO",
+    os.path.join(os.path.expanduser("~"), ".cache", "subtitulador", "audio")
+)
+# Tamaño máximo de la caché de audio (~230 MB por hora de audio)
+LIMITE_CACHE_AUDIO_MB = int(os.environ.get("SUBTITULADOR_CACHE_AUDIO_MB", 5000))
+
+
+def _hash_contenido(ruta, dir_cache):
+    """
+    Hash del contenido del archivo. Se recuerda por (ruta, tamaño, mtime) en
+    un índice dentro de la caché para no releer el archivo completo cada vez.
+    """
+    st = os.stat(ruta)
+    clave = f"{os.path.abspath(ruta)}|{st.st_size}|{st.st_mtime_ns}".encode("utf-8")
+    ruta_indice = os.path.join(dir_cache, "indice", hashlib.blake2b(clave, digest_size=16).hexdigest())
+    try:
+        with open(ruta_indice, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        pass
+
+    h = hashlib.blake2b(digest_size=20)
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    valor = h.hexdigest()
+
+    os.makedirs(os.path.dirname(ruta_indice), exist_ok=True)
+    with open(ruta_indice, "w", encoding="utf-8") as f:
+        f.write(valor)
+    return valor
+
+
+def extraer_audio(ruta):
+    """
+    Decodifica el audio a PCM mono float32 de 16 kHz con ffmpeg, leyendo la
+    salida directamente de la tubería a un arreglo de NumPy (sin WAV temporal).
+    """
+    comando = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", ruta,
+        "-vn", "-f", "f32le", "-ac", "1", "-ar", str(MUESTRAS_POR_SEGUNDO), "-"
+    ]
+    proceso = subprocess.run(comando, capture_output=True)
+    if proceso.returncode != 0:
+        raise RuntimeError(f"No se pudo extraer el audio: {proceso.stderr.decode(errors='ignore')[-500:]}")
+    return np.frombuffer(proceso.stdout, dtype=np.float32)
+
+
+def limpiar_cache_audio(dir_cache=None, limite_mb=LIMITE_CACHE_AUDIO_MB, conservar=None):
+    """
+    Borra los .npy usados hace más tiempo (por mtime, que se renueva en cada
+    uso) hasta que la caché quede dentro de `limite_mb`. `conservar` es el
+    recién usado, que nunca se borra.
+    """
+    dir_cache = dir_cache or DIR_CACHE_AUDIO
+    entradas = []
+    with os.scandir(dir_cache) as it:
+        for entrada in it:
+            if entrada.name.endswith(".npy") and entrada.is_file():
+                try:
+                    st = entrada.stat()
+                except OSError:
+                    continue
+                entradas.append((st.st_mtime, st.st_size, entrada.path))
+    total = sum(tam for _, tam, _ in entradas)
+    limite = limite_mb * 1024 * 1024
+    for _, tam, ruta in sorted(entradas):
+        if total <= limite:
+            break
+        if ruta == conservar:
+            continue
+        try:
+            # Un proceso que ya lo tiene mapeado lo sigue leyendo (POSIX)
+            os.remove(ruta)
+        except OSError:
+            continue
+        total -= tam
+
+
+def preparar_audio(ruta, dir_cache=None):
+    """
+    Deja el audio listo para Whisper en la caché (.npy) y devuelve su ruta.
+    La caché se indexa por el hash del contenido, así volver a transcribir el
+    mismo archivo (otro modelo, un reintento) no vuelve a decodificarlo.
+    """
+    dir_cache = dir_cache or DIR_CACHE_AUDIO
+    os.makedirs(dir_cache, exist_ok=True)
+    ruta_npy = os.path.join(dir_cache, f"{_hash_contenido(ruta, dir_cache)}.npy")
+
+    try:
+        os.utime(ruta_npy)  # marca de uso para limpiar_cache_audio
+    except FileNotFoundError:
+        audio = extraer_audio(ruta)
+        ruta_tmp = f"{ruta_npy}.{os.getpid()}.part"
+        with open(ruta_tmp, "wb") as f:
+            np.save(f, audio)
+        os.replace(ruta_tmp, ruta_npy)
+        limpiar_cache_audio(dir_cache, conservar=ruta_npy)
+    return ruta_npy
+
+
+def cargar_audio(ruta, dir_cache=None):
+    """
+    Devuelve el audio listo para Whisper como arreglo mapeado en memoria (.npy).
+    """
+    return np.load(preparar_audio(ruta, dir_cache), mmap_mode="r")
+
+
+# ---- Inferencia en CPU ----
+
+def cuantizar_modelo(modelo):
+    """
+    Cuantización dinámica int8 de las capas lineales (atención y MLP, casi
+    todo el cómputo del decodificador): pesos int8 y activaciones cuantizadas
+    al vuelo. Sólo para CPU; reduce memoria y suele acelerar 1.5-2x.
+    """
+    import torch
+    import whisper.model
+
+    # whisper.model.Linear sólo añade una conversión de dtype; quantize_dynamic
+    # compara por tipo exacto, así que se tratan como nn.Linear
+    for modulo in modelo.modules():
+        if type(modulo) is whisper.model.Linear:
+            modulo.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(modelo, {torch.nn.Linear},
+                                               dtype=torch.qint8, inplace=True)
+
+
+class CacheModelos:
+    """
+    Caché de modelos de Whisper por nombre.
+    Mantiene los modelos cargados en memoria y, si la suma de sus pesos supera
+    `limite_memoria_mb`, descarta primero el usado hace más tiempo (LRU).
+    Los modelos se cargan en `dispositivo` ("cpu" o "cuda"); con `cuantizar`
+    siempre en CPU, cuantizados a int8.
+    """
+
+    def __init__(self, limite_memoria_mb=LIMITE_MEMORIA_MB, cuantizar=False, dispositivo="cpu"):
+        self.limite_bytes = limite_memoria_mb * 1024 * 1024
+        self.cuantizar = cuantizar
+        self.dispositivo = "cpu" if cuantizar else dispositivo
+        self._modelos = OrderedDict()  # nombre -> (modelo, bytes)
+        self._cargando = {}            # nombre -> lock de carga
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tamano(modelo):
+        # state_dict incluye los pesos int8 empaquetados, que no son parámetros
+        total = 0
+        for valor in modelo.state_dict().values():
+            for tensor in valor if isinstance(valor, tuple) else (valor,):
+                if hasattr(tensor, "element_size"):
+                    total += tensor.numel() * tensor.element_size()
+        return total
+
+    def obtener(self, nombre):
+        """
+        Devuelve el modelo pedido, cargándolo si hace falta.
+        Si otro hilo ya lo está cargando, espera a esa carga en vez de repetirla.
+        """
+        with self._lock:
+            if nombre in self._modelos:
+                self._modelos.move_to_end(nombre)
+                return self._modelos[nombre][0]
+            lock_carga = self._cargando.setdefault(nombre, threading.Lock())
+
+        with lock_carga:
+            with self._lock:
+                if nombre in self._modelos:
+                    self._modelos.move_to_end(nombre)
+                    return self._modelos[nombre][0]
+
+            import whisper  # carga Torch: sólo cuando de verdad hace falta un modelo
+            modelo = whisper.load_model(nombre, device=self.dispositivo)
+            if self.cuantizar:
+                modelo = cuantizar_modelo(modelo)
+
+            with self._lock:
+                self._modelos[nombre] = (modelo, self._tamano(modelo))
+                self._cargando.pop(nombre, None)
+                self._desalojar()
+        return modelo
+
+    def _desalojar(self):
+        # Se llama con el lock tomado; el modelo recién usado está al final
+        total = sum(tam for _, tam in self._modelos.values())
+        desalojados = False
+        while total > self.limite_bytes and len(self._modelos) > 1:
+            _, (_, tam) = self._modelos.popitem(last=False)
+            total -= tam
+            desalojados = True
+        if desalojados:
+            gc.collect()
+
+
+# ---- Procesos de trabajo ----
+# Cada proceso mantiene su propia caché de modelos, así un pool "caliente"
+# puede transcribir varias veces sin volver a leer los pesos del disco.
+# El dispositivo es explícito: si Whisper eligiera solo, en un equipo con CUDA
+# cada proceso subiría su propia copia del modelo a la GPU.
+# Los procesos se crean con "spawn" (como en optimizer-3-hilos): fork con Tk e
+# hilos de fondo vivos puede dejar locks tomados en el hijo.
+# El límite de memoria de la caché es por proceso: quien crea el pool reparte
+# el total entre los procesos (ver limite_por_proceso).
+
+_cache_trabajador = None
+_barrera_trabajador = None
+
+
+def limite_por_proceso(limite_memoria_mb, procesos):
+    """
+    Parte de `limite_memoria_mb` que le toca a la caché de cada proceso, así
+    el pool entero no pasa del límite (cada uno conserva al menos su modelo).
+    """
+    return max(1, limite_memoria_mb // max(1, procesos))
+
+
+def _iniciar_trabajador(hilos, limite_memoria_mb=LIMITE_MEMORIA_MB, hilos_interop=1,
+                        cuantizar=False, dispositivo="cpu", barrera=None):
+    global _cache_trabajador, _barrera_trabajador
+    _barrera_trabajador = barrera
+    import torch
+    # intra-op: hilos de cada matmul; inter-op: operadores independientes en
+    # paralelo (Whisper apenas tiene, y varios procesos ya reparten la CPU)
+    torch.set_num_threads(hilos)
+    try:
+        torch.set_num_interop_threads(hilos_interop)
+    except RuntimeError:
+        pass  # sólo se puede fijar antes del primer cómputo en paralelo
+    _cache_trabajador = CacheModelos(limite_memoria_mb, cuantizar, dispositivo)
+    # El audio llega mapeado desde la caché, de sólo lectura: Whisper no lo
+    # modifica (lo copia al calcular el espectrograma), así que no hace falta
+    # una copia escribible
+    warnings.filterwarnings("ignore", message="The given NumPy array is not writable")
+
+
+def _opciones_modelo(modelo, opciones):
+    # fp16 no existe en CPU (Whisper avisa y usa fp32); en GPU queda su valor por defecto
+    opciones = dict(opciones or {})
+    if modelo.device.type == "cpu":
+        opciones.setdefault("fp16", False)
+    return opciones
+
+
+def _precargar_en_trabajador(nombre_modelo):
+    try:
+        _cache_trabajador.obtener(nombre_modelo)
+    finally:
+        # Esperar a los demás (aunque la carga falle, para no dejarlos
+        # colgados): así ningún proceso toma dos precargas de la misma ronda
+        if _barrera_trabajador is not None:
+            _barrera_trabajador.wait()
+
+
+def _transcribir_en_trabajador(archivo, nombre_modelo, opciones=None):
+    """
+    Devuelve (ruta del SRT, segundos de reloj, factor de tiempo real).
+    """
+    archivo_srt = ruta_srt(archivo)
+    codec = f"whisper-{nombre_modelo}{'-int8' if _cache_trabajador.cuantizar else ''}"
+    with metricas.etapa("transcripcion", archivo, codec=codec) as evento:
+        audio = np.asarray(cargar_audio(archivo))
+        modelo = _cache_trabajador.obtener(nombre_modelo)
+        # El reloj empieza con el modelo ya cargado: el RTF mide sólo la inferencia
+        inicio = time.time()
+        resultado = modelo.transcribe(audio, **_opciones_modelo(modelo, opciones))
+        segundos = time.time() - inicio
+        guardar_srt(resultado["segments"], archivo_srt)
+        rtf = factor_tiempo_real(segundos, len(audio) / MUESTRAS_POR_SEGUNDO)
+        evento["rtf"] = rtf
+        evento["bytes_salida"] = metricas.tamano(archivo_srt)
+    return archivo_srt, segundos, rtf
+
+
+def factor_tiempo_real(segundos_reloj, segundos_audio):
+    """
+    RTF: segundos de cómputo por segundo de audio (< 1 es más rápido que el audio).
+    """
+    return segundos_reloj / segundos_audio if segundos_audio else None
+
+
+def _transcribir_fragmento(nombre_modelo, ruta_npy, inicio, fin, opciones=None):
+    """
+    Transcribe las muestras [inicio, fin) del audio en caché `ruta_npy` y
+    corrige sus tiempos con el desplazamiento del fragmento dentro del archivo.
+    Cada proceso mapea el .npy por su cuenta: el audio no viaja por la tubería.
+    """
+    audio = np.asarray(np.load(ruta_npy, mmap_mode="r")[inicio:fin])
+    desplazamiento = inicio / MUESTRAS_POR_SEGUNDO
+    modelo = _cache_trabajador.obtener(nombre_modelo)
+    resultado = modelo.transcribe(audio, **_opciones_modelo(modelo, opciones))
+    segmentos = []
+    for segmento in resultado["segments"]:
+        segmentos.append({
+            "start": segmento["start"] + desplazamiento,
+            "end": segmento["end"] + desplazamiento,
+            "text": segmento["text"],
+        })
+    return segmentos
+
+
+# ---- Transcripción por fragmentos ----
+
+
+def puntos_de_corte(audio, duracion_objetivo=300, margen=30, trama=0.03):
+    """
+    Calcula dónde partir el audio: cerca de cada `duracion_objetivo` segundos,
+    en el tramo más silencioso (menor energía) dentro de ±`margen` segundos,
+    para no cortar frases a la mitad. Devuelve índices de muestra, de 0 a len(audio).
+    """
+    tam_trama = int(trama * MUESTRAS_POR_SEGUNDO)
+    n_tramas = len(audio) // tam_trama
+    if n_tramas == 0:
+        return [0, len(audio)]
+
+    tramas = audio[:n_tramas * tam_trama].reshape(n_tramas, tam_trama)
+    energia = np.sqrt(np.mean(np.square(tramas, dtype=np.float32), axis=1))
+    # Suavizado de ~300 ms para buscar pausas reales y no huecos entre sílabas
+    energia = np.convolve(energia, np.ones(10) / 10, mode="same")
+
+    cortes = [0]
+    objetivo = duracion_objetivo
+    while (objetivo + margen) / trama < n_tramas:
+        desde = int((objetivo - margen) / trama)
+        hasta = int((objetivo + margen) / trama)
+        mejor = desde + int(np.argmin(energia[desde:hasta]))
+        cortes.append(mejor * tam_trama)
+        objetivo = mejor * trama + duracion_objetivo
+    cortes.append(len(audio))
+    return cortes
+
+
+class TranscriptorParalelo:
+    """
+    Pool de procesos "caliente" para transcribir archivos largos.
+    El audio se parte en silencios, los fragmentos se transcriben en paralelo
+    y los segmentos se escriben al SRT en orden conforme van terminando.
+    """
+
+    def __init__(self, procesos=None, limite_memoria_mb=LIMITE_MEMORIA_MB, cuantizar=False,
+                 hilos_interop=1, opciones=None, dispositivo="cpu"):
+        cpu = os.cpu_count() or 1
+        self.procesos = procesos or max(1, min(4, cpu // 4))
+        self.opciones = opciones or opciones_decodificacion()
+        self.ultimo_rtf = None
+        hilos = max(1, cpu // self.procesos)
+        contexto = multiprocessing.get_context("spawn")
+        self._barrera = contexto.Barrier(self.procesos)
+        self._pool = ProcessPoolExecutor(max_workers=self.procesos, mp_context=contexto,
+                                         initializer=_iniciar_trabajador,
+                                         initargs=(hilos,
+                                                   limite_por_proceso(limite_memoria_mb,
+                                                                      self.procesos),
+                                                   hilos_interop, cuantizar, dispositivo,
+                                                   self._barrera))
+
+    def precargar(self, nombre_modelo):
+        """
+        Pide a cada proceso del pool que cargue el modelo en segundo plano.
+        Cada tarea espera en una barrera a las demás, así ningún proceso toma
+        dos y todos quedan calientes.
+        Devuelve los futuros por si se quiere esperar o revisar errores.
+        """
+        return [self._pool.submit(_precargar_en_trabajador, nombre_modelo)
+                for _ in range(self.procesos)]
+
+    def transcribir(self, archivo, nombre_modelo, archivo_srt=None,
+                    al_progresar=None, duracion_fragmento=300):
+        """
+        Transcribe `archivo` y escribe su SRT (por defecto junto al original).
+        `al_progresar(segundos_procesados, segundos_totales)` se llama cada vez
+        que termina un fragmento. Devuelve la ruta del SRT y deja en
+        `ultimo_rtf` el factor de tiempo real de reloj (con todos los procesos).
+        """
+        inicio_reloj = time.time()
+        archivo_srt = archivo_srt or ruta_srt(archivo)
+        ruta_npy = preparar_audio(archivo)
+        audio = np.load(ruta_npy, mmap_mode="r")
+        total = len(audio) / MUESTRAS_POR_SEGUNDO
+        cortes = puntos_de_corte(audio, duracion_fragmento)
+
+        futuros = {}
+        for i, (inicio, fin) in enumerate(zip(cortes, cortes[1:])):
+            futuro = self._pool.submit(_transcribir_fragmento, nombre_modelo,
+                                       ruta_npy, int(inicio), int(fin), self.opciones)
+            futuros[futuro] = (i, (fin - inicio) / MUESTRAS_POR_SEGUNDO)
+
+        terminados = {}
+        siguiente = 0
+        indice_srt = 1
+        procesado = 0.0
+        with open(archivo_srt, "w", encoding="utf-8") as f:
+            for futuro in as_completed(futuros):
+                i, duracion = futuros[futuro]
+                terminados[i] = futuro.result()
+                # Escribir todos los fragmentos consecutivos ya disponibles
+                while siguiente in terminados:
+                    indice_srt = escribir_segmentos_srt(f, terminados.pop(siguiente), indice_srt)
+                    siguiente += 1
+                f.flush()
+                procesado += duracion
+                if al_progresar:
+                    al_progresar(procesado, total)
+        self.ultimo_rtf = factor_tiempo_real(time.time() - inicio_reloj, total)
+        return archivo_srt
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
 
 class SubtituladorApp:
-    def __init__(self, root):
+    def __init__(self, root, limite_memoria_mb=LIMITE_MEMORIA_MB, procesos=None, cuantizar=False,
+                 hilos_interop=1, opciones=None, dispositivo="cpu"):
         self.root = root
         self.root.title("Subtitulador Automático")
         self.root.geometry("600x450")
@@ -17,6 +488,9 @@ class SubtituladorApp:
         self.modelo_seleccionado = tk.StringVar(value="small")
         self.progreso = tk.DoubleVar()
         self.transcribiendo = False
+        self.transcriptor = TranscriptorParalelo(procesos, limite_memoria_mb, cuantizar,
+                                                 hilos_interop, opciones, dispositivo)
+        self.modelos_precargados = set()
         
         # Configurar estilo
         self.setup_estilo()
@@ -24,6 +498,9 @@ class SubtituladorApp:
         # Crear interfaz
         self.crear_interfaz()
         
+        # Precargar el modelo por defecto mientras se elige el archivo
+        self.precargar_modelo()
+        
     def setup_estilo(self):
         style = ttk.Style()
         style.theme_use('clam')
@@ -66,6 +543,7 @@ class SubtituladorApp:
         modelos = ["tiny", "base", "small", "medium", "large"]
         model_combo = ttk.Combobox(model_frame, textvariable=self.modelo_seleccionado, values=modelos, state="readonly")
         model_combo.pack(fill=tk.X, pady=5)
+        model_combo.bind("<<ComboboxSelected>>", self.precargar_modelo)
         
         # Información de modelos
         info_text = """
@@ -118,6 +596,21 @@ class SubtituladorApp:
             self.archivo_seleccionado.set(archivo)
             self.log(f"Archivo seleccionado: {archivo}")
             
+    def precargar_modelo(self, event=None):
+        modelo = self.modelo_seleccionado.get()
+        if modelo in self.modelos_precargados:
+            return
+        self.modelos_precargados.add(modelo)
+        
+        def al_terminar(futuro):
+            if futuro.exception():
+                self.modelos_precargados.discard(modelo)
+                self.log(f"⚠️ No se pudo precargar el modelo {modelo}: {futuro.exception()}")
+        
+        self.log(f"Precargando modelo {modelo} en segundo plano...")
+        for futuro in self.transcriptor.precargar(modelo):
+            futuro.add_done_callback(al_terminar)
+        
     def log(self, mensaje):
         self.output_text.insert(tk.END, f"{mensaje}\n")
         self.output_text.see(tk.END)
@@ -145,48 +638,22 @@ class SubtituladorApp:
             archivo = self.archivo_seleccionado.get()
             modelo = self.modelo_seleccionado.get()
             
-            self.log(f"Cargando modelo {modelo}...")
-            model = whisper.load_model(modelo)
+            self.log(f"Transcribiendo audio con el modelo {modelo} "
+                     f"en {self.transcriptor.procesos} procesos...")
             
-            self.log("Transcribiendo audio (esto puede tomar varios minutos)...")
+            def al_progresar(procesado, total):
+                self.progreso.set(100 * procesado / total if total else 100)
+                self.status_label.config(text=f"{procesado:.0f}s de {total:.0f}s de audio procesados")
             
-            # Simular progreso (Whisper no tiene callback de progreso nativo)
-            def simular_progreso():
-                while self.transcribiendo and self.progreso.get() < 90:
-                    time.sleep(0.5)
-                    self.progreso.set(self.progreso.get() + 1)
-            
-            progress_thread = threading.Thread(target=simular_progreso)
-            progress_thread.daemon = True
-            progress_thread.start()
-            
-            # Realizar la transcripción
-            resultado = model.transcribe(archivo)
-            
-            # Generar nombre de archivo para los subtítulos
-            nombre_base = os.path.splitext(archivo)[0]
-            archivo_srt = f"{nombre_base}_subtitulos.srt"
-            
-            # Guardar como SRT
-            with open(archivo_srt, "w", encoding="utf-8") as f:
-                for i, segmento in enumerate(resultado["segments"], start=1):
-                    inicio = segmento["start"]
-                    fin = segmento["end"]
-                    
-                    # Convertir tiempos a formato SRT
-                    def formato(t):
-                        horas = int(t // 3600)
-                        minutos = int((t % 3600) // 60)
-                        segundos = int(t % 60)
-                        milis = int((t % 1) * 1000)
-                        return f"{horas:02}:{minutos:02}:{segundos:02},{milis:03}"
-                    
-                    f.write(f"{i}\n")
-                    f.write(f"{formato(inicio)} --> {formato(fin)}\n")
-                    f.write(f"{segmento['text'].strip()}\n\n")
+            # Realizar la transcripción (el SRT se escribe conforme avanza)
+            with metricas.etapa("transcripcion", archivo, codec=f"whisper-{modelo}") as evento:
+                archivo_srt = self.transcriptor.transcribir(archivo, modelo, al_progresar=al_progresar)
+                evento["bytes_salida"] = metricas.tamano(archivo_srt)
             
             self.progreso.set(100)
             self.log(f"✅ Subtítulos generados en: {archivo_srt}")
+            if self.transcriptor.ultimo_rtf is not None:
+                self.log(f"⏱️ Factor de tiempo real: {self.transcriptor.ultimo_rtf:.2f}")
             messagebox.showinfo("Éxito", f"Subtítulos generados correctamente en:\n{archivo_srt}")
             
         except Exception as e:
@@ -197,7 +664,117 @@ class SubtituladorApp:
             self.transcribiendo = False
             self.btn_transcribir.config(state=tk.NORMAL)
 
+
+# ---- Modo por lotes (sin interfaz gráfica) ----
+
+def duracion_media(ruta):
+    """
+    Duración en segundos según ffprobe (0 si no se puede leer), desde la caché
+    compartida de metadatos.
+    """
+    return sondeo.duracion_archivo(ruta)
+
+
+def listar_archivos_media(entradas):
+    """
+    Expande una lista de archivos y/o carpetas (recursivo) a archivos multimedia.
+    """
+    archivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            for raiz, _, nombres in os.walk(entrada):
+                for nombre in sorted(nombres):
+                    if nombre.lower().endswith(EXTENSIONES_MEDIA):
+                        archivos.append(os.path.join(raiz, nombre))
+        elif os.path.isfile(entrada):
+            archivos.append(entrada)
+        else:
+            print(f"⚠️ No existe: {entrada}")
+    return archivos
+
+
+def transcribir_lote(entradas, modelo="small", procesos=1, sobrescribir=False,
+                     cuantizar=False, hilos_interop=1, opciones=None, dispositivo="cpu",
+                     limite_memoria_mb=LIMITE_MEMORIA_MB):
+    """
+    Genera los subtítulos de carpetas completas o listas de archivos sin interfaz.
+    Cada proceso carga su propio modelo una sola vez; los archivos se reparten
+    del más largo al más corto para que el último en terminar no sea uno largo.
+    Cada SRT se escribe en cuanto termina su archivo.
+    `cuantizar`, `hilos_interop`, `opciones` (ver opciones_decodificacion) y
+    `dispositivo` configuran la inferencia y `limite_memoria_mb` es la memoria
+    para modelos de todos los procesos juntos; por archivo se informa el factor de
+    tiempo real (RTF) para comparar precisión contra velocidad entre modelos.
+    """
+    opciones = opciones or opciones_decodificacion()
+    archivos = listar_archivos_media(entradas)
+    if not sobrescribir:
+        archivos = [a for a in archivos if not os.path.exists(ruta_srt(a))]
+    if not archivos:
+        print("No hay archivos por transcribir.")
+        return
+
+    duraciones = {a: duracion_media(a) for a in archivos}
+    archivos.sort(key=duraciones.get, reverse=True)
+
+    procesos = max(1, min(procesos, len(archivos)))
+    hilos = max(1, (os.cpu_count() or 1) // procesos)
+    print(f"🔧 {len(archivos)} archivos | modelo {modelo}{' int8' if cuantizar else ''} | "
+          f"{procesos} procesos x {hilos} hilos (+{hilos_interop} inter-op) | "
+          f"beam {opciones.get('beam_size') or 'voraz'}")
+
+    inicio = time.time()
+    segundos_audio = 0.0
+    segundos_inferencia = 0.0
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_iniciar_trabajador,
+                             initargs=(hilos, limite_por_proceso(limite_memoria_mb, procesos),
+                                       hilos_interop, cuantizar, dispositivo)) as pool:
+        futuros = {pool.submit(_transcribir_en_trabajador, a, modelo, opciones): a for a in archivos}
+        for i, futuro in enumerate(as_completed(futuros), start=1):
+            archivo = futuros[futuro]
+            try:
+                archivo_srt, segundos, rtf = futuro.result()
+                segundos_audio += duraciones[archivo]
+                segundos_inferencia += segundos
+                rtf = f"RTF {rtf:.2f}" if rtf is not None else "RTF ?"
+                print(f"✅ [{i}/{len(archivos)}] {archivo_srt} ({segundos:.1f}s, {rtf})")
+            except Exception as e:
+                print(f"❌ [{i}/{len(archivos)}] Error con {archivo}: {e}")
+
+    transcurrido = time.time() - inicio
+    horas_audio = segundos_audio / 3600
+    horas_reloj = transcurrido / 3600
+    print(f"\n🚀 Lote completado en {transcurrido:.1f}s")
+    if horas_reloj > 0:
+        print(f"Rendimiento: {horas_audio / horas_reloj:.2f} horas de audio por hora de reloj")
+    if segundos_audio > 0:
+        print(f"RTF medio por proceso: {segundos_inferencia / segundos_audio:.2f}")
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Genera subtítulos con Whisper. Sin argumentos abre la interfaz gráfica."
+    )
+    parser.add_argument("entradas", nargs="*", help="Archivos o carpetas a transcribir (modo por lotes)")
+    parser.add_argument("--modelo", default="small", choices=["tiny", "base", "small", "medium", "large"])
+    parser.add_argument("--procesos", type=int, default=1, help="Procesos en paralelo, cada uno con su modelo")
+    parser.add_argument("--sobrescribir", action="store_true", help="Rehacer SRT ya existentes")
+    agregar_argumentos_cpu(parser)
+    args = parser.parse_args()
+    opciones = opciones_decodificacion(args.beam_size, args.best_of, args.temperaturas)
+
+    metricas.configurar(os.path.join(os.path.dirname(DIR_CACHE_AUDIO), "metricas.jsonl"))
+    if args.entradas:
+        transcribir_lote(args.entradas, args.modelo, args.procesos, args.sobrescribir,
+                         args.cuantizar, args.hilos_interop, opciones, args.dispositivo,
+                         args.limite_memoria_mb)
+        metricas.imprimir_resumen()
+        sys.exit(0)
+
     root = tk.Tk()
-    app = SubtituladorApp(root)
-    root.mainloop()
\ No newline at end of file
+    app = SubtituladorApp(root, args.limite_memoria_mb, cuantizar=args.cuantizar, hilos_interop=args.hilos_interop,
+                          opciones=opciones, dispositivo=args.dispositivo)
+    root.mainloop()
+    app.transcriptor.cerrar()
+    metricas.imprimir_resumen()
\ No newline at end of file